@@ -43,6 +43,14 @@ target_metadata = SQLModel.metadata
 config.set_main_option("sqlalchemy.url", str(settings.DB_URI))
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # The monthly partitions of the order tables are created by the app
+    # (see shopAPI.partitions) and the detached ones are kept, they aren't in the models
+    if type_ == "table" and reflected and compare_to is None:
+        return models.PARTITION_NAME.match(name) is None
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
     This configures the context with just a URL
@@ -56,6 +64,7 @@ def run_migrations_offline():
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -65,7 +74,11 @@ def run_migrations_offline():
 
 
 def do_run_migrations(connection):
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -0,0 +1,48 @@
+"""Add order_item foreign key indexes and order status/date indexes
+
+Revision ID: 5f3a9c1d7b20
+Revises: e34cf6b38c62
+Create Date: 2026-10-18 02:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f3a9c1d7b20'
+down_revision: Union[str, None] = 'e34cf6b38c62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# CREATE/DROP INDEX CONCURRENTLY can't run inside a transaction,
+# so every statement runs in an autocommit block. The statements are
+# idempotent, so a migration interrupted halfway can be re-run.
+# An interrupted CREATE INDEX CONCURRENTLY leaves an INVALID index behind,
+# it has to be dropped manually before re-running.
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_order_item_order_id'), 'order_item', ['order_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(op.f('ix_order_item_product_id'), 'order_item', ['product_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(op.f('ix_order_creation_date'), 'order', ['creation_date'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_order_status_creation_date', 'order', ['status', 'creation_date'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        # The primary keys are already indexed
+        op.drop_index(op.f('ix_product_id'), table_name='product', postgresql_concurrently=True, if_exists=True)
+        op.drop_index(op.f('ix_order_id'), table_name='order', postgresql_concurrently=True, if_exists=True)
+        op.drop_index(op.f('ix_order_item_id'), table_name='order_item', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_order_item_id'), 'order_item', ['id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(op.f('ix_order_id'), 'order', ['id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(op.f('ix_product_id'), 'product', ['id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_order_status_creation_date', table_name='order', postgresql_concurrently=True, if_exists=True)
+        op.drop_index(op.f('ix_order_creation_date'), table_name='order', postgresql_concurrently=True, if_exists=True)
+        op.drop_index(op.f('ix_order_item_product_id'), table_name='order_item', postgresql_concurrently=True, if_exists=True)
+        op.drop_index(op.f('ix_order_item_order_id'), table_name='order_item', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,50 @@
+"""Add product search_vector column and search indexes
+
+Revision ID: 8b2f6d4e1a57
+Revises: d4a8e21b6c90
+Create Date: 2026-10-18 06:00:00.000000
+
+"""
+from typing import Sequence, Union
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2f6d4e1a57'
+down_revision: Union[str, None] = 'd4a8e21b6c90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Adding a stored generated column rewrites the product table under an exclusive lock.
+# The indexes are created concurrently in autocommit blocks, like in 5f3a9c1d7b20.
+# pg_trgm ships with the PostgreSQL contrib modules, if the server doesn't have them
+# the trigram index is skipped and the search only matches whole words.
+
+
+def upgrade() -> None:
+    op.add_column('product', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed("setweight(to_tsvector('english', name), 'A') || setweight(to_tsvector('english', description), 'B')", persisted=True), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_product_search_vector', 'product', ['search_vector'], unique=False, postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar() is None:
+        logger.warning("The pg_trgm extension isn't available, skipping ix_product_name_trgm.")
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        op.create_index('ix_product_name_trgm', 'product', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    # The pg_trgm extension is kept, other objects may use it
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_product_name_trgm', table_name='product', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_product_search_vector', table_name='product', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('product', 'search_vector')
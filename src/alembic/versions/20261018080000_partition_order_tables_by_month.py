@@ -0,0 +1,134 @@
+"""Partition order and order_item tables by month of creation
+
+Revision ID: 6d1f8a3c9e47
+Revises: 3e9c7b5a2f18
+Create Date: 2026-10-18 08:00:00.000000
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d1f8a3c9e47'
+down_revision: Union[str, None] = '3e9c7b5a2f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The tables are rewritten: run it with the app stopped.
+# The app creates the partitions of the next months (ORDER_PARTITIONS_AHEAD),
+# the migration creates them up to the same default of 3 months ahead.
+PARTITIONS_AHEAD = 3
+
+order_status = postgresql.ENUM('created', 'processing', 'shipped', 'delivered', 'canceled', name='orderstatus', create_type=False)
+
+
+def add_months(month: date, months: int) -> date:
+    year, index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return date(year, index + 1, 1)
+
+
+def create_partitions(first: date, last: date) -> None:
+    month = first
+    while month <= last:
+        end = add_months(month, 1)
+        suffix = f'p{month:%Y_%m}'
+        op.execute(f'CREATE TABLE "order_{suffix}" PARTITION OF "order" FOR VALUES FROM (\'{month}\') TO (\'{end}\')')
+        op.execute(f'CREATE TABLE "order_item_{suffix}" PARTITION OF "order_item" FOR VALUES FROM (\'{month}\') TO (\'{end}\')')
+        op.execute(f'ALTER TABLE "order_item_{suffix}" ADD CONSTRAINT "order_item_{suffix}_order_fkey" FOREIGN KEY (order_id, order_creation_date) REFERENCES "order_{suffix}" (id, creation_date) DEFERRABLE')
+        month = end
+
+
+def upgrade() -> None:
+    # Keep the old tables until their rows are copied
+    op.rename_table('order', 'order_unpartitioned')
+    op.execute('ALTER INDEX order_pkey RENAME TO order_unpartitioned_pkey')
+    op.rename_table('order_item', 'order_item_unpartitioned')
+    op.execute('ALTER INDEX order_item_pkey RENAME TO order_item_unpartitioned_pkey')
+    op.drop_index('ix_order_status_creation_date', table_name='order_unpartitioned')
+    op.drop_index('ix_order_creation_date', table_name='order_unpartitioned')
+    op.drop_index('ix_order_item_product_id', table_name='order_item_unpartitioned')
+    op.drop_index('ix_order_item_order_id', table_name='order_item_unpartitioned')
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('order',
+    sa.Column('creation_date', sa.DateTime(), nullable=False),
+    sa.Column('status', order_status, nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'creation_date'),
+    postgresql_partition_by='RANGE (creation_date)'
+    )
+    op.create_index(op.f('ix_order_creation_date'), 'order', ['creation_date'], unique=False)
+    op.create_index('ix_order_status_creation_date', 'order', ['status', 'creation_date'], unique=False)
+    op.create_table('order_item',
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('order_id', sa.Uuid(), nullable=False),
+    sa.Column('order_creation_date', sa.DateTime(), nullable=False),
+    sa.Column('product_id', sa.Uuid(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id', 'order_creation_date'),
+    postgresql_partition_by='RANGE (order_creation_date)'
+    )
+    op.create_index(op.f('ix_order_item_order_id'), 'order_item', ['order_id'], unique=False)
+    op.create_index(op.f('ix_order_item_product_id'), 'order_item', ['product_id'], unique=False)
+    # ### end Alembic commands ###
+
+    current = datetime.now().date().replace(day=1)
+    first = op.get_bind().scalar(sa.text('SELECT min(creation_date) FROM order_unpartitioned'))
+    first = min(first.date().replace(day=1), current) if first is not None else current
+    create_partitions(first, add_months(current, PARTITIONS_AHEAD))
+
+    op.execute('INSERT INTO "order" (id, creation_date, status) SELECT id, creation_date, status FROM order_unpartitioned')
+    # Items without an order can't be partitioned, they are dropped
+    op.execute(
+        'INSERT INTO order_item (amount, id, order_id, order_creation_date, product_id) '
+        'SELECT order_item.amount, order_item.id, order_item.order_id, "order".creation_date, order_item.product_id '
+        'FROM order_item_unpartitioned AS order_item JOIN order_unpartitioned AS "order" ON "order".id = order_item.order_id'
+    )
+    op.drop_table('order_item_unpartitioned')
+    op.drop_table('order_unpartitioned')
+    op.execute('ANALYZE "order", order_item')
+
+
+def downgrade() -> None:
+    op.rename_table('order', 'order_partitioned')
+    op.execute('ALTER INDEX order_pkey RENAME TO order_partitioned_pkey')
+    op.rename_table('order_item', 'order_item_partitioned')
+    op.execute('ALTER INDEX order_item_pkey RENAME TO order_item_partitioned_pkey')
+    op.drop_index('ix_order_status_creation_date', table_name='order_partitioned')
+    op.drop_index(op.f('ix_order_creation_date'), table_name='order_partitioned')
+    op.drop_index(op.f('ix_order_item_product_id'), table_name='order_item_partitioned')
+    op.drop_index(op.f('ix_order_item_order_id'), table_name='order_item_partitioned')
+
+    op.create_table('order',
+    sa.Column('creation_date', sa.DateTime(), nullable=False),
+    sa.Column('status', order_status, nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_order_creation_date'), 'order', ['creation_date'], unique=False)
+    op.create_index('ix_order_status_creation_date', 'order', ['status', 'creation_date'], unique=False)
+    op.create_table('order_item',
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('order_id', sa.Uuid(), nullable=True),
+    sa.Column('product_id', sa.Uuid(), nullable=True),
+    sa.ForeignKeyConstraint(['order_id'], ['order.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_order_item_order_id'), 'order_item', ['order_id'], unique=False)
+    op.create_index(op.f('ix_order_item_product_id'), 'order_item', ['product_id'], unique=False)
+
+    # Detached partitions aren't copied back
+    op.execute('INSERT INTO "order" (id, creation_date, status) SELECT id, creation_date, status FROM order_partitioned')
+    op.execute('INSERT INTO order_item (amount, id, order_id, product_id) SELECT amount, id, order_id, product_id FROM order_item_partitioned')
+    # Drops the partitions too
+    op.drop_table('order_item_partitioned')
+    op.drop_table('order_partitioned')
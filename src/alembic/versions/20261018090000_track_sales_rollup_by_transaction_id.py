@@ -0,0 +1,55 @@
+"""Track the sales rollup by transaction id
+
+Revision ID: 4a8e2c6b1d93
+Revises: 6d1f8a3c9e47
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a8e2c6b1d93'
+down_revision: Union[str, None] = '6d1f8a3c9e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CURRENT_XID = 'CAST(CAST(pg_current_xact_id() AS text) AS bigint)'
+
+
+def upgrade() -> None:
+    # The existing orders are committed, 0 is older than any transaction.
+    # A constant default doesn't rewrite the table, new orders get their transaction
+    op.add_column('order', sa.Column('creation_xid', sa.BigInteger(), server_default='0', nullable=False))
+    op.alter_column('order', 'creation_xid', server_default=sa.text(CURRENT_XID))
+    op.create_index(op.f('ix_order_creation_xid'), 'order', ['creation_xid'], unique=False)
+    op.add_column('sales_rollup_watermark', sa.Column('refreshed_xid', sa.BigInteger(), nullable=True))
+    op.drop_column('sales_rollup_watermark', 'refreshed_until')
+    # Orders that committed after the date watermark passed them were never rolled up,
+    # rebuild the rollup from every order (the table is locked by the new column)
+    op.execute('DELETE FROM sales_rollup')
+    op.execute(
+        'INSERT INTO sales_rollup (day, product_id, status, units) '
+        'SELECT CAST("order".creation_date AS DATE), order_item.product_id, "order".status, sum(order_item.amount) '
+        'FROM "order" JOIN order_item ON order_item.order_id = "order".id '
+        'AND order_item.order_creation_date = "order".creation_date '
+        'WHERE order_item.product_id IS NOT NULL '
+        'GROUP BY 1, 2, 3'
+    )
+    op.execute(
+        'INSERT INTO sales_rollup_watermark (id, refreshed_xid) VALUES (1, 1) '
+        'ON CONFLICT (id) DO UPDATE SET refreshed_xid = excluded.refreshed_xid'
+    )
+
+
+def downgrade() -> None:
+    op.add_column('sales_rollup_watermark', sa.Column('refreshed_until', sa.DateTime(), nullable=True))
+    op.drop_column('sales_rollup_watermark', 'refreshed_xid')
+    op.drop_index(op.f('ix_order_creation_xid'), table_name='order')
+    op.drop_column('order', 'creation_xid')
+    # The date watermark can't be derived from the transactions, refresh from scratch
+    op.execute('DELETE FROM sales_rollup')
+    op.execute('DELETE FROM sales_rollup_watermark')
@@ -0,0 +1,376 @@
+"""
+Drives every route of the v1 API at a given concurrency against seeded data
+and reports throughput, latency percentiles and queries per request.
+
+Usage: python -m benchmarks.load [--scenarios get_orders post_order ...]
+    [--requests 200] [--concurrency 16] [--products 1000] [--orders 2000]
+    [--hot-products 3] [--seed 0]
+"""
+
+import argparse
+import asyncio
+import random
+from dataclasses import dataclass, field
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Iterator
+
+from httpx import AsyncClient
+
+from benchmarks.utils import cleanup, product_payloads, report
+from shopAPI.client import api_client
+from shopAPI.instrumentation import SERVER_TIMING_HEADER, parse_server_timing
+from shopAPI.models import OrderStatus
+
+Request = tuple[str, str, dict[str, Any]]
+
+
+@dataclass
+class Seed:
+    """
+    Data the scenarios pick their requests from.
+    """
+
+    random: random.Random
+    started: datetime
+    product_ids: list[str] = field(default_factory=list)
+    hot_product_ids: list[str] = field(default_factory=list)
+    order_ids: list[str] = field(default_factory=list)
+    # Products without orders, created by the setup of the delete scenario
+    spare_product_ids: list[str] = field(default_factory=list)
+
+    def order_payload(self, product_ids: list[str], max_items: int = 5) -> dict:
+        items = self.random.randint(1, min(max_items, len(product_ids)))
+        return {
+            "order_items": [
+                {"product_id": product_id, "amount": self.random.randint(1, 3)}
+                for product_id in self.random.sample(product_ids, items)
+            ]
+        }
+
+
+@dataclass
+class Scenario:
+    """
+    A route and a function building its i-th request from the seed.
+    """
+
+    route: str
+    request: Callable[[Seed, int], Request]
+    setup: Callable[[AsyncClient, Seed, int], Awaitable[None]] | None = None
+
+
+async def create_spare_products(client: AsyncClient, seed: Seed, requests: int) -> None:
+    for start in range(0, requests, 1000):
+        response = await client.post(
+            "products/bulk", json=product_payloads(min(1000, requests - start))
+        )
+        response.raise_for_status()
+        seed.spare_product_ids.extend(product["id"] for product in response.json())
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "post_product": Scenario(
+        "POST /products/",
+        lambda seed, i: ("POST", "products/", {"json": product_payloads(1)[0]}),
+    ),
+    "post_products_bulk": Scenario(
+        "POST /products/bulk",
+        lambda seed, i: ("POST", "products/bulk", {"json": product_payloads(100)}),
+    ),
+    "get_products": Scenario(
+        "GET /products/",
+        lambda seed, i: ("GET", "products/", {"params": {"limit": 100}}),
+    ),
+    # Sparse fieldset of mobile clients
+    "get_products_fields": Scenario(
+        "GET /products/?fields=name,price",
+        lambda seed, i: (
+            "GET",
+            "products/",
+            {"params": {"limit": 100, "fields": "name,price"}},
+        ),
+    ),
+    "get_product": Scenario(
+        "GET /products/{id}",
+        lambda seed, i: ("GET", f"products/{seed.random.choice(seed.product_ids)}", {}),
+    ),
+    # The products of a cart, instead of a GET /products/{id} per line item
+    "lookup_products": Scenario(
+        "POST /products/lookup",
+        lambda seed, i: (
+            "POST",
+            "products/lookup",
+            {"json": {"ids": seed.random.sample(seed.product_ids, 20)}},
+        ),
+    ),
+    "put_product": Scenario(
+        "PUT /products/{id}",
+        lambda seed, i: (
+            "PUT",
+            f"products/{seed.random.choice(seed.product_ids)}",
+            {
+                "json": {
+                    **product_payloads(1)[0],
+                    "price": round(seed.random.uniform(1, 1000), 2),
+                }
+            },
+        ),
+    ),
+    "delete_product": Scenario(
+        "DELETE /products/{id}",
+        lambda seed, i: ("DELETE", f"products/{seed.spare_product_ids[i]}", {}),
+        setup=create_spare_products,
+    ),
+    "post_order": Scenario(
+        "POST /orders/",
+        lambda seed, i: (
+            "POST",
+            "orders/",
+            {"json": seed.order_payload(seed.product_ids)},
+        ),
+    ),
+    "post_orders_batch": Scenario(
+        "POST /orders/batch",
+        lambda seed, i: (
+            "POST",
+            "orders/batch",
+            {"json": [seed.order_payload(seed.product_ids) for _ in range(50)]},
+        ),
+    ),
+    "get_orders": Scenario(
+        "GET /orders/",
+        lambda seed, i: ("GET", "orders/", {"params": {"limit": 100}}),
+    ),
+    "get_orders_items_short": Scenario(
+        "GET /orders/?items=short",
+        lambda seed, i: (
+            "GET",
+            "orders/",
+            {"params": {"limit": 100, "items": "short"}},
+        ),
+    ),
+    "get_orders_items_none": Scenario(
+        "GET /orders/?items=none",
+        lambda seed, i: ("GET", "orders/", {"params": {"limit": 100, "items": "none"}}),
+    ),
+    "get_orders_filtered": Scenario(
+        "GET /orders/?status=shipped",
+        lambda seed, i: (
+            "GET",
+            "orders/",
+            {"params": {"limit": 100, "status": "shipped", "sort": "desc"}},
+        ),
+    ),
+    "get_order": Scenario(
+        "GET /orders/{id}",
+        lambda seed, i: ("GET", f"orders/{seed.random.choice(seed.order_ids)}", {}),
+    ),
+    "patch_order_status": Scenario(
+        "PATCH /orders/{id}/status",
+        lambda seed, i: (
+            "PATCH",
+            f"orders/{seed.random.choice(seed.order_ids)}/status",
+            {"params": {"status": seed.random.choice(list(OrderStatus)).value}},
+        ),
+    ),
+    "export_orders": Scenario(
+        "GET /orders/export",
+        lambda seed, i: (
+            "GET",
+            "orders/export",
+            {"params": {"since": seed.started.isoformat(), "format": "ndjson"}},
+        ),
+    ),
+    "sales_report": Scenario(
+        "GET /reports/sales",
+        lambda seed, i: (
+            "GET",
+            "reports/sales",
+            {"params": {"group_by": ("product", "day", "status")[i % 3]}},
+        ),
+    ),
+    # Many clients ordering the same few products contend for their rows
+    "hot_products": Scenario(
+        "POST /orders/ (hot products)",
+        lambda seed, i: (
+            "POST",
+            "orders/",
+            {"json": seed.order_payload(seed.hot_product_ids, max_items=2)},
+        ),
+    ),
+}
+
+
+async def seed_data(
+    client: AsyncClient, products: int, orders: int, hot_products: int, seed: Seed
+) -> None:
+    """
+    Creates the products and orders the scenarios work with.
+
+    :param client: The API client.
+    :param products: The number of products.
+    :param orders: The number of orders.
+    :param hot_products: The number of products the hot_products scenario orders.
+    :param seed: The seed to fill.
+    :return: None
+    """
+    for start in range(0, products, 1000):
+        response = await client.post(
+            "products/bulk", json=product_payloads(min(1000, products - start))
+        )
+        response.raise_for_status()
+        seed.product_ids.extend(product["id"] for product in response.json())
+    seed.hot_product_ids = seed.product_ids[:hot_products]
+
+    for start in range(0, orders, 1000):
+        payloads = [
+            seed.order_payload(seed.product_ids)
+            for _ in range(min(1000, orders - start))
+        ]
+        response = await client.post("orders/batch", json=payloads)
+        response.raise_for_status()
+        seed.order_ids.extend(
+            result["order"]["id"] for result in response.json() if result["order"]
+        )
+
+    # Ship every other order, so the status filter has something to find
+    for order_id in seed.order_ids[::2]:
+        response = await client.patch(
+            f"orders/{order_id}/status", params={"status": OrderStatus.shipped.value}
+        )
+        response.raise_for_status()
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """
+    Returns the percentile of the values using the nearest-rank method.
+
+    :param values: The sorted values.
+    :param percent: The percentile (0-100).
+    :return: The value.
+    """
+    if not values:
+        return 0.0
+    rank = max(1, round(percent / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+async def run_scenario(
+    client: AsyncClient, scenario: Scenario, seed: Seed, requests: int, concurrency: int
+) -> dict:
+    """
+    Sends the requests of the scenario from concurrent workers.
+
+    :param client: The API client.
+    :param scenario: The scenario to run.
+    :param seed: The seeded data.
+    :param requests: The number of requests.
+    :param concurrency: The number of concurrent workers.
+    :return: The results of the scenario.
+    """
+    if scenario.setup is not None:
+        await scenario.setup(client, seed, requests)
+    pending: Iterator[Request] = (scenario.request(seed, i) for i in range(requests))
+    latencies: list[float] = []
+    queries: list[int] = []
+    sizes: list[int] = []
+    errors: dict[int, int] = {}
+
+    async def worker() -> None:
+        for method, path, kwargs in pending:
+            start = perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append(perf_counter() - start)
+            sizes.append(len(response.content))
+            if response.is_error:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+            server_timing = response.headers.get(SERVER_TIMING_HEADER)
+            if server_timing is not None:
+                queries.append(parse_server_timing(server_timing)["queries"])
+
+    start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = perf_counter() - start
+
+    latencies.sort()
+    return {
+        "route": scenario.route,
+        "requests": requests,
+        "errors": errors,
+        "req_per_sec": requests / seconds,
+        "latency_ms": {
+            name: percentile(latencies, percent) * 1000
+            for name, percent in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        },
+        "queries_per_request": sum(queries) / len(queries) if queries else None,
+        "bytes_per_response": sum(sizes) / len(sizes) if sizes else None,
+    }
+
+
+async def run(
+    scenarios: list[str],
+    requests: int,
+    concurrency: int,
+    products: int,
+    orders: int,
+    hot_products: int,
+    random_seed: int,
+) -> dict:
+    seed = Seed(random=random.Random(random_seed), started=datetime.now())
+    results = {}
+    async with cleanup(), api_client() as client:
+        start = perf_counter()
+        await seed_data(client, products, orders, hot_products, seed)
+        seed_seconds = perf_counter() - start
+        for name in scenarios:
+            results[name] = await run_scenario(
+                client, SCENARIOS[name], seed, requests, concurrency
+            )
+
+    return {
+        "benchmark": "load",
+        "requests": requests,
+        "concurrency": concurrency,
+        "seed": {
+            "products": products,
+            "orders": orders,
+            "hot_products": hot_products,
+            "random_seed": random_seed,
+            "seconds": seed_seconds,
+        },
+        "scenarios": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--hot-products", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    report(
+        asyncio.run(
+            run(
+                args.scenarios,
+                args.requests,
+                args.concurrency,
+                args.products,
+                args.orders,
+                args.hot_products,
+                args.seed,
+            )
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
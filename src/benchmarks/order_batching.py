@@ -0,0 +1,85 @@
+"""
+Compares POST /orders/ with one transaction per order and with the order batcher
+(group commit) at several batch windows: throughput against the p50 latency
+every order pays waiting for its batch.
+
+Usage: python -m benchmarks.order_batching [--windows-ms 1 2 5]
+    [--requests 2000] [--concurrency 64] [--products 1000] [--seed 0]
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import datetime
+
+from benchmarks.load import SCENARIOS, Seed, run_scenario, seed_data
+from benchmarks.utils import cleanup, report
+from shopAPI.batching import order_batcher
+from shopAPI.client import api_client
+from shopAPI.config import settings
+
+
+async def run(
+    windows_ms: list[float],
+    requests: int,
+    concurrency: int,
+    products: int,
+    random_seed: int,
+) -> dict:
+    seed = Seed(random=random.Random(random_seed), started=datetime.now())
+    modes = {"off": None, **{f"window_{window}ms": window for window in windows_ms}}
+    results = {}
+    async with cleanup(), api_client() as client:
+        await seed_data(client, products, 0, 0, seed)
+        for name, window in modes.items():
+            settings.ORDER_BATCHING = window is not None
+            order_batcher.window = (window or 0) / 1000
+            results[name] = await run_scenario(
+                client, SCENARIOS["post_order"], seed, requests, concurrency
+            )
+    settings.ORDER_BATCHING = False
+
+    baseline = results["off"]
+    return {
+        "benchmark": "order_batching",
+        "requests": requests,
+        "concurrency": concurrency,
+        "products": products,
+        "max_batch_size": order_batcher.max_size,
+        "modes": results,
+        "throughput_gain": {
+            name: result["req_per_sec"] / baseline["req_per_sec"]
+            for name, result in results.items()
+        },
+        "p50_cost_ms": {
+            name: result["latency_ms"]["p50"] - baseline["latency_ms"]["p50"]
+            for name, result in results.items()
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--windows-ms", nargs="+", type=float, default=[1, 2, 5])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    report(
+        asyncio.run(
+            run(
+                args.windows_ms,
+                args.requests,
+                args.concurrency,
+                args.products,
+                args.seed,
+            )
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Compares connection pool profiles under connection saturation.
+More workers than the pool can serve run a short transaction that holds
+the connection for --hold-ms, the latency includes the wait for a connection
+(and opening it, the pgbouncer profile opens a connection for every operation).
+
+Usage: python -m benchmarks.pool [--profiles default small ...]
+    [--concurrency 50] [--operations 1000] [--hold-ms 5]
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+from typing import Any
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.load import percentile
+from benchmarks.utils import report
+from shopAPI.config import settings
+from shopAPI.database import engine_options
+from shopAPI.models import Product
+
+PROFILES: dict[str, dict[str, Any]] = {
+    "default": {},
+    "small": {"DB_POOL_SIZE": 2, "DB_MAX_OVERFLOW": 0},
+    "no_overflow": {"DB_MAX_OVERFLOW": 0},
+    "large": {"DB_POOL_SIZE": 20, "DB_MAX_OVERFLOW": 10},
+    "fail_fast": {"DB_MAX_OVERFLOW": 0, "DB_POOL_TIMEOUT": 0.05},
+    "pre_ping": {"DB_POOL_PRE_PING": True},
+    "no_statement_cache": {"DB_STATEMENT_CACHE_SIZE": 0},
+    "jit_off": {"DB_JIT": False, "DB_STATEMENT_TIMEOUT": 5000},
+    "pgbouncer": {"DB_PGBOUNCER": True},
+}
+
+
+async def run_profile(
+    overrides: dict[str, Any], concurrency: int, operations: int, hold: float
+) -> dict:
+    """
+    Runs the operations from concurrent workers on an engine with the profile.
+
+    :param overrides: The settings of the profile.
+    :param concurrency: The number of concurrent workers.
+    :param operations: The number of operations.
+    :param hold: Seconds each operation holds its connection.
+    :return: The results of the profile.
+    """
+    profile_settings = settings.model_copy(update=overrides)
+    engine = create_async_engine(
+        str(profile_settings.DB_URI), **engine_options(profile_settings)
+    )
+    query = select(Product).order_by(Product.id).limit(100)
+    pending = iter(range(operations))
+    latencies: list[float] = []
+    timeouts = 0
+
+    async def worker() -> None:
+        nonlocal timeouts
+        for _ in pending:
+            start = perf_counter()
+            try:
+                async with engine.begin() as connection:
+                    await connection.execute(query)
+                    await connection.execute(
+                        text("SELECT pg_sleep(:hold)"), {"hold": hold}
+                    )
+            except TimeoutError:
+                timeouts += 1
+                continue
+            latencies.append(perf_counter() - start)
+
+    try:
+        start = perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = perf_counter() - start
+    finally:
+        await engine.dispose()
+
+    latencies.sort()
+    return {
+        "settings": overrides,
+        "ops_per_sec": len(latencies) / seconds,
+        "timeouts": timeouts,
+        "latency_ms": {
+            name: percentile(latencies, percent) * 1000
+            for name, percent in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        },
+    }
+
+
+async def run(
+    profiles: list[str], concurrency: int, operations: int, hold_ms: float
+) -> dict:
+    results = {}
+    for name in profiles:
+        results[name] = await run_profile(
+            PROFILES[name], concurrency, operations, hold_ms / 1000
+        )
+    return {
+        "benchmark": "pool",
+        "concurrency": concurrency,
+        "operations": operations,
+        "hold_ms": hold_ms,
+        "profiles": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES)
+    )
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--operations", type=int, default=1000)
+    parser.add_argument("--hold-ms", type=float, default=5)
+    args = parser.parse_args()
+    report(
+        asyncio.run(run(args.profiles, args.concurrency, args.operations, args.hold_ms))
+    )
+
+
+if __name__ == "__main__":
+    main()
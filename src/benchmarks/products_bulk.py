@@ -0,0 +1,53 @@
+"""
+Compares product creation throughput of POST /products/ and POST /products/bulk.
+
+Usage: python -m benchmarks.products_bulk [--rows 2000] [--batch 1000]
+"""
+
+import argparse
+import asyncio
+
+from benchmarks.utils import cleanup, product_payloads, report, timed
+from shopAPI.client import api_client
+
+
+async def run(rows: int, batch: int) -> dict:
+    single_payloads = product_payloads(rows)
+    bulk_payloads = product_payloads(rows)
+    async with cleanup(), api_client() as client:
+
+        async def create_single() -> None:
+            for payload in single_payloads:
+                response = await client.post("products/", json=payload)
+                response.raise_for_status()
+
+        async def create_bulk() -> None:
+            for start in range(0, rows, batch):
+                response = await client.post(
+                    "products/bulk", json=bulk_payloads[start : start + batch]
+                )
+                response.raise_for_status()
+
+        single_seconds = await timed(create_single)
+        bulk_seconds = await timed(create_bulk)
+
+    return {
+        "benchmark": "products_bulk",
+        "rows": rows,
+        "batch": batch,
+        "single": {"seconds": single_seconds, "rows_per_sec": rows / single_seconds},
+        "bulk": {"seconds": bulk_seconds, "rows_per_sec": rows / bulk_seconds},
+        "speedup": single_seconds / bulk_seconds,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+    report(asyncio.run(run(args.rows, args.batch)))
+
+
+if __name__ == "__main__":
+    main()
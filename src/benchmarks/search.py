@@ -0,0 +1,145 @@
+"""
+Measures the latency of the product search on a large catalog.
+The products are generated from a vocabulary inside a transaction that is rolled
+back at the end, so the database is left as it was. Every query runs --repeat times
+for the first page and for a page deep in the results (with the keyset cursor).
+
+Usage: python -m benchmarks.search [--products 1000000] [--repeat 50]
+    [--queries "walnut desk" ...]
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+
+from sqlalchemy import text
+
+from benchmarks.load import percentile
+from benchmarks.utils import report
+from shopAPI.crud import ProductCRUD
+from shopAPI.database import engine, prepare_session_factory
+
+ADJECTIVES = (
+    "red blue green black white small large light heavy soft hard warm cold "
+    "classic modern vintage compact portable foldable waterproof wireless smart "
+    "electric manual organic wooden metal glass leather cotton wool silk ceramic "
+    "steel bamboo walnut oak marble velvet linen"
+).split()
+NOUNS = (
+    "chair table desk lamp sofa bed shelf cabinet mirror rug curtain pillow blanket "
+    "mug cup plate bowl kettle toaster blender oven pan pot knife fork spoon "
+    "shirt jacket coat dress skirt jeans sweater scarf hat glove sock boot shoe "
+    "sneaker sandal backpack wallet watch ring necklace bracelet earring belt "
+    "phone tablet laptop monitor keyboard mouse speaker headphone camera charger "
+    "drone printer router console controller bicycle helmet tent sleeping-bag "
+    "lantern compass bottle thermos umbrella suitcase notebook pen pencil marker "
+    "stapler calendar clock vase candle frame basket planter shovel rake hose "
+    "drill hammer wrench screwdriver saw ladder toolbox ball racket bat"
+).split()
+QUERIES = [
+    "walnut desk",  # rare, one adjective and one noun
+    "lamp",  # common, one noun
+    "wireless headphones",  # stemmed plural
+    '"leather boot" -black',  # phrase with an excluded word
+    "kettel",  # typo, only matched with pg_trgm
+]
+
+
+async def seed(connection, products: int) -> None:
+    await connection.execute(
+        text(
+            "INSERT INTO product (id, name, description, price, amount) "
+            "SELECT gen_random_uuid(), "
+            "adjectives[1 + i % cardinality(adjectives)] || ' ' "
+            "|| nouns[1 + (i / cardinality(adjectives)) % cardinality(nouns)] "
+            "|| ' ' || i, "
+            "'A ' || adjectives[1 + (i / 7) % cardinality(adjectives)] || ' ' "
+            "|| nouns[1 + (i / 13) % cardinality(nouns)] || ' for everyday use', "
+            "10 + i % 100, 100 "
+            "FROM generate_series(1, :products) AS i, "
+            "(SELECT CAST(:adjectives AS text[]) AS adjectives, "
+            "CAST(:nouns AS text[]) AS nouns) AS vocabulary"
+        ),
+        {"products": products, "adjectives": ADJECTIVES, "nouns": NOUNS},
+    )
+    # Moves the entries the insert left in the pending list into the index
+    await connection.execute(
+        text("SELECT gin_clean_pending_list('ix_product_search_vector')")
+    )
+    await connection.execute(text("ANALYZE product"))
+
+
+async def measure(crud: ProductCRUD, q: str, repeat: int, deep_page: int) -> dict:
+    """
+    Runs the search of the first page and of a deep page.
+
+    :param crud: The product CRUD.
+    :param q: The search.
+    :param repeat: The number of runs of each page.
+    :param deep_page: The number of the deep page.
+    :return: The latencies and the number of results up to the deep page.
+    """
+    latencies: dict[str, list[float]] = {"first_page": [], "deep_page": []}
+    after, results = None, 0
+    for _ in range(deep_page):
+        rows = await crud.search(q, limit=20, after=after)
+        results += len(rows)
+        if len(rows) < 20:
+            break
+        after = (rows[-1].rank, rows[-1].Product.id)
+    for name, cursor in (("first_page", None), ("deep_page", after)):
+        for _ in range(repeat):
+            start = perf_counter()
+            await crud.search(q, limit=20, after=cursor)
+            latencies[name].append(perf_counter() - start)
+            crud.session.expunge_all()
+
+    return {
+        "results_up_to_deep_page": results,
+        **{
+            name: {
+                percent_name: percentile(sorted(values), percent) * 1000
+                for percent_name, percent in (("p50_ms", 50), ("p99_ms", 99))
+            }
+            for name, values in latencies.items()
+        },
+    }
+
+
+async def run(products: int, repeat: int, queries: list[str]) -> dict:
+    try:
+        async with engine.connect() as connection:
+            transaction = await connection.begin()
+            start = perf_counter()
+            await seed(connection, products)
+            seed_seconds = perf_counter() - start
+            session = prepare_session_factory(connection)()
+            crud = ProductCRUD(session)
+            results = {q: await measure(crud, q, repeat, deep_page=10) for q in queries}
+            await session.close()
+            await transaction.rollback()
+    finally:
+        await engine.dispose()
+
+    return {
+        "benchmark": "search",
+        "products": products,
+        "seed_seconds": seed_seconds,
+        "trigram": ProductCRUD.trigram,
+        "queries": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--queries", nargs="+", default=QUERIES)
+    args = parser.parse_args()
+    report(asyncio.run(run(args.products, args.repeat, args.queries)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Compares FastAPI's response_model serialization with the fast serializer
+on in-memory orders, without the database.
+
+Usage: python -m benchmarks.serialization [--orders 100] [--items 10] [--rounds 200]
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from benchmarks.utils import report
+from shopAPI.models import Order, Product
+from shopAPI.routers.v1.orders import get_orders_all, orders_serializer
+from shopAPI.server import app
+
+
+def build_orders(orders: int, items: int) -> List[Order]:
+    """
+    Builds transient orders with items and products loaded.
+
+    :param orders: The number of orders.
+    :param items: The number of items per order.
+    :return: The list of orders.
+    """
+    products = [
+        Product(
+            name=f"bench_product_{i}",
+            description=f"bench_description_{i}",
+            price=10.5 + i,
+            amount=100,
+        )
+        for i in range(items)
+    ]
+    result = []
+    for _ in range(orders):
+        order = Order(
+            order_items=[
+                {"amount": i + 1, "product_id": product.id}
+                for i, product in enumerate(products)
+            ]
+        )
+        for order_item, product in zip(order.order_items, products):
+            order_item.product = product
+        result.append(order)
+    return result
+
+
+async def run(orders: int, items: int, rounds: int) -> dict:
+    content = build_orders(orders, items)
+    route = next(
+        route
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.endpoint is get_orders_all
+    )
+
+    async def fastapi_body() -> bytes:
+        return JSONResponse(
+            await serialize_response(
+                field=route.response_field, response_content=content
+            )
+        ).body
+
+    expected = await fastapi_body()
+    assert orders_serializer(content).body == expected, "Serializers differ"
+
+    start = perf_counter()
+    for _ in range(rounds):
+        await fastapi_body()
+    fastapi_seconds = perf_counter() - start
+
+    start = perf_counter()
+    for _ in range(rounds):
+        orders_serializer(content)
+    fast_seconds = perf_counter() - start
+
+    return {
+        "benchmark": "serialization",
+        "orders": orders,
+        "items": items,
+        "rounds": rounds,
+        "bytes": len(expected),
+        "fastapi": {"ms_per_response": fastapi_seconds / rounds * 1000},
+        "fast": {"ms_per_response": fast_seconds / rounds * 1000},
+        "speedup": fastapi_seconds / fast_seconds,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    report(asyncio.run(run(args.orders, args.items, args.rounds)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Compares the per-request session overhead of a task-scoped session registry
+(async_scoped_session keyed on the current task, proxying every attribute access)
+with a plain session created and closed for each request.
+Every request runs in its own task, like under the ASGI server,
+uses the session --accesses times and runs --queries queries (0 skips the database).
+
+Usage: python -m benchmarks.session [--requests 20000] [--concurrency 16]
+    [--accesses 20] [--queries 1]
+"""
+
+import argparse
+import asyncio
+from asyncio import current_task
+from functools import partial
+from time import perf_counter
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_scoped_session,
+    async_sessionmaker,
+)
+
+from benchmarks.load import percentile
+from benchmarks.utils import report
+from shopAPI.database import engine, prepare_session_factory
+
+
+async def use_session(session: AsyncSession, accesses: int, queries: int) -> None:
+    for _ in range(accesses):
+        session.info.get("after_commit")
+    for _ in range(queries):
+        await session.execute(text("SELECT 1"))
+    await session.commit()
+
+
+async def scoped_request(
+    registry: async_scoped_session, accesses: int, queries: int
+) -> None:
+    try:
+        await use_session(registry, accesses, queries)
+    finally:
+        await registry.remove()
+
+
+async def per_request(
+    factory: async_sessionmaker[AsyncSession], accesses: int, queries: int
+) -> None:
+    async with factory() as session:
+        await use_session(session, accesses, queries)
+
+
+async def run_mode(
+    mode: str, requests: int, concurrency: int, accesses: int, queries: int
+) -> dict:
+    """
+    Runs the requests from concurrent workers, every request in a new task.
+
+    :param mode: scoped or per_request.
+    :param requests: The number of requests.
+    :param concurrency: The number of concurrent workers.
+    :param accesses: The number of session attribute accesses per request.
+    :param queries: The number of queries per request.
+    :return: The results of the mode.
+    """
+    factory = prepare_session_factory(engine)
+    if mode == "scoped":
+        request = partial(
+            scoped_request, async_scoped_session(factory, scopefunc=current_task)
+        )
+    else:
+        request = partial(per_request, factory)
+    pending = iter(range(requests))
+    latencies: list[float] = []
+
+    async def worker() -> None:
+        for _ in pending:
+            start = perf_counter()
+            await asyncio.create_task(request(accesses, queries))
+            latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = perf_counter() - start
+
+    latencies.sort()
+    return {
+        "req_per_sec": requests / seconds,
+        "latency_us": {
+            name: percentile(latencies, percent) * 1_000_000
+            for name, percent in (("p50", 50), ("p95", 95), ("p99", 99))
+        },
+    }
+
+
+async def run(requests: int, concurrency: int, accesses: int, queries: int) -> dict:
+    try:
+        # Opens the pool connections before measuring
+        await run_mode("per_request", concurrency, concurrency, accesses, queries)
+        results = {
+            mode: await run_mode(mode, requests, concurrency, accesses, queries)
+            for mode in ("scoped", "per_request")
+        }
+    finally:
+        await engine.dispose()
+
+    return {
+        "benchmark": "session",
+        "requests": requests,
+        "concurrency": concurrency,
+        "accesses": accesses,
+        "queries": queries,
+        "modes": results,
+        "speedup": results["per_request"]["req_per_sec"]
+        / results["scoped"]["req_per_sec"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--accesses", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=1)
+    args = parser.parse_args()
+    report(
+        asyncio.run(run(args.requests, args.concurrency, args.accesses, args.queries))
+    )
+
+
+if __name__ == "__main__":
+    main()
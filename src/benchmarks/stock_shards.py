@@ -0,0 +1,131 @@
+"""
+Compares the stock decrement of one hot product kept in one row and split
+into shards. Concurrent workers run order-like transactions: decrement the stock,
+then hold the row locks for --hold-ms (the inserts and round trips of an order).
+In one row every transaction waits for the previous one, with shards they
+run side by side up to the number of shards.
+
+Usage: python -m benchmarks.stock_shards [--shards 0 4 16]
+    [--concurrency 32] [--operations 2000] [--hold-ms 5]
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.load import percentile
+from benchmarks.utils import report
+from shopAPI.config import settings
+from shopAPI.crud import OrderCRUD, ProductCRUD
+from shopAPI.database import engine_options, prepare_session_factory
+from shopAPI.models import Product, ProductUpdate
+
+
+async def run_shards(
+    stock_shards: int, concurrency: int, operations: int, hold: float
+) -> dict:
+    """
+    Runs the transactions from concurrent workers on a new product.
+
+    :param stock_shards: The number of shards of the product.
+    :param concurrency: The number of concurrent workers (and connections).
+    :param operations: The number of transactions.
+    :param hold: Seconds each transaction holds its locks after the decrement.
+    :return: The results.
+    """
+    engine = create_async_engine(
+        str(settings.DB_URI),
+        **engine_options(
+            settings.model_copy(
+                update={"DB_POOL_SIZE": concurrency, "DB_MAX_OVERFLOW": 0}
+            )
+        ),
+    )
+    session_factory = prepare_session_factory(engine)
+    product = Product(
+        name="bench_hot_product", description="", price=1.0, amount=operations
+    )
+    async with session_factory() as session:
+        session.add(product)
+        await session.commit()
+        await ProductCRUD(session).update(
+            product,
+            ProductUpdate(
+                name=product.name,
+                description=product.description,
+                price=product.price,
+                amount=operations,
+                stock_shards=stock_shards,
+            ),
+        )
+
+    pending = iter(range(operations))
+    latencies: list[float] = []
+
+    async def worker() -> None:
+        async with session_factory() as session:
+            crud = OrderCRUD(session)
+            for _ in pending:
+                start = perf_counter()
+                async with session.begin():
+                    await crud._decrement_stock({product.id: 1})
+                    await session.execute(
+                        text("SELECT pg_sleep(:hold)"), {"hold": hold}
+                    )
+                latencies.append(perf_counter() - start)
+
+    try:
+        start = perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = perf_counter() - start
+    finally:
+        async with session_factory() as session:
+            await session.execute(delete(Product).where(Product.id == product.id))
+            await session.commit()
+        await engine.dispose()
+
+    latencies.sort()
+    return {
+        "ops_per_sec": operations / seconds,
+        "latency_ms": {
+            name: percentile(latencies, percent) * 1000
+            for name, percent in (("p50", 50), ("p95", 95), ("p99", 99))
+        },
+    }
+
+
+async def run(shards: list[int], concurrency: int, operations: int, hold_ms: float):
+    results = {
+        f"shards_{stock_shards}": await run_shards(
+            stock_shards, concurrency, operations, hold_ms / 1000
+        )
+        for stock_shards in shards
+    }
+    return {
+        "benchmark": "stock_shards",
+        "concurrency": concurrency,
+        "operations": operations,
+        "hold_ms": hold_ms,
+        "modes": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--shards", nargs="+", type=int, default=[0, 4, 16])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--hold-ms", type=float, default=5)
+    args = parser.parse_args()
+    report(
+        asyncio.run(run(args.shards, args.concurrency, args.operations, args.hold_ms))
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures the latency of the total count modes of the order listing on a large table.
+The orders are generated inside a transaction that is rolled back at the end,
+so the database is left as it was. Every count runs --repeat times.
+
+Usage: python -m benchmarks.total_count [--orders 1000000] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+
+from sqlalchemy import text
+
+from benchmarks.load import percentile
+from benchmarks.utils import report
+from shopAPI.crud import OrderCRUD, RowCountCRUD
+from shopAPI.database import engine, prepare_session_factory
+from shopAPI.models import CountMode, Order, OrderStatus
+
+COUNTS = {
+    "exact": (CountMode.exact, None),
+    "exact_shipped": (CountMode.exact, {"status": [OrderStatus.shipped]}),
+    "estimated": (CountMode.estimated, None),
+    "estimated_shipped": (CountMode.estimated, {"status": [OrderStatus.shipped]}),
+    "maintained": (CountMode.maintained, None),
+}
+
+
+async def seed(connection, orders: int) -> None:
+    await connection.execute(
+        text(
+            'INSERT INTO "order" (id, creation_date, status) '
+            "SELECT gen_random_uuid(), now() - i * interval '1 minute', "
+            "(enum_range(NULL::orderstatus))[1 + i % 5] "
+            "FROM generate_series(1, :orders) AS i"
+        ),
+        {"orders": orders},
+    )
+    await connection.execute(text('ANALYZE "order"'))
+
+
+async def run(orders: int, repeat: int) -> dict:
+    try:
+        async with engine.connect() as connection:
+            transaction = await connection.begin()
+            start = perf_counter()
+            await seed(connection, orders)
+            seed_seconds = perf_counter() - start
+            session = prepare_session_factory(connection)()
+            # The seeded orders weren't inserted by the CRUD
+            await RowCountCRUD(session).recount([Order])
+            crud = OrderCRUD(session)
+            results = {}
+            for name, (mode, filters) in COUNTS.items():
+                latencies = []
+                for _ in range(repeat):
+                    start = perf_counter()
+                    total = await crud.count(mode, filters)
+                    latencies.append(perf_counter() - start)
+                latencies.sort()
+                results[name] = {
+                    "total": total,
+                    "p50_ms": percentile(latencies, 50) * 1000,
+                    "p99_ms": percentile(latencies, 99) * 1000,
+                }
+            await session.close()
+            await transaction.rollback()
+    finally:
+        await engine.dispose()
+
+    return {
+        "benchmark": "total_count",
+        "orders": orders,
+        "seed_seconds": seed_seconds,
+        "counts": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    report(asyncio.run(run(args.orders, args.repeat)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import json
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import Any, AsyncGenerator, Awaitable, Callable
+
+from sqlalchemy import delete
+from uuid_extensions import uuid7
+
+from shopAPI.crud import RowCountCRUD
+from shopAPI.database import engine, session_factory
+from shopAPI.models import Order, OrderItem, Product
+
+
+@asynccontextmanager
+async def cleanup() -> AsyncGenerator[None, None]:
+    """
+    Deletes every row created inside the block and recounts the rows of the tables.
+    Ids are time-ordered uuid7, so everything created after the block started
+    has a greater id than the watermark taken at its start.
+    Run the benchmarks against a scratch database: rows created concurrently
+    by other clients are deleted too.
+    """
+    watermark = uuid7()
+    try:
+        yield
+    finally:
+        async with session_factory() as session:
+            for model in (OrderItem, Order, Product):
+                await session.execute(delete(model).where(model.id >= watermark))
+            # Commits the deletes with the counters
+            await RowCountCRUD(session).recount([Order, Product])
+        await engine.dispose()
+
+
+async def timed(function: Callable[[], Awaitable[Any]]) -> float:
+    """
+    Awaits the function and returns the elapsed time in seconds.
+
+    :param function: The function to measure.
+    :return: The elapsed time.
+    """
+    start = perf_counter()
+    await function()
+    return perf_counter() - start
+
+
+def product_payloads(count: int) -> list[dict]:
+    """
+    Generates product payloads.
+
+    :param count: The number of payloads.
+    :return: The list of payloads.
+    """
+    return [
+        {
+            "name": f"bench_product_{i}",
+            "description": f"bench_description_{i}",
+            "price": 10.0 + i % 100,
+            "amount": 1_000_000,
+        }
+        for i in range(count)
+    ]
+
+
+def report(results: dict) -> None:
+    """
+    Prints the results as JSON, so they can be compared between commits.
+
+    :param results: The results to print.
+    :return: None
+    """
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,8 @@
+#!/bin/bash
+set -e
+
+# Run Alembic migrations
+alembic upgrade head
+
+# Run the load benchmark, extra arguments are passed to it
+exec python -m benchmarks.load "$@"
@@ -0,0 +1,97 @@
+import asyncio
+
+from fastapi import HTTPException
+
+from shopAPI import metrics
+from shopAPI.config import settings
+from shopAPI.crud import OrderCRUD
+from shopAPI.models import Order, OrderCreate
+
+
+class _Batch:
+    """
+    Orders collected by a leader request and the futures of their results.
+    """
+
+    def __init__(self):
+        self.orders: list[OrderCreate] = []
+        self.futures: list[asyncio.Future] = []
+        self.full = asyncio.Event()
+
+
+class OrderBatcher:
+    """
+    Group commit for order creation.
+    The first request of a batch becomes its leader: it waits up to the window
+    for other orders (or until the batch is full), then creates all of them
+    with OrderCRUD.create_batch in one transaction on its own session
+    and hands every waiting request its result.
+    A batch costs one commit (one WAL flush) instead of one per order,
+    every order waits up to the window for it.
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self._batch: _Batch | None = None
+
+    async def create(self, crud: OrderCRUD, model_create: OrderCreate) -> Order:
+        """
+        Creates the order in the next batch.
+        Raises the order's error like OrderCRUD.create (404 or 400).
+
+        :param crud: The CRUD of the request, its session is used if the request leads the batch.
+        :param model_create: The order to create.
+        :return: The created order instance.
+        """
+        batch = self._batch
+        leader = batch is None
+        if leader:
+            batch = self._batch = _Batch()
+        future = asyncio.get_running_loop().create_future()
+        batch.orders.append(model_create)
+        batch.futures.append(future)
+        if len(batch.orders) >= self.max_size:
+            # The next order starts a new batch
+            self._batch = None
+            batch.full.set()
+
+        if leader:
+            await self._lead(crud, batch)
+        result = await future
+        if isinstance(result, HTTPException):
+            raise result
+        return result
+
+    async def _lead(self, crud: OrderCRUD, batch: _Batch) -> None:
+        try:
+            try:
+                await asyncio.wait_for(batch.full.wait(), self.window)
+            except TimeoutError:
+                pass
+            if self._batch is batch:
+                self._batch = None
+            metrics.ORDER_BATCH_SIZE.observe(len(batch.orders))
+            results = await crud.create_batch(batch.orders)
+        except Exception as exception:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(exception)
+            return
+        except BaseException:
+            # Cancelled leader, the waiting requests fail too
+            if self._batch is batch:
+                self._batch = None
+            for future in batch.futures:
+                future.cancel()
+            raise
+
+        for future, result in zip(batch.futures, results):
+            # The future of a cancelled request is done, its order is created anyway
+            if not future.done():
+                future.set_result(result)
+
+
+order_batcher = OrderBatcher(
+    window=settings.ORDER_BATCH_WINDOW, max_size=settings.ORDER_BATCH_MAX_SIZE
+)
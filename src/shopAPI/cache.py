@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable, Iterable
+
+
+class LRUCache:
+    """
+    In-process cache with a bounded size, LRU eviction and a TTL for every entry.
+    Counts hits, misses and evictions.
+
+    Every invalidation bumps the generation of the key. A reader records the
+    generation before it loads the value and passes it to set, so a value loaded
+    before a concurrent invalidation isn't stored after it.
+    Only the generations of the maxsize last invalidated keys are kept, the other
+    keys share the generation of the last one dropped: at worst a store is skipped.
+
+    Any object with the same generation/get/set/invalidate/clear methods can be
+    plugged into the CRUD classes instead.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._generations: OrderedDict[Hashable, int] = OrderedDict()
+        self._last_generation = 0
+        self._dropped_generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def generation(self, key: Hashable) -> int:
+        """
+        Returns the generation of the key, record it before loading the value.
+
+        :param key: The key.
+        :return: The generation.
+        """
+        return self._generations.get(key, self._dropped_generation)
+
+    def get(self, key: Hashable) -> Any | None:
+        """
+        Returns the cached value and marks it as recently used.
+        Expired entries are removed and count as misses.
+
+        :param key: The key to look up.
+        :return: The value or None.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        """
+        Stores the value, evicting the least recently used entries if the cache is full.
+        Nothing is stored if the key was invalidated since the given generation.
+
+        :param key: The key to store the value under.
+        :param value: The value to store.
+        :param generation: The generation of the key before the value was loaded.
+        :return: None
+        """
+        if generation is not None and generation != self.generation(key):
+            return
+        self._entries[key] = (monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        """
+        Removes the keys from the cache.
+
+        :param keys: The keys to remove.
+        :return: None
+        """
+        for key in keys:
+            self._entries.pop(key, None)
+            self._last_generation += 1
+            self._generations[key] = self._last_generation
+            self._generations.move_to_end(key)
+        while len(self._generations) > self.maxsize:
+            _, self._dropped_generation = self._generations.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Removes all entries and resets the counters.
+
+        :return: None
+        """
+        self._entries.clear()
+        # The generations only move forward, the reads started before are skipped
+        self._generations.clear()
+        self._dropped_generation = self._last_generation
+        self.hits = self.misses = self.evictions = 0
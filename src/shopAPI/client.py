@@ -0,0 +1,20 @@
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
+from httpx import ASGITransport, AsyncClient
+
+from shopAPI.server import app
+
+
+@asynccontextmanager
+async def api_client() -> AsyncGenerator[AsyncClient, None]:
+    """
+    Yields an async client calling the app in-process.
+    The tests and the benchmarks use the same client.
+    """
+    async with AsyncClient(
+        base_url="http://testserver/api/v1/",
+        transport=ASGITransport(app),
+        follow_redirects=True,
+    ) as client:
+        yield client
@@ -1,4 +1,4 @@
-from typing import Any, Optional
+from typing import Any, Literal, Optional
 from pydantic import Field, PostgresDsn, ValidationInfo, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -15,7 +15,89 @@ class Settings(BaseSettings):
     DB_PORT: int | str = Field("5432", json_schema_extra={"env": "DB_PORT"})
     DB_ECHO: bool = Field(False, json_schema_extra={"env": "DB_ECHO"})
     DB_POOL_SIZE: int = Field(5, json_schema_extra={"env": "DB_POOL_SIZE"})
+    DB_MAX_OVERFLOW: int = Field(10, json_schema_extra={"env": "DB_MAX_OVERFLOW"})
+    # Seconds to wait for a connection from the pool
+    DB_POOL_TIMEOUT: float = Field(30.0, json_schema_extra={"env": "DB_POOL_TIMEOUT"})
+    # Seconds after which a connection is replaced, -1 to keep it forever
+    DB_POOL_RECYCLE: int = Field(-1, json_schema_extra={"env": "DB_POOL_RECYCLE"})
+    DB_POOL_PRE_PING: bool = Field(False, json_schema_extra={"env": "DB_POOL_PRE_PING"})
+    # Prepared statements cached per connection, 0 disables the cache
+    DB_STATEMENT_CACHE_SIZE: int = Field(
+        100, json_schema_extra={"env": "DB_STATEMENT_CACHE_SIZE"}
+    )
+    # Milliseconds, 0 to use the server setting
+    DB_STATEMENT_TIMEOUT: int = Field(
+        0, json_schema_extra={"env": "DB_STATEMENT_TIMEOUT"}
+    )
+    DB_JIT: bool = Field(True, json_schema_extra={"env": "DB_JIT"})
+    # PgBouncer transaction pooling compatibility
+    DB_PGBOUNCER: bool = Field(False, json_schema_extra={"env": "DB_PGBOUNCER"})
+    DB_REPLICA_URIS: list[str] = Field([], json_schema_extra={"env": "DB_REPLICA_URIS"})
+    DB_READ_YOUR_WRITES_SECONDS: float = Field(
+        5.0, json_schema_extra={"env": "DB_READ_YOUR_WRITES_SECONDS"}
+    )
+    DB_REPLICA_RETRY_SECONDS: float = Field(
+        30.0, json_schema_extra={"env": "DB_REPLICA_RETRY_SECONDS"}
+    )
+    # Isolation level and attempts of the order creation transactions
+    ORDER_ISOLATION_LEVEL: Optional[
+        Literal["READ COMMITTED", "REPEATABLE READ", "SERIALIZABLE"]
+    ] = Field(None, json_schema_extra={"env": "ORDER_ISOLATION_LEVEL"})
+    ORDER_TRANSACTION_ATTEMPTS: int = Field(
+        3, json_schema_extra={"env": "ORDER_TRANSACTION_ATTEMPTS"}
+    )
+    # Group commit of order creation: orders arriving within the window (seconds)
+    # are created together, up to the maximum batch size
+    ORDER_BATCHING: bool = Field(False, json_schema_extra={"env": "ORDER_BATCHING"})
+    ORDER_BATCH_WINDOW: float = Field(
+        0.002, json_schema_extra={"env": "ORDER_BATCH_WINDOW"}
+    )
+    ORDER_BATCH_MAX_SIZE: int = Field(
+        100, json_schema_extra={"env": "ORDER_BATCH_MAX_SIZE"}
+    )
+    # Seconds, the backoff doubles after every failed attempt up to the maximum
+    DB_RETRY_BACKOFF: float = Field(0.01, json_schema_extra={"env": "DB_RETRY_BACKOFF"})
+    DB_RETRY_MAX_BACKOFF: float = Field(
+        0.5, json_schema_extra={"env": "DB_RETRY_MAX_BACKOFF"}
+    )
+    DB_BULK_CHUNK_SIZE: int = Field(
+        1000, json_schema_extra={"env": "DB_BULK_CHUNK_SIZE"}
+    )
     DB_URI: Optional[PostgresDsn] = None
+    DB_N_PLUS_ONE_THRESHOLD: int = Field(
+        10, json_schema_extra={"env": "DB_N_PLUS_ONE_THRESHOLD"}
+    )
+    PRODUCT_CACHE_SIZE: int = Field(
+        1024, json_schema_extra={"env": "PRODUCT_CACHE_SIZE"}
+    )
+    PRODUCT_CACHE_TTL: float = Field(
+        10.0, json_schema_extra={"env": "PRODUCT_CACHE_TTL"}
+    )
+
+    # Seconds an idempotency key is kept for and between the purges of expired ones
+    IDEMPOTENCY_KEY_TTL: float = Field(
+        86400.0, json_schema_extra={"env": "IDEMPOTENCY_KEY_TTL"}
+    )
+    IDEMPOTENCY_PURGE_INTERVAL: float = Field(
+        3600.0, json_schema_extra={"env": "IDEMPOTENCY_PURGE_INTERVAL"}
+    )
+    # Seconds between the sales rollup refreshes
+    SALES_ROLLUP_REFRESH_INTERVAL: float = Field(
+        60.0, json_schema_extra={"env": "SALES_ROLLUP_REFRESH_INTERVAL"}
+    )
+    # Months of order partitions created ahead of the current one, seconds between
+    # the partition maintenance runs and months of partitions kept (0 keeps all)
+    ORDER_PARTITIONS_AHEAD: int = Field(
+        3, ge=1, json_schema_extra={"env": "ORDER_PARTITIONS_AHEAD"}
+    )
+    ORDER_PARTITION_INTERVAL: float = Field(
+        3600.0, json_schema_extra={"env": "ORDER_PARTITION_INTERVAL"}
+    )
+    ORDER_PARTITION_RETENTION_MONTHS: int = Field(
+        0, ge=0, json_schema_extra={"env": "ORDER_PARTITION_RETENTION_MONTHS"}
+    )
+    # Rows of the row counter of a table, more slots wait less for each other's locks
+    ROW_COUNT_SLOTS: int = Field(16, gt=0, json_schema_extra={"env": "ROW_COUNT_SLOTS"})
 
     model_config = SettingsConfigDict(case_sensitive=True, env_file=".env")
 
@@ -1,27 +1,124 @@
-from typing import Any, Generic, List, Type, TypeVar
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from hashlib import sha256
+from typing import Any, AsyncIterator, Generic, Iterable, List, Type, TypeVar
 from uuid import UUID
-from fastapi import Depends
+from fastapi import Depends, HTTPException
 from pydantic import BaseModel
 from sqlmodel import SQLModel
-from sqlalchemy import Select
+from sqlalchemy import (
+    BigInteger,
+    Date,
+    Integer,
+    Row,
+    Select,
+    Text,
+    Uuid,
+    and_,
+    any_,
+    bindparam,
+    case,
+    cast,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    text,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, REGCONFIG, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.expression import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased, load_only, selectinload
+from sqlalchemy.orm.attributes import flag_modified, set_committed_value
+from sqlalchemy.orm.session import make_transient_to_detached
 from functools import reduce
+import operator
+import random
 
-from shopAPI.database import Transactional, get_session
-from shopAPI.models import Order, OrderItem, Product
+from shopAPI.cache import LRUCache
+from shopAPI.config import settings
+from shopAPI.database import RetryPolicy, Transactional, after_commit, get_session
+from shopAPI.replicas import get_read_session
+from shopAPI.models import (
+    CountMode,
+    IdempotencyKey,
+    Order,
+    OrderCreate,
+    OrderItem,
+    OrderItemsMode,
+    OrderResponse,
+    OrderStatus,
+    PARTITION_NAME,
+    Product,
+    ProductStockShard,
+    ProductUpdate,
+    RowCount,
+    SEARCH_CONFIG,
+    SalesGroupBy,
+    SalesRollup,
+    SalesRollupWatermark,
+    SortOrder,
+)
 
 ModelType = TypeVar("ModelType", bound=SQLModel)
 
+# Order creation only uses its arguments and what it loads itself, so it can be retried
+ORDER_TRANSACTION = Transactional(
+    isolation_level=settings.ORDER_ISOLATION_LEVEL,
+    retry=RetryPolicy(
+        attempts=settings.ORDER_TRANSACTION_ATTEMPTS,
+        backoff=settings.DB_RETRY_BACKOFF,
+        max_backoff=settings.DB_RETRY_MAX_BACKOFF,
+    ),
+)
+
+# The joins of the order queries for each OrderItemsMode
+ORDER_ITEMS_JOINS = {
+    OrderItemsMode.full: {"order_item"},
+    OrderItemsMode.short: {"order_item_short"},
+    OrderItemsMode.none: None,
+}
+
+FILTER_OPERATORS = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
 
 class BaseCRUD(Generic[ModelType]):
-    """Base class for CRUD operations."""
+    """
+    Base class for CRUD operations.
+    If cache is set, get_by_id and get_all_by_ids read through it
+    and update/delete invalidate it.
+    Rows read from a replica aren't cached, a lagging replica could
+    put back a version older than a write the cache was invalidated for.
+    If counted is set, create, create_many and delete keep the table's
+    row counter in their transaction.
+    """
+
+    cache: LRUCache | None = None
+    counted: bool = False
 
     def __init__(self, model: Type[ModelType], session: AsyncSession):
         self.session = session
         self.model_class = model
 
+    @classmethod
+    def read_only(cls, session: AsyncSession = Depends(get_read_session)):
+        """
+        Returns the CRUD with a session that may read from a replica.
+        This can be used for dependency injection in handlers without writes.
+
+        :param session: The database session.
+        :return: The CRUD instance.
+        """
+        return cls(session=session)
+
     @Transactional()
     async def create(self, model_create: ModelType) -> ModelType:
         """
@@ -33,47 +130,250 @@ class BaseCRUD(Generic[ModelType]):
         attributes = self.extract_attributes_from_schema(model_create)
         model = self.model_class(**attributes)
         self.session.add(model)
+        await self._count_rows(1)
         return model
 
-    async def get_by_id(self, id: UUID, join_: set[str] | None = None) -> ModelType:
+    @Transactional()
+    async def create_many(self, models_create: list[ModelType]) -> list[ModelType]:
+        """
+        Creates new Objects in the DB with multi-row inserts in a single transaction.
+        The objects aren't added to the session.
+
+        :param models_create: The models containing the attributes to create entities with.
+        :return: The created objects in the same order.
+        """
+        models = [
+            self.model_class(**self.extract_attributes_from_schema(model_create))
+            for model_create in models_create
+        ]
+        await self._insert_many(
+            self.model_class, [model.model_dump() for model in models]
+        )
+        await self._count_rows(len(models))
+        return models
+
+    async def get_by_id(
+        self,
+        id: UUID,
+        join_: set[str] | None = None,
+        fields: frozenset[str] | None = None,
+    ) -> ModelType:
         """
         Returns the model instance matching the id.
+        A cached instance is returned whole, instances loaded with only some
+        of the fields aren't cached.
 
         :param id: The id to match.
         :param join_: The joins to make.
+        :param fields: The columns to load, all columns if None.
         :return: The model instance.
         """
-        return await self._one_or_none(self._where(self._query(join_), "id", id))
+        if join_ or self.cache is None:
+            return await self._one_or_none(
+                self._where(self._query(join_, fields), "id", id)
+            )
+
+        cached = self.cache.get(id)
+        if cached is not None:
+            return await self.session.merge(cached, load=False)
+
+        generation = self.cache.generation(id)
+        model = await self._one_or_none(
+            self._where(self._query(fields=fields), "id", id)
+        )
+        if model is not None and fields is None:
+            self._cache_set(model, generation)
+        return model
 
     async def get_all(
-        self, offset: int, limit: int, join_: set[str] | None = None
+        self,
+        offset: int,
+        limit: int,
+        join_: set[str] | None = None,
+        after: UUID | None = None,
+        filters: dict[str, Any] | None = None,
+        sort: SortOrder = SortOrder.asc,
+        fields: frozenset[str] | None = None,
     ) -> List[ModelType] | None:
         """
-        Returns all model instances.
+        Returns all model instances matching the filters ordered by id.
+        If after is given, the page starts right after that id (keyset pagination),
+        so the cost of a page doesn't depend on how deep it is.
 
         :param offset: The offset to start from.
         :param limit: The number of items to return.
+        :param join_: The joins to make.
+        :param after: The id to start after.
+        :param filters: The filters to apply, see _filter.
+        :param sort: The sort order.
+        :param fields: The columns to load, all columns if None.
         :return: The list of model instances.
         """
-        return await self._all(self._query(join_).offset(offset).limit(limit))
+        query = self._filter(self._query(join_, fields), filters)
+        id_column = self.model_class.id
+        if sort == SortOrder.desc:
+            if after is not None:
+                query = query.where(id_column < after)
+            query = query.order_by(id_column.desc())
+        else:
+            if after is not None:
+                query = query.where(id_column > after)
+            query = query.order_by(id_column)
+        return await self._all(query.offset(offset).limit(limit))
 
     async def get_all_by_ids(
-        self, ids: list[UUID], join_: set[str] | None = None
-    ) -> ModelType:
+        self,
+        ids: list[UUID],
+        join_: set[str] | None = None,
+        fields: frozenset[str] | None = None,
+    ) -> list[ModelType]:
         """
-        Returns the model instances matching the ids.
+        Returns the model instances matching the ids, in the order of the ids.
+        Repeated ids are returned once, ids that don't match aren't returned.
+        The ids that aren't cached are loaded with one query.
 
         :param ids: The ids to match.
         :param join_: The joins to make.
+        :param fields: The columns to load, all columns if None.
         :return: The model instances.
         """
-        return await self._all(self._where(self._query(join_), "id", ids))
+        ids = list(dict.fromkeys(ids))
+        if join_ or self.cache is None:
+            models = await self._all(self._where_ids(self._query(join_, fields), ids))
+        else:
+            models, missing = [], []
+            for id in ids:
+                cached = self.cache.get(id)
+                if cached is None:
+                    missing.append(id)
+                else:
+                    models.append(await self.session.merge(cached, load=False))
+            if missing:
+                generations = {id: self.cache.generation(id) for id in missing}
+                loaded = await self._all(
+                    self._where_ids(self._query(fields=fields), missing)
+                )
+                if fields is None:
+                    for model in loaded:
+                        self._cache_set(model, generations[model.id])
+                models.extend(loaded)
+
+        by_id = {model.id: model for model in models}
+        return [by_id[id] for id in ids if id in by_id]
+
+    async def count(
+        self, mode: CountMode, filters: dict[str, Any] | None = None
+    ) -> int:
+        """
+        Returns the number of model instances matching the filters.
+        The estimated and maintained counts don't read the rows:
+        estimated reads the table statistics (or the planner's estimate
+        if there are filters), maintained sums the row counter.
+        Raises a 400 for a maintained count with filters.
+
+        :param mode: How to count.
+        :param filters: The filters to apply, see _filter.
+        :return: The number of model instances.
+        """
+        filters = {
+            field: value
+            for field, value in (filters or {}).items()
+            if value is not None
+        }
+        if mode == CountMode.maintained:
+            if filters:
+                raise HTTPException(
+                    status_code=400,
+                    detail="The maintained count doesn't support filters.",
+                )
+            return await RowCountCRUD(self.session).get(self.model_class)
+
+        if mode == CountMode.exact:
+            return await self.session.scalar(
+                self._filter(
+                    select(func.count()).select_from(self.model_class), filters
+                )
+            )
+
+        if not filters:
+            estimate = await self._table_estimate()
+            if estimate is not None:
+                return estimate
+        return await self._plan_estimate(
+            self._filter(select(self.model_class.id), filters)
+        )
+
+    async def _table_estimate(self) -> int | None:
+        """
+        Returns the number of rows of the table from its statistics,
+        scaled to its current size like the planner does.
+        A partitioned table is the sum of its partitions.
+
+        :return: The estimate or None if a partition with rows wasn't analyzed.
+        """
+        partitions = (
+            await self.session.execute(
+                text(
+                    "SELECT reltuples, relpages, "
+                    "pg_relation_size(oid) / current_setting('block_size')::int "
+                    "FROM pg_class WHERE relkind = 'r' AND ("
+                    "oid = CAST(:table AS regclass) OR oid IN ("
+                    "SELECT inhrelid FROM pg_inherits "
+                    "WHERE inhparent = CAST(:table AS regclass)))"
+                ),
+                {"table": f'"{self.model_class.__tablename__}"'},
+            )
+        ).all()
+        estimate = 0
+        for tuples, pages, size in partitions:
+            if size == 0:
+                continue
+            if tuples < 0 or pages == 0:
+                return None
+            estimate += tuples / pages * size
+        return round(estimate)
+
+    async def _plan_estimate(self, query: Select) -> int:
+        """
+        Returns the number of rows the planner expects the query to return.
+
+        :param query: The query to estimate.
+        :return: The estimate.
+        """
+        connection = await self.session.connection()
+        # The filter values are validated by the routes, they're rendered inline
+        # because EXPLAIN doesn't take parameters
+        statement = query.compile(
+            dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+        )
+        plan = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}")
+        return round(plan.scalar()[0]["Plan"]["Plan Rows"])
+
+    async def _count_rows(self, delta: int) -> None:
+        """
+        Adds the delta to the row counter in the current transaction, if counted is set.
+
+        :param delta: The number of inserted (or deleted, if negative) rows.
+        :return: None
+        """
+        if self.counted and delta:
+            await RowCountCRUD(self.session).add(self.model_class, delta)
 
     @Transactional()
     async def update(self, model: ModelType, model_update: ModelType) -> ModelType:
         """
         Updated the model instance.
 
+        :param model: The model to update.
+        :param model_update: The model containing the attributes to update.
+        :return: The updated model instance.
+        """
+        return await self._update(model, model_update)
+
+    async def _update(self, model: ModelType, model_update: ModelType) -> ModelType:
+        """
+        Updates the model instance in the current transaction.
+
         :param model: The model to update.
         :param model_update: The model containing the attributes to update.
         :return: The updated model instance.
@@ -81,7 +381,10 @@ class BaseCRUD(Generic[ModelType]):
         attributes: dict[str, Any] = self.extract_attributes_from_schema(model_update)
         for k, v in attributes.items():
             setattr(model, k, v)
+            # Write the value even if it matches the loaded (possibly cached) one
+            flag_modified(model, k)
         self.session.add(model)
+        self._invalidate([model.id])
         return model
 
     @Transactional()
@@ -93,15 +396,79 @@ class BaseCRUD(Generic[ModelType]):
         :return: None
         """
         await self.session.delete(model)
+        # Lock the row before the counter, like the transactions that create orders
+        await self.session.flush()
+        await self._count_rows(-1)
+        self._invalidate([model.id])
+
+    async def _insert_many(self, model_class: Type[SQLModel], rows: list[dict]) -> None:
+        """
+        Inserts the rows in chunks of DB_BULK_CHUNK_SIZE.
 
-    def _query(self, join_: set[str] | None = None) -> Select:
+        :param model_class: The model to insert.
+        :param rows: The rows to insert.
+        :return: None
+        """
+        chunk_size = settings.DB_BULK_CHUNK_SIZE
+        for start in range(0, len(rows), chunk_size):
+            await self.session.execute(
+                insert(model_class), rows[start : start + chunk_size]
+            )
+
+    def _cache_set(self, model: ModelType, generation: int) -> None:
+        """
+        Stores a detached copy of the model in the cache,
+        so the cached state is never changed by the session that loaded it.
+        The copy isn't stored if the model was invalidated since it was loaded.
+
+        :param model: The model to store.
+        :param generation: The generation of the cached id before the model was loaded.
+        :return: None
+        """
+        if self.session.info.get("replica"):
+            return
+        copy = self.model_class(**model.model_dump())
+        make_transient_to_detached(copy)
+        self.cache.set(model.id, copy, generation)
+
+    def _invalidate(self, ids: Iterable[UUID], cache: LRUCache | None = None) -> None:
+        """
+        Removes the ids from the cache now and once more after the commit.
+        Both bump the generation of the ids, so a read of the old row that
+        finishes after the commit isn't stored (see LRUCache).
+
+        :param ids: The ids to remove.
+        :param cache: The cache to remove them from (defaults to this CRUD's cache).
+        :return: None
+        """
+        cache = self.cache if cache is None else cache
+        if cache is None:
+            return
+
+        ids = list(ids)
+        cache.invalidate(ids)
+        after_commit(self.session, lambda: cache.invalidate(ids))
+
+    def _query(
+        self, join_: set[str] | None = None, fields: frozenset[str] | None = None
+    ) -> Select:
         """
         Returns a callable that can be used to query the model.
+        The columns that aren't in fields aren't loaded, don't read them from
+        the returned instances, async sessions can't load them lazily.
 
         :param join_: The joins to make.
+        :param fields: The columns to load (the primary key is always loaded),
+            all columns if None.
         :return: A callable that can be used to query the model.
         """
         query = select(self.model_class)
+        if fields is not None:
+            query = query.options(
+                load_only(
+                    *(getattr(self.model_class, field) for field in sorted(fields))
+                )
+            )
         query = self._optional_join(query, join_)
 
         return query
@@ -128,16 +495,51 @@ class BaseCRUD(Generic[ModelType]):
     def _where(self, query: Select, field: str, value: Any) -> Select:
         """
         Returns the query filtered by the given column.
+        The field can have a comparison suffix: "creation_date__gte".
+        Supported suffixes are gt, gte, lt and lte, without a suffix
+        the column must be equal to the value (or be in it, for a list or a tuple).
 
         :param query: The query to filter.
         :param field: The column to filter by.
         :param value: The value to filter by.
         :return: The filtered query.
         """
-        if isinstance(value, (list, tuple)):
-            return query.where(getattr(self.model_class, field).in_(value))
+        field, _, operator = field.partition("__")
+        column = getattr(self.model_class, field)
+        if operator:
+            return query.where(FILTER_OPERATORS[operator](column, value))
+        elif isinstance(value, (list, tuple)):
+            return query.where(column.in_(value))
         else:
-            return query.where(getattr(self.model_class, field) == value)
+            return query.where(column == value)
+
+    def _where_ids(self, query: Select, ids: list[UUID]) -> Select:
+        """
+        Returns the query filtered by the ids.
+        The ids are sent as one array parameter (id = ANY($1)) instead of
+        a parameter per id, so the statement is the same for any number of ids
+        and the prepared statement is reused.
+
+        :param query: The query to filter.
+        :param ids: The ids to match.
+        :return: The filtered query.
+        """
+        return query.where(
+            self.model_class.id == any_(bindparam("ids", ids, type_=ARRAY(Uuid)))
+        )
+
+    def _filter(self, query: Select, filters: dict[str, Any] | None) -> Select:
+        """
+        Returns the query filtered by every filter that has a value.
+
+        :param query: The query to filter.
+        :param filters: The filters (field: value), see _where for the field format.
+        :return: The filtered query.
+        """
+        for field, value in (filters or {}).items():
+            if value is not None:
+                query = self._where(query, field, value)
+        return query
 
     def _optional_join(self, query: Select, join_: set[str] | None = None) -> Select:
         """
@@ -185,61 +587,1200 @@ class ProductCRUD(BaseCRUD[Product]):
     CRUD for the product model.
     """
 
+    cache = (
+        LRUCache(settings.PRODUCT_CACHE_SIZE, settings.PRODUCT_CACHE_TTL)
+        if settings.PRODUCT_CACHE_SIZE > 0
+        else None
+    )
+    counted = True
+    # Whether the database has the pg_trgm extension, checked by the first search
+    trigram: bool | None = None
+
     def __init__(self, session: AsyncSession = Depends(get_session)):
         super().__init__(model=Product, session=session)
 
+    @Transactional()
+    async def update(self, model: Product, model_update: ProductUpdate) -> Product:
+        """
+        Updates the product.
+        The amount is split into stock_shards shards, or kept in the product
+        if stock_shards is 0. The current number of shards is kept if it isn't set.
+
+        :param model: The product to update.
+        :param model_update: The product containing the attributes to update.
+        :return: The updated product instance.
+        """
+        was_sharded = model.stock_shards > 0
+        model = await self._update(model, model_update)
+        if was_sharded or model.stock_shards:
+            await self._set_stock(model, model_update.amount)
+        return model
+
+    async def _set_stock(self, model: Product, amount: int) -> None:
+        """
+        Replaces the stock shards of the product with the amount split
+        into model.stock_shards shards, or moves the amount back to the product.
+
+        :param model: The product.
+        :param amount: The stock.
+        :return: None
+        """
+        shards = model.stock_shards
+        if shards:
+            model.amount = 0
+        await self.session.execute(
+            delete(ProductStockShard).where(ProductStockShard.product_id == model.id)
+        )
+        if shards:
+            share, remainder = divmod(amount, shards)
+            await self._insert_many(
+                ProductStockShard,
+                [
+                    {
+                        "product_id": model.id,
+                        "shard": shard,
+                        "amount": share + (shard < remainder),
+                    }
+                    for shard in range(shards)
+                ],
+            )
+            await self.session.flush()
+            set_committed_value(model, "amount", amount)
+
+    async def decrement_shards(
+        self, product_id: UUID, shards: int, amount: int
+    ) -> None:
+        """
+        Decrements the stock of a sharded product in the current transaction.
+        Takes the amount from a random shard that has enough stock, skipping
+        the shards locked by concurrent orders. If they're all locked, waits
+        for the first one. If no shard has enough, waits for all of them
+        and takes the amount from as many of them as needed.
+        Every shard is checked and decremented while it's locked, so the stock
+        is never oversold.
+        Raises a 400 if there is not enough stock.
+
+        :param product_id: The id of the product.
+        :param shards: The number of shards of the product.
+        :param amount: The amount to decrement.
+        :return: None
+        """
+        start = random.randrange(shards)
+        for skip_locked in (True, False):
+            candidate = (
+                select(ProductStockShard.shard)
+                .where(
+                    ProductStockShard.product_id == product_id,
+                    ProductStockShard.amount >= amount,
+                )
+                .order_by(
+                    (ProductStockShard.shard + shards - start) % shards
+                    if skip_locked
+                    else ProductStockShard.shard
+                )
+                .limit(1)
+                .with_for_update(skip_locked=skip_locked)
+                .scalar_subquery()
+            )
+            # A waiting query keeps the locks of the shards that had too little
+            # stock after the wait. Its savepoint is rolled back if it takes nothing,
+            # so the shards are only locked in the shard order below and the orders
+            # waiting for all of them can't deadlock
+            savepoint = None if skip_locked else await self.session.begin_nested()
+            taken = await self.session.scalar(
+                update(ProductStockShard)
+                .where(
+                    ProductStockShard.product_id == product_id,
+                    ProductStockShard.shard == candidate,
+                    ProductStockShard.amount >= amount,
+                )
+                .values(amount=ProductStockShard.amount - amount)
+                .returning(ProductStockShard.shard)
+                .execution_options(synchronize_session=False)
+            )
+            if taken is not None:
+                if savepoint is not None:
+                    await savepoint.commit()
+                return
+            if savepoint is not None:
+                await savepoint.rollback()
+
+        available = (
+            await self.session.execute(
+                select(ProductStockShard.shard, ProductStockShard.amount)
+                .where(ProductStockShard.product_id == product_id)
+                .order_by(ProductStockShard.shard)
+                .with_for_update()
+            )
+        ).all()
+        takes: dict[int, int] = {}
+        remaining = amount
+        for shard, shard_amount in available:
+            take = min(shard_amount, remaining)
+            if take:
+                takes[shard] = take
+                remaining -= take
+        if remaining:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Product {product_id} not enough in stock.",
+            )
+
+        await self.session.execute(
+            update(ProductStockShard)
+            .where(
+                ProductStockShard.product_id == product_id,
+                ProductStockShard.shard.in_(takes),
+            )
+            .values(
+                amount=ProductStockShard.amount
+                - case(takes, value=ProductStockShard.shard)
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    async def lock_shards(self, product_ids: Iterable[UUID]) -> list[Row]:
+        """
+        Locks the stock shards of the products in the current transaction.
+
+        :param product_ids: The ids of the products.
+        :return: The stock of every sharded product (product_id, amount).
+        """
+        shards = (
+            select(ProductStockShard.product_id, ProductStockShard.amount)
+            .where(ProductStockShard.product_id.in_(list(product_ids)))
+            .order_by(ProductStockShard.product_id, ProductStockShard.shard)
+            .with_for_update()
+            .subquery()
+        )
+        query = select(shards.c.product_id, func.sum(shards.c.amount)).group_by(
+            shards.c.product_id
+        )
+        return list((await self.session.execute(query)).all())
+
+    async def search(
+        self, q: str, limit: int, after: tuple[float, UUID] | None = None
+    ) -> list[Row]:
+        """
+        Returns the products matching the search ordered by rank, best first.
+        Words are matched in the name and the description with the search vector,
+        names are also matched by trigram word similarity if pg_trgm is installed,
+        so typos and word prefixes still find the product.
+        If after is given, the page starts right after that rank and id
+        (keyset pagination).
+
+        :param q: The search (websearch_to_tsquery syntax).
+        :param limit: The number of products to return.
+        :param after: The rank and id to start after.
+        :return: The products and their ranks (Product, rank).
+        """
+        if ProductCRUD.trigram is None:
+            ProductCRUD.trigram = await self.session.scalar(
+                text(
+                    "SELECT EXISTS (SELECT FROM pg_extension WHERE extname = 'pg_trgm')"
+                )
+            )
+
+        search_vector = Product.__table__.c.search_vector
+        ts_query = func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), q)
+        match = search_vector.op("@@")(ts_query)
+        rank = func.ts_rank_cd(search_vector, ts_query)
+        if ProductCRUD.trigram:
+            # name %> q is the indexable form of q <% name
+            match = or_(match, Product.name.op("%>")(q))
+            rank = rank + func.word_similarity(q, Product.name)
+
+        query = select(Product, rank.label("rank")).where(match)
+        if after is not None:
+            after_rank, after_id = after
+            query = query.where(
+                or_(rank < after_rank, and_(rank == after_rank, Product.id > after_id))
+            )
+        query = query.order_by(rank.desc(), Product.id).limit(limit)
+        rows = (await self.session.execute(query)).all()
+        await self._add_shard_stock([row.Product for row in rows])
+        return rows
+
+    def _query(
+        self, join_: set[str] | None = None, fields: frozenset[str] | None = None
+    ) -> Select:
+        # The amount of a sharded product is read from its shards
+        if fields is not None and "amount" in fields:
+            fields = fields | {"stock_shards"}
+        return super()._query(join_, fields)
+
+    async def _all(self, query: Select) -> list[Product]:
+        return await self._add_shard_stock(await super()._all(query))
+
+    async def _one_or_none(self, query: Select) -> Product | None:
+        model = await super()._one_or_none(query)
+        if model is not None:
+            await self._add_shard_stock([model])
+        return model
+
+    async def _add_shard_stock(self, models: list[Product]) -> list[Product]:
+        """
+        Reports the stock of the sharded products as their amount.
+        The amount isn't marked as changed, it's never written back.
+
+        :param models: The loaded products.
+        :return: The products.
+        """
+        # Read from __dict__, stock_shards isn't loaded if amount wasn't requested
+        sharded = {
+            model.id: model for model in models if model.__dict__.get("stock_shards")
+        }
+        if not sharded:
+            return models
+
+        stock = await self.session.execute(
+            select(ProductStockShard.product_id, func.sum(ProductStockShard.amount))
+            .where(ProductStockShard.product_id.in_(list(sharded)))
+            .group_by(ProductStockShard.product_id)
+        )
+        # The amount of a sharded product is 0, the shards hold the whole stock
+        for product_id, amount in stock:
+            set_committed_value(sharded[product_id], "amount", amount)
+        return models
+
 
 class OrderCRUD(BaseCRUD[Order]):
     """
     CRUD for the order model.
     """
 
+    counted = True
+
     def __init__(self, session: AsyncSession = Depends(get_session)):
         super().__init__(model=Order, session=session)
 
     @Transactional()
+    async def update(self, model: Order, model_update: ModelType) -> Order:
+        """
+        Updates the order. Moves its units in the sales rollup to the new status.
+        The order row is locked first, so concurrent updates move the units
+        from the status committed by each other.
+        Raises a 404 if the order was deleted.
+
+        :param model: The order to update.
+        :param model_update: The model containing the attributes to update.
+        :return: The updated order instance.
+        """
+        # The loaded status may be stale, read the committed one under the lock
+        previous_status = await self.session.scalar(
+            select(Order.status)
+            .where(Order.id == model.id, Order.creation_date == model.creation_date)
+            .with_for_update()
+        )
+        if previous_status is None:
+            raise HTTPException(status_code=404, detail=f"Order {model.id} not found.")
+        model = await self._update(model, model_update)
+        if model.status != previous_status:
+            await SalesRollupCRUD(self.session).move(model, previous_status)
+        return model
+
+    @ORDER_TRANSACTION
     async def create(self, model_create: ModelType) -> ModelType:
         """
         Creates a new order in the DB. Updates the products amount.
+        Raises a 404 if a product does not exist.
+        Raises a 400 if there is not enough stock.
 
         :param model_create: The order to create.
         :return: The created order instance.
         """
+        return await self._create(model_create)
+
+    @ORDER_TRANSACTION
+    async def create_idempotent(
+        self, model_create: OrderCreate, key: str
+    ) -> Order | IdempotencyKey:
+        """
+        Creates a new order in the DB once per idempotency key.
+        The key is claimed and the response is stored in the order's transaction,
+        so a failed creation can be retried with the same key.
+        A request with a key claimed by a transaction in flight waits for it.
+        Raises a 422 if the key was used for a different order.
 
+        :param model_create: The order to create.
+        :param key: The idempotency key.
+        :return: The created order instance or the stored response to replay.
+        """
+        keys = IdempotencyKeyCRUD(self.session)
+        request_hash = sha256(model_create.model_dump_json().encode()).hexdigest()
+        stored = await keys.claim(key, request_hash)
+        if stored is not None:
+            if stored.request_hash != request_hash:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency key was used for a different order.",
+                )
+            return stored
+
+        model = await self._create(model_create)
+        await keys.store(
+            key, 201, OrderResponse.model_validate(model).model_dump_json()
+        )
+        return model
+
+    @ORDER_TRANSACTION
+    async def create_batch(
+        self, models_create: list[OrderCreate]
+    ) -> list[Order | HTTPException]:
+        """
+        Creates a batch of orders in a single transaction.
+        The referenced products (and their stock shards) are locked and loaded once,
+        the stock is validated
+        for all orders together and the rows are written with multi-row statements.
+        An invalid order doesn't affect the others.
+        The orders aren't added to the session.
+
+        :param models_create: The orders to create.
+        :return: The created order or the error for every order, in the same order.
+        """
+        product_ids = {
+            item.product_id
+            for model_create in models_create
+            for item in model_create.order_items
+        }
+        products = (
+            await self.session.execute(
+                select(Product.id, Product.amount, Product.stock_shards)
+                .where(Product.id.in_(product_ids))
+                .order_by(Product.id)
+                .with_for_update()
+            )
+        ).all()
+        stock: dict[UUID, int] = {id: amount for id, amount, _ in products}
+        sharded = [id for id, _, stock_shards in products if stock_shards]
+        if sharded:
+            for product_id, amount in await ProductCRUD(self.session).lock_shards(
+                sharded
+            ):
+                stock[product_id] += amount
+
+        results: list[Order | HTTPException] = []
+        decrements: dict[UUID, int] = defaultdict(int)
+        for model_create in models_create:
+            try:
+                self._check_stock(model_create, stock)
+            except HTTPException as exception:
+                results.append(exception)
+                continue
+            for item in model_create.order_items:
+                stock[item.product_id] -= item.amount
+                decrements[item.product_id] += item.amount
+            results.append(
+                self.model_class(**self.extract_attributes_from_schema(model_create))
+            )
+
+        orders = [result for result in results if isinstance(result, Order)]
+        if not orders:
+            return results
+
+        await self._decrement_stock(decrements)
+        await self._insert_many(Order, [order.model_dump() for order in orders])
+        await self._count_rows(len(orders))
+        await self._insert_many(
+            OrderItem,
+            [
+                {
+                    **order_item.model_dump(),
+                    "order_id": order.id,
+                    "order_creation_date": order.creation_date,
+                }
+                for order in orders
+                for order_item in order.order_items
+            ],
+        )
+        return results
+
+    async def _create(self, model_create: OrderCreate) -> Order:
         attributes = self.extract_attributes_from_schema(model_create)
         model = self.model_class(**attributes)
+        await self._decrement_stock(
+            {item.product_id: item.amount for item in model.order_items}
+        )
         self.session.add(model)
-        for order_item in model.order_items:
-            product = await self.session.get(Product, order_item.product_id)
-            product.amount -= order_item.amount
+        await self._count_rows(1)
         return model
 
-    async def get_by_id(self, id: UUID) -> ModelType:
+    async def get_by_id(
+        self,
+        id: UUID,
+        fields: frozenset[str] | None = None,
+        items: OrderItemsMode = OrderItemsMode.full,
+    ) -> ModelType:
         """
         Returns the order instance with order items matching the id.
 
         :param id: The id to match.
+        :param fields: The columns to load, all columns if None.
+        :param items: How much of the order items to load.
         :return: The order instance.
         """
-        return await super().get_by_id(id=id, join_={"order_item"})
+        return await super().get_by_id(
+            id=id, join_=ORDER_ITEMS_JOINS[items], fields=fields
+        )
 
-    async def get_all(self, offset: int, limit: int) -> List[ModelType]:
+    async def get_all(
+        self,
+        offset: int,
+        limit: int,
+        after: UUID | None = None,
+        filters: dict[str, Any] | None = None,
+        sort: SortOrder = SortOrder.asc,
+        fields: frozenset[str] | None = None,
+        items: OrderItemsMode = OrderItemsMode.full,
+    ) -> List[ModelType]:
         """
         Returns all order instances with order items.
 
         :param offset: The offset to start from.
         :param limit: The number of items to return.
+        :param after: The id to start after.
+        :param filters: The filters to apply.
+        :param sort: The sort order.
+        :param fields: The columns to load, all columns if None.
+        :param items: How much of the order items to load.
         :return: The list of order instances.
         """
-        return await super().get_all(offset=offset, limit=limit, join_={"order_item"})
+        return await super().get_all(
+            offset=offset,
+            limit=limit,
+            join_=ORDER_ITEMS_JOINS[items],
+            after=after,
+            filters=filters,
+            sort=sort,
+            fields=fields,
+        )
+
+    @staticmethod
+    def _check_stock(model_create: OrderCreate, stock: dict[UUID, int]) -> None:
+        """
+        Validates the order's contents against the loaded stock.
+        Raises a 400 if there are duplicate product ids or not enough stock.
+        Raises a 404 if a product does not exist.
+
+        :param model_create: The order to validate.
+        :param stock: The available products amount (product_id: amount).
+        :return: None
+        """
+        order_items_ids = [item.product_id for item in model_create.order_items]
+        if len(order_items_ids) != len(set(order_items_ids)):
+            raise HTTPException(status_code=400, detail="Duplicate product IDs.")
+        for item in model_create.order_items:
+            if item.product_id not in stock:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Product {item.product_id} not found.",
+                )
+            elif stock[item.product_id] < item.amount:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Product {item.product_id} not enough in stock.",
+                )
+
+    async def _decrement_stock(self, items: dict[UUID, int]) -> None:
+        """
+        Decrements the products amount with a single guarded statement.
+        A product is only updated if it has enough stock, so the check and
+        the decrement can't be split by a concurrent order.
+        The stock of sharded products is decremented in their shards.
+        Raises a 404 if a product does not exist.
+        Raises a 400 if there is not enough stock.
+
+        :param items: The amounts to decrement (product_id: amount).
+        :return: None
+        """
+        values = (
+            func.unnest(
+                bindparam("product_ids", list(items), type_=ARRAY(Uuid)),
+                bindparam("amounts", list(items.values()), type_=ARRAY(Integer)),
+            )
+            .table_valued("product_id", "amount")
+            .render_derived("items")
+        )
+        # The update locks the rows in the order of its join, which depends on
+        # the plan. The rows are locked in the id order first, like create_batch
+        # does, so concurrent orders can't deadlock. Sharded products aren't
+        # locked, their stock is in the shards
+        locked = aliased(Product)
+        stock = (
+            select(values.c.product_id, values.c.amount)
+            .join(locked, locked.id == values.c.product_id)
+            .where(locked.stock_shards == 0)
+            .order_by(values.c.product_id)
+            .with_for_update(of=locked)
+            .subquery("stock")
+        )
+        updated = await self.session.scalars(
+            update(Product)
+            .where(
+                Product.id == stock.c.product_id,
+                Product.amount >= stock.c.amount,
+            )
+            .values(amount=Product.amount - stock.c.amount)
+            .returning(Product.id)
+        )
+        rejected = set(items) - set(updated.all())
+        if not rejected:
+            self._invalidate(items, ProductCRUD.cache)
+            return
+
+        # Sharded products keep no stock in their amount, so they're rejected too
+        stock_shards: dict[UUID, int] = dict(
+            (
+                await self.session.execute(
+                    select(Product.id, Product.stock_shards).where(
+                        Product.id.in_(rejected)
+                    )
+                )
+            ).all()
+        )
+        for product_id in items:
+            if product_id not in rejected or stock_shards.get(product_id):
+                continue
+            elif product_id not in stock_shards:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Product {product_id} not found.",
+                )
+            else:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Product {product_id} not enough in stock.",
+                )
+
+        products = ProductCRUD(self.session)
+        # In the id order, so concurrent orders wait for the shards in the same order
+        for product_id in sorted(rejected):
+            await products.decrement_shards(
+                product_id, stock_shards[product_id], items[product_id]
+            )
+        self._invalidate(items, ProductCRUD.cache)
+
+    def export(
+        self,
+        since: datetime | None = None,
+        status: OrderStatus | None = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[tuple[Row, list[Row]]]:
+        """
+        Streams the orders with their items ordered by id.
+        The rows are read through a server-side cursor batch_size rows at a time,
+        so the memory use doesn't depend on the number of orders.
+
+        The stream uses its own session on the same bind: it's consumed after
+        the request's session is closed.
+
+        :param since: Only export orders created at or after this date.
+        :param status: Only export orders with this status.
+        :param batch_size: The number of rows fetched per round trip.
+        :return: An async iterator of (order, order items) rows.
+        """
+        query = (
+            select(
+                Order.id,
+                Order.creation_date,
+                Order.status,
+                OrderItem.amount,
+                OrderItem.product_id,
+                Product.name.label("product_name"),
+                Product.price.label("product_price"),
+            )
+            .join(Order.order_items)
+            .outerjoin(Product, OrderItem.product_id == Product.id)
+            .order_by(Order.id, OrderItem.id)
+            .execution_options(yield_per=batch_size)
+        )
+        query = self._filter(query, {"creation_date__gte": since, "status": status})
+        if since is not None:
+            # The planner doesn't carry the range over the join,
+            # filter the items too so their old partitions are skipped
+            query = query.where(OrderItem.order_creation_date >= since)
+        bind = self.session.bind
+
+        async def stream() -> AsyncIterator[tuple[Row, list[Row]]]:
+            async with AsyncSession(bind) as session:
+                order, items = None, []
+                async for row in await session.stream(query):
+                    if order is not None and row.id != order.id:
+                        yield order, items
+                        items = []
+                    order = row
+                    items.append(row)
+                if order is not None:
+                    yield order, items
+
+        return stream()
 
     def _join_order_item(self, query: Select) -> Select:
         """
-        Joins order_item table.
+        Joins order_item table and the columns of the products
+        in ProductResponseInOrderItem.
 
         :param query: The query to join.
         :return: Query.
         """
         return query.options(
-            selectinload(Order.order_items).selectinload(OrderItem.product)
+            selectinload(Order.order_items)
+            .selectinload(OrderItem.product)
+            .load_only(Product.name, Product.price)
         )
+
+    def _join_order_item_short(self, query: Select) -> Select:
+        """
+        Joins order_item table without the products.
+
+        :param query: The query to join.
+        :return: Query.
+        """
+        return query.options(selectinload(Order.order_items))
+
+
+class IdempotencyKeyCRUD(BaseCRUD[IdempotencyKey]):
+    """
+    CRUD for the idempotency keys of the requests.
+    """
+
+    def __init__(self, session: AsyncSession = Depends(get_session)):
+        super().__init__(model=IdempotencyKey, session=session)
+
+    async def claim(self, key: str, request_hash: str) -> IdempotencyKey | None:
+        """
+        Claims the key in the current transaction.
+        If another transaction claimed the key, waits until it's committed
+        or rolled back (then the key is claimed). An expired key is claimed again.
+
+        :param key: The idempotency key.
+        :param request_hash: The hash of the request.
+        :return: None if the key is claimed, otherwise the stored record.
+        """
+        now = datetime.now()
+        statement = pg_insert(IdempotencyKey).values(
+            key=key, request_hash=request_hash, created_at=now
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[IdempotencyKey.key],
+            set_={
+                "request_hash": statement.excluded.request_hash,
+                "created_at": statement.excluded.created_at,
+                "status_code": None,
+                "response": None,
+            },
+            where=IdempotencyKey.created_at
+            < now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+        ).returning(IdempotencyKey.key)
+        if (await self.session.execute(statement)).first() is not None:
+            return None
+
+        return await self._one_or_none(
+            self._where(self._query(), "key", key).execution_options(
+                populate_existing=True
+            )
+        )
+
+    async def store(self, key: str, status_code: int, response: str) -> None:
+        """
+        Stores the response for the claimed key.
+
+        :param key: The idempotency key.
+        :param status_code: The status code of the response.
+        :param response: The serialized response body.
+        :return: None
+        """
+        await self.session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key)
+            .values(status_code=status_code, response=response)
+            .execution_options(synchronize_session=False)
+        )
+
+    @Transactional()
+    async def purge(self, expired_before: datetime) -> int:
+        """
+        Deletes the keys created before the date.
+
+        :param expired_before: The expiration date.
+        :return: The number of deleted keys.
+        """
+        result = await self.session.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.created_at < expired_before)
+        )
+        return result.rowcount
+
+
+class RowCountCRUD(BaseCRUD[RowCount]):
+    """
+    CRUD for the row counters of the tables of counted CRUDs.
+    """
+
+    def __init__(self, session: AsyncSession = Depends(get_session)):
+        super().__init__(model=RowCount, session=session)
+
+    async def add(self, model_class: Type[SQLModel], delta: int) -> None:
+        """
+        Adds the delta to a random slot of the table's counter in the current transaction.
+
+        :param model_class: The model of the table.
+        :param delta: The number of inserted (or deleted, if negative) rows.
+        :return: None
+        """
+        statement = pg_insert(RowCount).values(
+            table_name=model_class.__tablename__,
+            slot=random.randrange(settings.ROW_COUNT_SLOTS),
+            count=delta,
+        )
+        await self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[RowCount.table_name, RowCount.slot],
+                set_={"count": RowCount.count + statement.excluded.count},
+            )
+        )
+
+    async def get(self, model_class: Type[SQLModel]) -> int:
+        """
+        Returns the number of rows of the table.
+
+        :param model_class: The model of the table.
+        :return: The sum of the slots of the table's counter.
+        """
+        count = await self.session.scalar(
+            select(func.sum(RowCount.count)).where(
+                RowCount.table_name == model_class.__tablename__
+            )
+        )
+        return int(count or 0)
+
+    @Transactional()
+    async def recount(self, model_classes: list[Type[SQLModel]]) -> None:
+        """
+        Resets the counters of the tables to their number of rows,
+        after the rows were changed without the CRUDs.
+        The tables are locked against writes until the counters are reset.
+
+        :param model_classes: The models of the tables.
+        :return: None
+        """
+        for model_class in model_classes:
+            table_name = model_class.__tablename__
+            await self.session.execute(text(f'LOCK TABLE "{table_name}" IN SHARE MODE'))
+            await self.session.execute(
+                delete(RowCount).where(RowCount.table_name == table_name)
+            )
+            await self.session.execute(
+                insert(RowCount).from_select(
+                    ["table_name", "slot", "count"],
+                    select(literal(table_name), literal(0), func.count()).select_from(
+                        model_class
+                    ),
+                )
+            )
+
+
+class OrderPartitionCRUD(BaseCRUD[Order]):
+    """
+    CRUD for the monthly partitions of the orders and their items.
+    The partitions of a month are named after it (see PARTITION_NAME),
+    the order items partition has the foreign key to the orders partition.
+    """
+
+    # Key of the advisory lock taken while the partitions are created
+    LOCK_KEY = 0x6F726465
+
+    def __init__(self, session: AsyncSession = Depends(get_session)):
+        super().__init__(model=Order, session=session)
+
+    async def get_months(self) -> list[date]:
+        """
+        Returns the months the orders are partitioned into.
+
+        :return: The first day of every month, in order.
+        """
+        names = await self.session.scalars(
+            text(
+                "SELECT partition.relname FROM pg_inherits "
+                "JOIN pg_class AS partition ON partition.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = CAST('\"order\"' AS regclass)"
+            )
+        )
+        months = []
+        for name in names:
+            match = PARTITION_NAME.match(name)
+            if match is not None:
+                months.append(date(int(match.group(2)), int(match.group(3)), 1))
+        return sorted(months)
+
+    @Transactional()
+    async def create(self, months: list[date]) -> list[date]:
+        """
+        Creates the partitions of the orders and their items for the months
+        that don't have them yet. Concurrent calls wait for each other.
+        Creating a partition locks the partitioned table, so it gives up
+        instead of waiting more than a few seconds for a long query.
+
+        :param months: The first day of every month.
+        :return: The months the partitions were created for.
+        """
+        await self.session.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": self.LOCK_KEY}
+        )
+        await self.session.execute(text("SET LOCAL lock_timeout = '5s'"))
+        existing = set(await self.get_months())
+        created = []
+        for month in sorted(set(months) - existing):
+            # Any day of the next month is less than 32 days after the first
+            end = (month + timedelta(days=31)).replace(day=1)
+            suffix = f"p{month:%Y_%m}"
+            for statement in (
+                f'CREATE TABLE "order_{suffix}" PARTITION OF "order" '
+                f"FOR VALUES FROM ('{month}') TO ('{end}')",
+                f'CREATE TABLE "order_item_{suffix}" PARTITION OF "order_item" '
+                f"FOR VALUES FROM ('{month}') TO ('{end}')",
+                # Deferrable, so an order can move to another month with its items
+                f'ALTER TABLE "order_item_{suffix}" '
+                f'ADD CONSTRAINT "order_item_{suffix}_order_fkey" '
+                "FOREIGN KEY (order_id, order_creation_date) "
+                f'REFERENCES "order_{suffix}" (id, creation_date) DEFERRABLE',
+            ):
+                await self.session.execute(text(statement))
+            created.append(month)
+        return created
+
+    @Transactional()
+    async def detach(self, before: date, concurrently: bool = True) -> list[date]:
+        """
+        Detaches the partitions of the months before the given one from the orders
+        and their items, without deleting the rows.
+        Then the orders of the detached tables are subtracted from the row counter and
+        the tables are renamed with a _detached suffix in the same transaction,
+        so every detached month is counted once. Archive or drop the renamed tables.
+        A concurrent detach doesn't block the queries of the orders,
+        but it can't run in a transaction: every statement is committed on its own.
+        A detach interrupted before the end is finished by the next call:
+        the pending partitions are finalized and the detached tables that weren't
+        renamed are counted.
+
+        :param before: The first day of the first month to keep.
+        :param concurrently: Whether to detach the partitions concurrently.
+        :return: The months the detached partitions were counted for.
+        """
+        if concurrently:
+            await self.session.connection(
+                execution_options={"isolation_level": "AUTOCOMMIT"}
+            )
+            await self._detach_partitions(before, concurrently)
+            # The autocommit connection is released, the counter update is a transaction
+            await self.session.commit()
+        else:
+            await self._detach_partitions(before, concurrently)
+        return await self._count_detached()
+
+    async def _detach_partitions(self, before: date, concurrently: bool) -> None:
+        """
+        Detaches the partitions of the months before the given one.
+        The items of a month are detached before its orders, and the pending
+        partitions first: a concurrent detach fails while another one is pending.
+
+        :param before: The first day of the first month to keep.
+        :param concurrently: Whether to detach the partitions concurrently.
+        :return: None
+        """
+        partitions = await self.session.execute(
+            text(
+                "SELECT partition.relname, pg_inherits.inhdetachpending FROM pg_inherits "
+                "JOIN pg_class AS partition ON partition.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent IN "
+                "(CAST('\"order\"' AS regclass), CAST('order_item' AS regclass))"
+            )
+        )
+        detached = []
+        for name, pending in partitions:
+            match = PARTITION_NAME.match(name)
+            if match is None:
+                continue
+            month = date(int(match.group(2)), int(match.group(3)), 1)
+            if month < before:
+                detached.append((month, match.group(1), name, pending))
+        detached.sort(
+            key=lambda partition: (
+                not partition[3],
+                partition[0],
+                partition[1] == "order",
+            )
+        )
+        for _, table_name, name, pending in detached:
+            if pending:
+                mode = " FINALIZE"
+            elif concurrently:
+                mode = " CONCURRENTLY"
+            else:
+                mode = ""
+            await self.session.execute(
+                text(f'ALTER TABLE "{table_name}" DETACH PARTITION "{name}"{mode}')
+            )
+
+    async def _count_detached(self) -> list[date]:
+        """
+        Subtracts the orders of the detached tables that weren't counted yet from
+        the row counter and renames the tables of their month.
+        Nothing is inserted into a detached table, so the count is exact.
+
+        :return: The months the detached tables were counted for.
+        """
+        await self.session.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": self.LOCK_KEY}
+        )
+        names = await self.session.scalars(
+            text(
+                "SELECT relname FROM pg_class "
+                "WHERE relkind = 'r' AND NOT relispartition "
+                "AND relnamespace = CAST(current_schema() AS regnamespace)"
+            )
+        )
+        months = []
+        for name in names:
+            match = PARTITION_NAME.match(name)
+            if match is not None and match.group(1) == "order" and not match.group(4):
+                months.append(date(int(match.group(2)), int(match.group(3)), 1))
+        months.sort()
+        for month in months:
+            suffix = f"p{month:%Y_%m}"
+            detached = await self.session.scalar(
+                text(f'SELECT count(*) FROM "order_{suffix}"')
+            )
+            if detached:
+                await RowCountCRUD(self.session).add(Order, -detached)
+            for table_name in ("order_item", "order"):
+                await self.session.execute(
+                    text(
+                        f'ALTER TABLE IF EXISTS "{table_name}_{suffix}" '
+                        f'RENAME TO "{table_name}_{suffix}_detached"'
+                    )
+                )
+        return months
+
+
+class SalesRollupCRUD(BaseCRUD[SalesRollup]):
+    """
+    CRUD for the sales rollup.
+    refresh adds the orders inserted after the watermark to the rollup and moves it,
+    so it never scans the whole order history.
+    The watermark is a transaction id, not a creation date: an order can commit
+    long after its creation date, but it can't commit before its transaction.
+    Status updates of rolled up orders move their units to the new status.
+    Reports read the orders inserted after the watermark on top of the rollup.
+    """
+
+    def __init__(self, session: AsyncSession = Depends(get_session)):
+        super().__init__(model=SalesRollup, session=session)
+
+    @Transactional()
+    async def refresh(self, until: int | None = None) -> int:
+        """
+        Rolls up the orders inserted by the transactions from the watermark
+        up to the given one.
+        Concurrent refreshes wait for each other on the watermark row.
+
+        :param until: The transaction id to roll up the orders until (excluded).
+            By default, the oldest running transaction: the transactions before it
+            are committed or rolled back, so none of their orders is left behind.
+        :return: The new watermark.
+        """
+        await self.session.execute(
+            pg_insert(SalesRollupWatermark).values(id=1).on_conflict_do_nothing()
+        )
+        refreshed_xid = await self.session.scalar(
+            select(SalesRollupWatermark.refreshed_xid)
+            .where(SalesRollupWatermark.id == 1)
+            .with_for_update()
+        )
+        if until is None:
+            until = await self.session.scalar(
+                select(
+                    cast(
+                        cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text),
+                        BigInteger,
+                    )
+                )
+            )
+        if refreshed_xid is not None and refreshed_xid >= until:
+            return refreshed_xid
+
+        creation_xid = Order.__table__.c.creation_xid
+        day = cast(Order.creation_date, Date)
+        query = (
+            select(day, OrderItem.product_id, Order.status, func.sum(OrderItem.amount))
+            .join(OrderItem.order)
+            .where(creation_xid < until, OrderItem.product_id.is_not(None))
+            .group_by(day, OrderItem.product_id, Order.status)
+        )
+        if refreshed_xid is not None:
+            query = query.where(creation_xid >= refreshed_xid)
+        statement = pg_insert(SalesRollup).from_select(
+            ["day", "product_id", "status", "units"], query
+        )
+        await self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[
+                    SalesRollup.day,
+                    SalesRollup.product_id,
+                    SalesRollup.status,
+                ],
+                set_={"units": SalesRollup.units + statement.excluded.units},
+            )
+        )
+        await self.session.execute(
+            update(SalesRollupWatermark)
+            .where(SalesRollupWatermark.id == 1)
+            .values(refreshed_xid=until)
+            .execution_options(synchronize_session=False)
+        )
+        return until
+
+    async def move(self, order: Order, previous_status: OrderStatus) -> None:
+        """
+        Moves the units of the order from the previous status to its current one
+        in the current transaction, if the order is rolled up.
+        Waits for a running refresh, so the order is either rolled up
+        by it with the new status or moved here.
+
+        :param order: The order with the new status.
+        :param previous_status: The status the order was rolled up with.
+        :return: None
+        """
+        refreshed_xid = await self.session.scalar(
+            select(SalesRollupWatermark.refreshed_xid)
+            .where(SalesRollupWatermark.id == 1)
+            .with_for_update(read=True)
+        )
+        if refreshed_xid is None:
+            return
+
+        day = order.creation_date.date()
+        # Nothing is moved if the order was inserted after the watermark
+        units = (
+            select(OrderItem.product_id, func.sum(OrderItem.amount).label("units"))
+            .join(OrderItem.order)
+            .where(
+                OrderItem.order_id == order.id,
+                OrderItem.order_creation_date == order.creation_date,
+                OrderItem.product_id.is_not(None),
+                Order.__table__.c.creation_xid < refreshed_xid,
+            )
+            .group_by(OrderItem.product_id)
+            .subquery()
+        )
+        statement = pg_insert(SalesRollup).from_select(
+            ["day", "product_id", "status", "units"],
+            select(
+                literal(day, Date),
+                units.c.product_id,
+                literal(order.status, SalesRollup.status.type),
+                units.c.units,
+            ),
+        )
+        await self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[
+                    SalesRollup.day,
+                    SalesRollup.product_id,
+                    SalesRollup.status,
+                ],
+                set_={"units": SalesRollup.units + statement.excluded.units},
+            )
+        )
+        await self.session.execute(
+            update(SalesRollup)
+            .where(
+                SalesRollup.day == day,
+                SalesRollup.status == previous_status,
+                SalesRollup.product_id == units.c.product_id,
+            )
+            .values(units=SalesRollup.units - units.c.units)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def report(
+        self,
+        group_by: SalesGroupBy,
+        date_from: date | None = None,
+        date_to: date | None = None,
+    ) -> list[Row]:
+        """
+        Returns the units sold and the revenue (at the current product prices)
+        grouped by product, day or status.
+        The orders inserted after the watermark are read from the orders,
+        in the same statement, so the report is up to date.
+
+        :param group_by: The grouping.
+        :param date_from: Only count the orders created on or after this day.
+        :param date_to: Only count the orders created before this day.
+        :return: The rows with the group columns, units and revenue.
+        """
+        watermark = (
+            select(SalesRollupWatermark.refreshed_xid)
+            .where(SalesRollupWatermark.id == 1)
+            .scalar_subquery()
+        )
+        rolled_up = select(
+            SalesRollup.day,
+            SalesRollup.product_id,
+            SalesRollup.status,
+            SalesRollup.units,
+        )
+        day = cast(Order.creation_date, Date)
+        recent = (
+            select(
+                day.label("day"),
+                OrderItem.product_id,
+                Order.status,
+                OrderItem.amount.label("units"),
+            )
+            .join(OrderItem.order)
+            .where(
+                or_(watermark.is_(None), Order.__table__.c.creation_xid >= watermark),
+                OrderItem.product_id.is_not(None),
+            )
+        )
+        if date_from is not None:
+            rolled_up = rolled_up.where(SalesRollup.day >= date_from)
+            recent = recent.where(
+                Order.creation_date >= date_from,
+                OrderItem.order_creation_date >= date_from,
+            )
+        if date_to is not None:
+            rolled_up = rolled_up.where(SalesRollup.day < date_to)
+            recent = recent.where(
+                Order.creation_date < date_to,
+                OrderItem.order_creation_date < date_to,
+            )
+        sales = union_all(rolled_up, recent).subquery()
+
+        columns = {
+            SalesGroupBy.product: [
+                sales.c.product_id,
+                Product.name.label("product_name"),
+            ],
+            SalesGroupBy.day: [sales.c.day],
+            SalesGroupBy.status: [sales.c.status],
+        }[group_by]
+        units = func.sum(sales.c.units)
+        revenue = func.coalesce(func.sum(sales.c.units * Product.price), 0)
+        query = (
+            select(
+                *columns,
+                units.label("units"),
+                revenue.label("revenue"),
+            )
+            .select_from(sales)
+            .outerjoin(Product, Product.id == sales.c.product_id)
+            .group_by(*columns)
+            .having(units > 0)
+        )
+        if group_by == SalesGroupBy.product:
+            query = query.order_by(revenue.desc(), sales.c.product_id)
+        else:
+            query = query.order_by(*columns)
+        return list((await self.session.execute(query)).all())
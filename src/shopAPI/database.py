@@ -1,20 +1,27 @@
-from asyncio import current_task
+import asyncio
+import random
+from dataclasses import dataclass
 from functools import wraps
-from typing import AsyncGenerator, Union
-from uuid import UUID
+from time import perf_counter
+from typing import Any, AsyncGenerator, Callable, Union
+from uuid import UUID, uuid4
 from uuid_extensions import uuid7
 
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
-    async_scoped_session,
     create_async_engine,
     async_sessionmaker,
     AsyncEngine,
     AsyncConnection,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from sqlmodel import Field, SQLModel
 
-from shopAPI.config import settings
+from shopAPI import metrics
+from shopAPI.config import Settings, settings
+from shopAPI.instrumentation import instrument_engine
 
 
 class IdMixin(SQLModel):
@@ -25,62 +32,232 @@ class IdMixin(SQLModel):
     id: UUID = Field(
         default_factory=uuid7,
         primary_key=True,
-        index=True,
         nullable=False,
     )
 
 
+RETRYABLE_SQLSTATES = frozenset(
+    {
+        "40001",  # serialization_failure
+        "40P01",  # deadlock_detected
+    }
+)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    How Transactional retries a transaction failed with one of the SQLSTATEs.
+    Waits a random time up to the exponential backoff between the attempts.
+    """
+
+    attempts: int = 1
+    backoff: float = 0.01
+    max_backoff: float = 0.5
+    sqlstates: frozenset[str] = RETRYABLE_SQLSTATES
+
+    def delay(self, attempt: int) -> float:
+        """
+        Returns the time to wait after the failed attempt.
+
+        :param attempt: The number of the failed attempt, starting from 1.
+        :return: The delay in seconds.
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+
+def sqlstate(exception: BaseException) -> str | None:
+    """
+    Returns the SQLSTATE of a database error.
+
+    :param exception: The exception.
+    :return: The SQLSTATE or None if it isn't a database error.
+    """
+    if isinstance(exception, DBAPIError):
+        return getattr(exception.orig, "sqlstate", None)
+    return None
+
+
 class Transactional:
     """
-    Decorator for async database transactions.
+    Decorator for async database transactions of the CRUD methods.
+    Uses the session of the CRUD instance (the first argument).
     Commits the transaction on success or rolls back on exception.
+    Runs the callbacks registered with after_commit once the transaction is committed.
+
+    The isolation level is set when the transaction is started by the decorated function.
+    A transaction failed with a retryable SQLSTATE is rolled back and the function
+    is called again, up to the attempts of the retry policy. When the attempts are over,
+    a 503 is raised. Only retry functions that load everything they use
+    inside the transaction: the rollback expires the objects loaded before it.
     """
 
+    def __init__(
+        self, isolation_level: str | None = None, retry: RetryPolicy = RetryPolicy()
+    ):
+        self.isolation_level = isolation_level
+        self.retry = retry
+
     def __call__(self, function):
         @wraps(function)
         async def decorator(*args, **kwargs):
-            try:
-                result = await function(*args, **kwargs)
-                await session.commit()
+            session = args[0].session
+            attempt = 1
+            while True:
+                try:
+                    if self.isolation_level is not None:
+                        await session.connection(
+                            execution_options={"isolation_level": self.isolation_level}
+                        )
+                    result = await function(*args, **kwargs)
+                    await session.commit()
+                except Exception as exception:
+                    session.info.pop("after_commit", None)
+                    await session.rollback()
+                    state = sqlstate(exception)
+                    if state not in self.retry.sqlstates:
+                        raise exception
+                    if attempt >= self.retry.attempts:
+                        metrics.DB_TRANSACTION_ABORTS.inc(function.__qualname__, state)
+                        raise HTTPException(
+                            status_code=503,
+                            detail="The transaction conflicted with concurrent ones, "
+                            "try again later.",
+                        ) from exception
+                    metrics.DB_TRANSACTION_RETRIES.inc(function.__qualname__, state)
+                    await asyncio.sleep(self.retry.delay(attempt))
+                    attempt += 1
+                    continue
+                for callback in session.info.pop("after_commit", []):
+                    callback()
                 return result
-            except Exception as exception:
-                await session.rollback()
-                raise exception
 
         return decorator
 
 
-def prepare_session(bind: Union[AsyncEngine, AsyncConnection]) -> AsyncSession:
-    async_session_factory = async_sessionmaker(
+def after_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """
+    Registers a callback to run after the current transaction is committed
+    by Transactional. The callback is dropped if the transaction is rolled back.
+
+    :param session: The session running the transaction.
+    :param callback: The callback to run.
+    :return: None
+    """
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+def prepare_session_factory(
+    bind: Union[AsyncEngine, AsyncConnection], info: dict | None = None
+) -> async_sessionmaker[AsyncSession]:
+    """
+    Returns the factory of the sessions on the bind.
+
+    :param bind: The engine or connection the sessions use.
+    :param info: The info dictionary of the sessions.
+    :return: The session factory.
+    """
+    return async_sessionmaker(
         bind=bind,
         expire_on_commit=False,
+        info=info,
     )
-    session = async_scoped_session(
-        session_factory=async_session_factory,
-        scopefunc=current_task,
-    )
 
-    return session
 
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Connection pool measuring how long a checkout waits for a connection.
+    The waits are labelled with the pool, so the replicas don't hide the primary.
+    """
+
+    pool = "primary"
 
-engine = create_async_engine(
-    str(settings.DB_URI),
-    echo=settings.DB_ECHO,
-    future=True,
-    pool_size=settings.DB_POOL_SIZE,
-)
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.DB_POOL_CHECKOUT_DURATION.observe(perf_counter() - start, self.pool)
+
+
+class ReplicaPool(InstrumentedPool):
+    """
+    Connection pool of a read replica.
+    """
+
+    pool = "replica"
+
+
+def _unique_statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
+
+
+def engine_options(settings: Settings, replica: bool = False) -> dict[str, Any]:
+    """
+    Returns the create_async_engine arguments for the pool and connection settings.
+
+    In the PgBouncer mode (transaction pooling) server connections are shared
+    between clients, so prepared statements aren't cached and get unique names,
+    the pooling is left to PgBouncer and the server settings aren't sent
+    as startup parameters (PgBouncer rejects them), set them on the role or
+    database instead.
+
+    :param settings: The settings.
+    :param replica: Whether the engine connects to a read replica.
+    :return: The engine arguments.
+    """
+    connect_args: dict[str, Any] = {
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+    options: dict[str, Any] = {
+        "echo": settings.DB_ECHO,
+        "future": True,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "connect_args": connect_args,
+    }
+    if settings.DB_PGBOUNCER:
+        connect_args.update(
+            prepared_statement_cache_size=0,
+            statement_cache_size=0,
+            prepared_statement_name_func=_unique_statement_name,
+        )
+        options["poolclass"] = NullPool
+        return options
+
+    server_settings = {}
+    if settings.DB_STATEMENT_TIMEOUT:
+        server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT)
+    if not settings.DB_JIT:
+        server_settings["jit"] = "off"
+    if server_settings:
+        connect_args["server_settings"] = server_settings
+    options.update(
+        poolclass=ReplicaPool if replica else InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    return options
+
+
+engine = create_async_engine(str(settings.DB_URI), **engine_options(settings))
+if isinstance(engine.pool, InstrumentedPool):
+    metrics.DB_POOL_CHECKED_OUT.set_function(lambda: engine.pool.checkedout())
+    metrics.DB_POOL_OVERFLOW.set_function(lambda: engine.pool.overflow())
+instrument_engine(engine)
 
-session = prepare_session(engine)
+session_factory = prepare_session_factory(engine)
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     """
-    Get the database session.
+    Get a database session for the request.
     This can be used for dependency injection.
+    Every dependency of a request gets the same session,
+    it's closed (rolling back an uncommitted transaction) when the request is done.
 
     :return: The database session.
     """
-    try:
+    async with session_factory() as session:
         yield session
-    finally:
-        await session.close()
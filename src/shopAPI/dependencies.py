@@ -1,7 +1,21 @@
+from typing import Callable
 from uuid import UUID
-from fastapi import Depends, HTTPException
+from fastapi import Depends, Header, HTTPException, Query, Response
+from pydantic import BaseModel
+from shopAPI.batching import order_batcher
+from shopAPI.config import settings
 from shopAPI.crud import OrderCRUD, ProductCRUD
-from shopAPI.models import Order, OrderCreate, Product
+from shopAPI.idempotency import IDEMPOTENCY_KEY_HEADER, replay_response
+from shopAPI.models import (
+    IdempotencyKey,
+    Order,
+    OrderCreate,
+    OrderItemsMode,
+    OrderResponse,
+    Product,
+    ProductResponse,
+)
+from shopAPI.pagination import decode_cursor
 
 
 async def valid_product_id(
@@ -22,6 +36,63 @@ async def valid_product_id(
     return product
 
 
+def valid_fields(model: type[BaseModel]) -> Callable:
+    """
+    Returns a dependency parsing the fields query parameter:
+    a comma separated list of the fields of the response model to return.
+    Raises a 400 if a field isn't in the model.
+
+    :param model: The response model.
+    :return: The dependency, it returns the fields (always with the id) or None.
+    """
+    names = list(model.model_fields)
+
+    async def dependency(
+        fields: str | None = Query(
+            None,
+            description=f"Comma separated fields to return ({', '.join(names)}), "
+            "the id is always returned. All fields if not set.",
+        ),
+    ) -> frozenset[str] | None:
+        if fields is None:
+            return None
+
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested.difference(names)
+        if unknown:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}."
+            )
+        return frozenset(requested | {"id"})
+
+    return dependency
+
+
+valid_product_fields = valid_fields(ProductResponse)
+valid_order_fields = valid_fields(OrderResponse)
+
+
+async def valid_product_id_read(
+    id: UUID,
+    fields: frozenset[str] | None = Depends(valid_product_fields),
+    crud: ProductCRUD = Depends(ProductCRUD.read_only),
+) -> Product:
+    """
+    Same as valid_product_id, but the product may be read from a replica
+    and only the requested fields may be loaded.
+    Use it in handlers without writes.
+
+    :param id: The id to match.
+    :param fields: The fields to load, all fields if None.
+    :return: The product instance.
+    """
+    product = await crud.get_by_id(id=id, fields=fields)
+    if not product:
+        raise HTTPException(status_code=404, detail=f"Product {id} not found.")
+
+    return product
+
+
 async def valid_order_id(
     id: UUID,
     crud: OrderCRUD = Depends(),
@@ -40,18 +111,69 @@ async def valid_order_id(
     return order
 
 
+async def valid_order_items(
+    items: OrderItemsMode = Query(
+        OrderItemsMode.full,
+        description="The order items with their products (full), "
+        "with the product ids only (short) or none.",
+    ),
+) -> OrderItemsMode:
+    """
+    Returns the order items mode, a dependency so the handler and
+    valid_order_id_read share one query parameter.
+
+    :param items: The order items mode.
+    :return: The order items mode.
+    """
+    return items
+
+
+async def valid_order_id_read(
+    id: UUID,
+    fields: frozenset[str] | None = Depends(valid_order_fields),
+    items: OrderItemsMode = Depends(valid_order_items),
+    crud: OrderCRUD = Depends(OrderCRUD.read_only),
+) -> Order:
+    """
+    Same as valid_order_id, but the order may be read from a replica
+    and only the requested fields and order items may be loaded.
+    Use it in handlers without writes.
+
+    :param id: The id to match.
+    :param fields: The fields to load, all fields if None.
+    :param items: How much of the order items to load.
+    :return: The order instance.
+    """
+    order = await crud.get_by_id(id=id, fields=fields, items=items)
+    if not order:
+        raise HTTPException(status_code=404, detail=f"Order {id} not found.")
+
+    return order
+
+
 async def valid_order_contents(
     data: OrderCreate,
+    idempotency_key: str | None = Header(
+        None,
+        alias=IDEMPOTENCY_KEY_HEADER,
+        min_length=1,
+        max_length=255,
+        description="Unique key of the order, a retry with the same key "
+        "returns the stored response instead of creating the order again.",
+    ),
     order_crud: OrderCRUD = Depends(),
-    product_crud: ProductCRUD = Depends(),
-) -> Order:
+) -> Order | Response:
     """
-    Validates the order's contents.
-    Raises a 404 if the product does not exist.
-    Raises a 400 if there is not enough stock or if there are duplicate product ids.
+    Validates the order's contents and creates the order.
+    Raises a 400 if there are duplicate product ids.
+    The products existence and stock are checked by the order creation itself.
+    With an idempotency key the order is created once,
+    the repeated requests get the stored response.
+    Other orders are created in batches if ORDER_BATCHING is on.
 
     :param data: The order to validate.
-    :return: The order instance.
+    :param idempotency_key: The idempotency key.
+    :return: The order instance or the stored response.
     """
     order_items_ids: list[UUID] = [item.product_id for item in data.order_items]
     if len(order_items_ids) != len(set(order_items_ids)):
@@ -59,19 +181,59 @@ async def valid_order_contents(
             status_code=400,
             detail="Duplicate product IDs.",
         )
-    products: list[Product] = await product_crud.get_all_by_ids(ids=order_items_ids)
-    products_dict: dict = {product.id: product for product in products}
-    for item in data.order_items:
-        product: Product = products_dict.get(item.product_id)
-        if not product:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Product {item.product_id} not found.",
-            )
-        elif product.amount < item.amount:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Product {product.id} not enough in stock.",
-            )
 
-    return await order_crud.create(data)
+    if idempotency_key is None:
+        if settings.ORDER_BATCHING:
+            return await order_batcher.create(order_crud, data)
+        return await order_crud.create(data)
+
+    result = await order_crud.create_idempotent(data, idempotency_key)
+    if isinstance(result, IdempotencyKey):
+        return replay_response(result)
+    return result
+
+
+async def valid_cursor(
+    cursor: str | None = Query(
+        None,
+        description="Cursor from the X-Next-Cursor header of the previous page.",
+    ),
+) -> UUID | None:
+    """
+    Returns the id encoded in the pagination cursor.
+    Raises a 400 if the cursor is malformed.
+
+    :param cursor: The cursor to decode.
+    :return: The id to start after or None.
+    """
+    if cursor is None:
+        return None
+
+    try:
+        (id,) = decode_cursor(cursor)
+        return UUID(str(id))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+async def valid_search_cursor(
+    cursor: str | None = Query(
+        None,
+        description="Cursor from the X-Next-Cursor header of the previous page.",
+    ),
+) -> tuple[float, UUID] | None:
+    """
+    Returns the rank and the id encoded in the search pagination cursor.
+    Raises a 400 if the cursor is malformed.
+
+    :param cursor: The cursor to decode.
+    :return: The rank and the id to start after or None.
+    """
+    if cursor is None:
+        return None
+
+    try:
+        rank, id = decode_cursor(cursor)
+        return float(rank), UUID(str(id))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
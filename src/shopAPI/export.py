@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from typing import AsyncIterator
+
+from sqlalchemy import Row
+
+from shopAPI.models import ExportFormat, OrderResponse
+
+CSV_HEADER = (
+    "order_id",
+    "creation_date",
+    "status",
+    "product_id",
+    "product_name",
+    "product_price",
+    "amount",
+)
+
+
+def order_to_dict(order: Row, items: list[Row]) -> dict:
+    """
+    Returns the order in the same JSON form as OrderResponseWithItems.
+
+    :param order: The order row.
+    :param items: The order items rows.
+    :return: The order as a dictionary.
+    """
+    return {
+        **OrderResponse.model_validate(order).model_dump(mode="json"),
+        "order_items": [
+            {
+                "amount": item.amount,
+                "product": (
+                    {
+                        "name": item.product_name,
+                        "price": item.product_price,
+                        "id": str(item.product_id),
+                    }
+                    if item.product_id is not None
+                    else None
+                ),
+            }
+            for item in items
+        ],
+    }
+
+
+async def ndjson_lines(
+    orders: AsyncIterator[tuple[Row, list[Row]]],
+) -> AsyncIterator[str]:
+    """
+    Yields one JSON line per order.
+
+    :param orders: The orders with their items.
+    :return: An async iterator of lines.
+    """
+    async for order, items in orders:
+        yield json.dumps(order_to_dict(order, items)) + "\n"
+
+
+async def csv_lines(orders: AsyncIterator[tuple[Row, list[Row]]]) -> AsyncIterator[str]:
+    """
+    Yields the CSV header and then one row per order item.
+
+    :param orders: The orders with their items.
+    :return: An async iterator of lines.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    async for order, items in orders:
+        head = OrderResponse.model_validate(order).model_dump(mode="json")
+        for item in items:
+            writer.writerow(
+                (
+                    head["id"],
+                    head["creation_date"],
+                    head["status"],
+                    item.product_id,
+                    item.product_name,
+                    item.product_price,
+                    item.amount,
+                )
+            )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+EXPORT_WRITERS = {
+    ExportFormat.ndjson: (ndjson_lines, "application/x-ndjson"),
+    ExportFormat.csv: (csv_lines, "text/csv"),
+}
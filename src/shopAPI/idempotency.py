@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from fastapi import Response
+
+from shopAPI import database
+from shopAPI.config import settings
+from shopAPI.crud import IdempotencyKeyCRUD
+from shopAPI.models import IdempotencyKey
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENT_REPLAYED_HEADER = "Idempotent-Replayed"
+
+logger = logging.getLogger(__name__)
+
+
+def replay_response(stored: IdempotencyKey) -> Response:
+    """
+    Returns the response stored for an idempotency key.
+
+    :param stored: The stored idempotency key.
+    :return: The response.
+    """
+    return Response(
+        content=stored.response,
+        status_code=stored.status_code,
+        media_type="application/json",
+        headers={IDEMPOTENT_REPLAYED_HEADER: "true"},
+    )
+
+
+async def purge_idempotency_keys() -> None:
+    """
+    Deletes the expired idempotency keys every IDEMPOTENCY_PURGE_INTERVAL seconds.
+    Runs until cancelled.
+
+    :return: None
+    """
+    while True:
+        expired_before = datetime.now() - timedelta(
+            seconds=settings.IDEMPOTENCY_KEY_TTL
+        )
+        try:
+            async with database.session_factory() as session:
+                purged = await IdempotencyKeyCRUD(session).purge(expired_before)
+            logger.info("Purged %d expired idempotency keys.", purged)
+        except Exception:
+            logger.exception("Failed to purge the expired idempotency keys.")
+        await asyncio.sleep(settings.IDEMPOTENCY_PURGE_INTERVAL)
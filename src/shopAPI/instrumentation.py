@@ -0,0 +1,169 @@
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Generator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from shopAPI.config import settings
+
+SERVER_TIMING_HEADER = "Server-Timing"
+# Transaction control isn't counted, like BEGIN/COMMIT which asyncpg doesn't run on a cursor
+SAVEPOINT_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """
+    Number of queries, time spent in the database and executions per statement
+    collected while the stats are active.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Counter[str] = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        Returns the statements executed more than threshold times.
+
+        :param threshold: The maximum number of executions of one statement.
+        :return: The list of statements and their execution counts.
+        """
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count > threshold
+        ]
+
+    def server_timing(self) -> str:
+        """
+        Returns the stats as a Server-Timing header value.
+
+        :return: The header value.
+        """
+        return f'db;dur={self.duration * 1000:.3f};desc="{self.count} queries"'
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def collect_queries() -> Generator[QueryStats, None, None]:
+    """
+    Collects the queries executed in the current context (and the tasks started from it).
+
+    :return: The stats, filled in while the block runs.
+    """
+    stats = QueryStats()
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context, not the connection: a failed statement
+    # doesn't run after_cursor_execute and would leave its start behind
+    if _query_stats.get() is not None and context is not None:
+        context.query_start = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _query_stats.get()
+    start = getattr(context, "query_start", None)
+    if stats is None or start is None:
+        return
+    if statement.startswith(SAVEPOINT_STATEMENTS):
+        return
+    stats.record(statement, perf_counter() - start)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Registers the listeners recording the queries of the engine into the active stats.
+    Nothing is recorded outside collect_queries.
+
+    :param engine: The engine to instrument.
+    :return: None
+    """
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware collecting the queries of every request.
+    Adds the totals to the response as a Server-Timing header
+    and logs a warning for statements repeated more than DB_N_PLUS_ONE_THRESHOLD times,
+    which usually means a query runs in a loop (N+1).
+    Queries of a streamed body run after the headers are sent
+    and are only counted for the warning.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with collect_queries() as stats:
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers.append(SERVER_TIMING_HEADER, stats.server_timing())
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                self._warn_repeated(scope, stats)
+
+    @staticmethod
+    def _warn_repeated(scope: Scope, stats: QueryStats) -> None:
+        threshold = settings.DB_N_PLUS_ONE_THRESHOLD
+        if threshold <= 0:
+            return
+        for statement, count in stats.repeated(threshold):
+            logger.warning(
+                "Possible N+1 query in %s %s: statement executed %d times: %s",
+                scope["method"],
+                scope["path"],
+                count,
+                statement,
+            )
+
+
+def parse_server_timing(value: str) -> dict[str, Any]:
+    """
+    Parses the db entry of a Server-Timing header created by QueryStatsMiddleware.
+
+    :param value: The header value.
+    :return: The dictionary with the number of queries and the duration in milliseconds.
+    """
+    for entry in value.split(","):
+        name, *params = entry.strip().split(";")
+        if name != "db":
+            continue
+        params = dict(param.split("=", 1) for param in params)
+        return {
+            "queries": int(params["desc"].strip('"').split()[0]),
+            "duration": float(params["dur"]),
+        }
+    raise ValueError("No db entry in the Server-Timing header.")
@@ -0,0 +1,263 @@
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Iterable, Sequence
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched"
+# Clients can send any method, the others are counted together
+HTTP_METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "CONNECT", "TRACE")
+)
+OTHER_METHOD = "OTHER"
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = (
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base class for the metrics.
+    Values are kept in a dictionary keyed by the tuple of label values,
+    updates are plain dictionary operations on the event loop thread, so no locks are needed.
+    The metrics are per process, scrape every worker separately.
+    """
+
+    type_ = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        function: Callable[[], float] | None = None,
+        registry: "Registry | None" = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.function = function
+        self._values: dict[tuple[str, ...], float] = {}
+        (registry or REGISTRY).register(self)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Makes the metric report the value returned by the function at scrape time.
+
+        :param function: The function returning the value.
+        :return: None
+        """
+        self.function = function
+
+    def samples(self) -> Iterable[str]:
+        if self.function is not None:
+            yield f"{self.name} {_format_value(self.function())}"
+            return
+        for values, value in self._values.items():
+            labels = _format_labels(self.labels, values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_}",
+            *self.samples(),
+        ]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    A value that only goes up.
+    """
+
+    type_ = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down.
+    """
+
+    type_ = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    """
+    Counts observations in buckets with fixed upper bounds.
+    """
+
+    type_ = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: "Registry | None" = None,
+    ):
+        super().__init__(name, documentation, labels, registry=registry)
+        self.buckets = tuple(sorted(buckets))
+        # Label values -> [count per bucket (last one is +Inf), sum]
+        self._observations: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        observations = self._observations.get(labels)
+        if observations is None:
+            observations = self._observations[labels] = [
+                [0] * (len(self.buckets) + 1),
+                0.0,
+            ]
+        observations[0][bisect_left(self.buckets, value)] += 1
+        observations[1] += value
+
+    def samples(self) -> Iterable[str]:
+        label_names = (*self.labels, "le")
+        for values, (counts, total) in self._observations.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = _format_labels(label_names, (*values, _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """
+    Collection of the metrics exposed by the /metrics endpoint.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """
+        Renders all metrics in the Prometheus text format.
+
+        :return: The metrics.
+        """
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = Counter(
+    "shopapi_http_requests_total",
+    "Number of HTTP requests.",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "shopapi_http_request_duration_seconds",
+    "HTTP request latency until the response is sent.",
+    ("method", "route"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "shopapi_http_requests_in_flight",
+    "Number of HTTP requests being processed.",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "shopapi_db_pool_checked_out",
+    "Number of connections checked out of the database pool.",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "shopapi_db_pool_overflow",
+    "Number of overflow connections of the database pool (negative while below pool size).",
+)
+DB_POOL_CHECKOUT_DURATION = Histogram(
+    "shopapi_db_pool_checkout_seconds",
+    "Time spent waiting for a connection from the database pool.",
+    ("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DB_TRANSACTION_RETRIES = Counter(
+    "shopapi_db_transaction_retries_total",
+    "Transactions retried after a serialization failure or a deadlock.",
+    ("function", "sqlstate"),
+)
+DB_TRANSACTION_ABORTS = Counter(
+    "shopapi_db_transaction_aborts_total",
+    "Transactions given up after the last attempt failed with a retryable error.",
+    ("function", "sqlstate"),
+)
+ORDER_BATCH_SIZE = Histogram(
+    "shopapi_order_batch_size",
+    "Number of orders created together by the order batcher.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests and measuring their latency per route.
+    Requests are labeled with the route template (e.g. /api/v1/orders/{id}),
+    so the number of series doesn't grow with the ids in the paths,
+    and with the method, OTHER for the non-standard ones.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", UNMATCHED_ROUTE)
+            method = scope["method"]
+            if method not in HTTP_METHODS:
+                method = OTHER_METHOD
+            HTTP_REQUESTS.inc(method, path, str(status_code))
+            HTTP_REQUEST_DURATION.observe(perf_counter() - start, method, path)
@@ -1,14 +1,29 @@
-from datetime import datetime
+from datetime import date, datetime
 import enum
-from typing import Any, Dict
+import re
+from typing import Annotated, Any, Dict
 from uuid import UUID
 from pydantic import (
+    AfterValidator,
     AliasChoices,
     AliasPath,
     ConfigDict,
-    field_serializer,
+    PlainSerializer,
+)
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlmodel import (
+    BigInteger,
+    CheckConstraint,
+    Column,
+    Computed,
+    Enum,
+    Field,
+    Index,
+    PrimaryKeyConstraint,
+    Relationship,
+    SQLModel,
 )
-from sqlmodel import Field, Relationship, SQLModel, Column, Enum
 from shopAPI.database import IdMixin
 
 
@@ -45,6 +60,30 @@ def field_example(param: Any) -> Dict[str, Dict[str, Any]]:
     return {"schema_extra": {"json_schema_extra": {"example": param}}}
 
 
+MAX_STOCK_SHARDS = 64
+# pydantic-core writes the floats from 1e16 up and under 1e-4 in another notation
+# than json.dumps (1e16 for 1e+16), prices stay in between so the serializers
+# (see serializers.FastSerializer) write them like FastAPI
+MAX_PRICE = 1e15
+
+
+def check_price_cents(price: float) -> float:
+    """
+    Checks that the price has no fraction of a cent.
+
+    :param price: The price.
+    :return: The price.
+    """
+    if round(price, 2) != price:
+        raise ValueError("Price can't have more than 2 decimals.")
+    return price
+
+
+Price = Annotated[float, AfterValidator(check_price_cents), Field(ge=0, le=MAX_PRICE)]
+# Text search configuration of the product search vector and the search queries
+SEARCH_CONFIG = "english"
+
+
 class ProductBase(SQLModel):
     name: str = Field(nullable=False, **field_example("Product"))
     description: str = Field(nullable=False, **field_example("A simple product"))
@@ -54,15 +93,67 @@ class ProductBase(SQLModel):
 
 class Product(IdMixin, ProductBase, table=True):
     __tablename__ = "product"
+    __table_args__ = (
+        # Generated from the name (weight A) and the description (weight B)
+        Column(
+            "search_vector",
+            TSVECTOR,
+            Computed(
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', name), 'A') || "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', description), 'B')",
+                persisted=True,
+            ),
+        ),
+        Index("ix_product_search_vector", "search_vector", postgresql_using="gin"),
+        # Typo tolerant matching of the name, needs the pg_trgm extension
+        Index(
+            "ix_product_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
+    # The search vector isn't mapped, so loading products doesn't fetch it
+    __mapper_args__ = {"exclude_properties": ["search_vector"]}
+    # Number of ProductStockShard rows holding the stock, 0 if the amount holds it
+    stock_shards: int = Field(
+        default=0, nullable=False, sa_column_kwargs={"server_default": "0"}
+    )
     order_items: list["OrderItem"] = Relationship(back_populates="product")
 
 
+class ProductStockShard(SQLModel, table=True):
+    """
+    A part of the stock of a sharded product, orders decrement one of the shards,
+    so they don't all wait for the lock of one row.
+    """
+
+    __tablename__ = "product_stock_shard"
+    __table_args__ = (
+        CheckConstraint("amount >= 0", name="ck_product_stock_shard_amount"),
+    )
+
+    product_id: UUID = Field(
+        foreign_key="product.id", primary_key=True, ondelete="CASCADE"
+    )
+    shard: int = Field(primary_key=True)
+    amount: int = Field(nullable=False)
+
+
 class ProductCreate(ProductBase):
-    pass
+    price: Price = Field(nullable=False, **field_example(128.99))
     model_config = ConfigDict(extra="forbid")
 
 
 class ProductUpdate(ProductBase):
+    price: Price = Field(nullable=False, **field_example(128.99))
+    stock_shards: int | None = Field(
+        None,
+        ge=0,
+        le=MAX_STOCK_SHARDS,
+        description="Number of rows to split the stock into for hot products, "
+        "0 keeps it in one row. Unchanged if not set.",
+    )
     # TODO check examples with https://fastapi.tiangolo.com/tutorial/schema-extra-example/#body-with-examples
     model_config = ConfigDict(
         extra="forbid",
@@ -83,9 +174,18 @@ class ProductResponse(ProductBase):
     id: UUID
 
 
-class ProductResponseInOrderItem(ProductResponse):
-    description: str = Field(exclude=True)
-    amount: int = Field(exclude=True)
+class ProductLookupResponse(SQLModel):
+    # The products in the order of the requested ids
+    products: list[ProductResponse]
+    # The requested ids that don't match a product
+    missing: list[UUID]
+
+
+class ProductResponseInOrderItem(SQLModel):
+    # Only these columns are loaded for the products of order items
+    name: str
+    price: float
+    id: UUID
 
 
 class OrderStatus(str, enum.Enum):
@@ -96,19 +196,90 @@ class OrderStatus(str, enum.Enum):
     canceled = "canceled"
 
 
+class OrderItemsMode(str, enum.Enum):
+    full = "full"  # with the product's id, name and price
+    short = "short"  # with the product id only
+    none = "none"  # without the order items
+
+
+class SortOrder(str, enum.Enum):
+    asc = "asc"
+    desc = "desc"
+
+
+class ExportFormat(str, enum.Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class CountMode(str, enum.Enum):
+    exact = "exact"  # counts the matching rows
+    estimated = "estimated"  # the table statistics or the planner's estimate
+    maintained = "maintained"  # the row counter, without filters only
+
+
+class SalesGroupBy(str, enum.Enum):
+    product = "product"
+    day = "day"
+    status = "status"
+
+
 class OrderBase(SQLModel):
     pass
 
 
+# Monthly partitions of the orders and their items, order_p2026_10 holds October 2026,
+# order_p2026_10_detached once it's detached and counted
+PARTITION_NAME = re.compile(r"^(order|order_item)_p(\d{4})_(\d{2})(_detached)?$")
+
+# The join of the orders and their items, there's no foreign key between the tables
+ORDER_ITEMS_JOIN = (
+    "and_(Order.id == foreign(OrderItem.order_id), "
+    "Order.creation_date == foreign(OrderItem.order_creation_date))"
+)
+
+
+# The id of the current transaction (xid8, which has no SQLAlchemy type) as a bigint
+CURRENT_XID = "CAST(CAST(pg_current_xact_id() AS text) AS bigint)"
+
+
 class Order(IdMixin, OrderBase, table=True):
+    """
+    Orders are partitioned by month of creation_date (see shopAPI.partitions),
+    the partition key has to be a part of the primary key.
+    """
+
     __tablename__ = "order"
-    creation_date: datetime = Field(default_factory=datetime.now)
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "creation_date"),
+        Index("ix_order_status_creation_date", "status", "creation_date"),
+        # The transaction that inserted the order. Unlike the creation date,
+        # every order of a transaction below the oldest running one is committed
+        # (see SalesRollupCRUD.refresh)
+        Column(
+            "creation_xid",
+            BigInteger,
+            server_default=text(CURRENT_XID),
+            nullable=False,
+        ),
+        Index("ix_order_creation_xid", "creation_xid"),
+        {"postgresql_partition_by": "RANGE (creation_date)"},
+    )
+    # The transaction id isn't mapped, so loading orders doesn't fetch it
+    __mapper_args__ = {"exclude_properties": ["creation_xid"]}
+    creation_date: datetime = Field(
+        default_factory=datetime.now, primary_key=True, index=True
+    )
     status: OrderStatus = Field(
         default=OrderStatus.created, sa_column=Column(Enum(OrderStatus), nullable=False)
     )
 
     order_items: list["OrderItem"] = Relationship(
-        sa_relationship_kwargs={"cascade": "all"}, back_populates="order"
+        sa_relationship_kwargs={
+            "cascade": "all",
+            "primaryjoin": ORDER_ITEMS_JOIN,
+        },
+        back_populates="order",
     )
 
     def __init__(self, **kwargs):
@@ -127,14 +298,28 @@ class OrderStatusUpdate(SQLModel):
     model_config = ConfigDict(extra="forbid")
 
 
+# An annotation rather than a field_serializer, so models trimmed to some of
+# the fields of a response (see serializers.SparseSerializer) keep the format
+ResponseDatetime = Annotated[
+    datetime,
+    PlainSerializer(
+        lambda value: value.strftime("%Y-%m-%d %H:%M:%S"),
+        return_type=str,
+        when_used="json",
+    ),
+]
+
+
 class OrderResponse(OrderBase):
     id: UUID
-    creation_date: datetime
+    creation_date: ResponseDatetime
     status: OrderStatus
 
-    @field_serializer("creation_date", return_type=str, when_used="json")
-    def serialize_creation_date(self, creation_date: datetime):
-        return creation_date.strftime("%Y-%m-%d %H:%M:%S")
+
+class OrderBatchResult(SQLModel):
+    status_code: int
+    detail: str | None = None
+    order: OrderResponse | None = None
 
 
 class OrderResponseWithItems(OrderResponse):
@@ -150,12 +335,27 @@ class OrderItemBase(SQLModel):
 
 
 class OrderItem(IdMixin, OrderItemBase, table=True):
+    """
+    Order items are partitioned like their orders, by month of order_creation_date.
+    The foreign key to the order is declared between the partitions of a month,
+    so a month can be detached without checking the other months.
+    """
+
     __tablename__ = "order_item"
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "order_creation_date"),
+        {"postgresql_partition_by": "RANGE (order_creation_date)"},
+    )
 
-    order_id: UUID | None = Field(foreign_key="order.id")
-    order: Order | None = Relationship(back_populates="order_items")
+    order_id: UUID | None = Field(default=None, nullable=False, index=True)
+    # The creation date of the order, set from the order on flush
+    order_creation_date: datetime | None = Field(default=None, primary_key=True)
+    order: Order | None = Relationship(
+        back_populates="order_items",
+        sa_relationship_kwargs={"primaryjoin": ORDER_ITEMS_JOIN},
+    )
 
-    product_id: UUID | None = Field(foreign_key="product.id")
+    product_id: UUID | None = Field(foreign_key="product.id", index=True)
     product: Product | None = Relationship(back_populates="order_items")
 
 
@@ -174,3 +374,64 @@ class OrderItemResponseShort(OrderItemBase):
             "validation_alias": AliasChoices("product_id", AliasPath("product", "id"))
         }
     )
+
+
+class IdempotencyKey(SQLModel, table=True):
+    __tablename__ = "idempotency_key"
+
+    key: str = Field(primary_key=True, max_length=255)
+    request_hash: str = Field(nullable=False, max_length=64)
+    status_code: int | None = None
+    response: str | None = None
+    created_at: datetime = Field(default_factory=datetime.now, index=True)
+
+
+class SalesRollup(SQLModel, table=True):
+    """
+    Units sold per day of order creation, product and order status,
+    for the orders inserted before the watermark in SalesRollupWatermark.
+    """
+
+    __tablename__ = "sales_rollup"
+
+    day: date = Field(primary_key=True)
+    product_id: UUID = Field(primary_key=True)
+    status: OrderStatus = Field(
+        sa_column=Column(Enum(OrderStatus), primary_key=True, nullable=False)
+    )
+    units: int = Field(nullable=False)
+
+
+class SalesRollupWatermark(SQLModel, table=True):
+    """
+    Single row with the transaction id the rollup is refreshed until:
+    the orders inserted by the transactions before it are rolled up.
+    """
+
+    __tablename__ = "sales_rollup_watermark"
+
+    id: int = Field(default=1, primary_key=True)
+    refreshed_xid: int | None = Field(default=None, sa_column=Column(BigInteger))
+
+
+class RowCount(SQLModel, table=True):
+    """
+    Number of rows of a table, kept by the transactions that insert or delete them.
+    The count is the sum of the slots, every transaction adds to a random slot,
+    so they don't all wait for the lock of one row.
+    """
+
+    __tablename__ = "row_count"
+
+    table_name: str = Field(primary_key=True, max_length=63)
+    slot: int = Field(primary_key=True)
+    count: int = Field(sa_column=Column(BigInteger, nullable=False))
+
+
+class SalesReportRow(SQLModel):
+    product_id: UUID | None = None
+    product_name: str | None = None
+    day: date | None = None
+    status: OrderStatus | None = None
+    units: int
+    revenue: float
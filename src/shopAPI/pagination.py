@@ -0,0 +1,66 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Any, Callable, Sequence
+from fastapi import Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def encode_cursor(values: list[Any]) -> str:
+    """
+    Encodes the keyset values of the last returned row into an opaque cursor.
+
+    :param values: The values to encode (must be JSON serializable).
+    :return: The cursor.
+    """
+    return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    """
+    Decodes a cursor created by encode_cursor.
+    Raises a ValueError if the cursor is malformed.
+
+    :param cursor: The cursor to decode.
+    :return: The keyset values.
+    """
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as exception:
+        raise ValueError("Malformed cursor.") from exception
+    if not isinstance(values, list):
+        raise ValueError("Malformed cursor.")
+
+    return values
+
+
+def set_next_cursor(
+    response: Response,
+    items: Sequence[Any],
+    limit: int,
+    key: Callable[[Any], list[Any]] = lambda item: [str(item.id)],
+) -> None:
+    """
+    Sets the X-Next-Cursor header if the page is full,
+    so the client can continue from the last returned row.
+
+    :param response: The response to set the header on.
+    :param items: The returned page.
+    :param limit: The requested page size.
+    :param key: Returns the keyset values of an item, its id by default.
+    :return: None
+    """
+    if items and len(items) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(items[-1]))
+
+
+def set_total_count(response: Response, total: int) -> None:
+    """
+    Sets the X-Total-Count header, the number of items on all pages.
+
+    :param response: The response to set the header on.
+    :param total: The number of items.
+    :return: None
+    """
+    response.headers[TOTAL_COUNT_HEADER] = str(total)
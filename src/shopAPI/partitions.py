@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from datetime import date, datetime
+
+from shopAPI import database
+from shopAPI.config import settings
+from shopAPI.crud import OrderPartitionCRUD
+
+logger = logging.getLogger(__name__)
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    Returns the first day of the month the given number of months away.
+
+    :param month: Any day of the month to start from.
+    :param months: The number of months to add (or subtract, if negative).
+    :return: The first day of the month.
+    """
+    year, index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return date(year, index + 1, 1)
+
+
+async def maintain_order_partitions() -> None:
+    """
+    Creates the order partitions of the current month and the ORDER_PARTITIONS_AHEAD
+    next ones every ORDER_PARTITION_INTERVAL seconds, so an order never arrives
+    before its partition. If ORDER_PARTITION_RETENTION_MONTHS is set, detaches the
+    partitions of the months before the current one and that many previous ones.
+    Runs until cancelled.
+
+    :return: None
+    """
+    while True:
+        current = datetime.now().date().replace(day=1)
+        try:
+            async with database.session_factory() as session:
+                created = await OrderPartitionCRUD(session).create(
+                    [
+                        add_months(current, months)
+                        for months in range(settings.ORDER_PARTITIONS_AHEAD + 1)
+                    ]
+                )
+            for month in created:
+                logger.info("Created the order partitions of %s.", f"{month:%Y-%m}")
+            if settings.ORDER_PARTITION_RETENTION_MONTHS:
+                async with database.session_factory() as session:
+                    detached = await OrderPartitionCRUD(session).detach(
+                        add_months(current, -settings.ORDER_PARTITION_RETENTION_MONTHS)
+                    )
+                for month in detached:
+                    logger.info(
+                        "Detached the order partitions of %s.", f"{month:%Y-%m}"
+                    )
+        except Exception:
+            logger.exception("Failed to maintain the order partitions.")
+        await asyncio.sleep(settings.ORDER_PARTITION_INTERVAL)
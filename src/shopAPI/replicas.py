@@ -0,0 +1,165 @@
+from math import ceil
+from time import monotonic, time
+from typing import AsyncGenerator, Callable
+
+from fastapi import Depends, Request
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from shopAPI.config import settings
+from shopAPI.database import engine_options, get_session, prepare_session_factory
+from shopAPI.instrumentation import instrument_engine
+
+READ_YOUR_WRITES_COOKIE = "shopapi_last_write"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class ReplicaSet:
+    """
+    Session factories of the read replicas, used round-robin.
+    A replica that fails to give a connection is skipped for DB_REPLICA_RETRY_SECONDS.
+    """
+
+    def __init__(self, uris: list[str]):
+        self.engines = [
+            create_async_engine(uri, **engine_options(settings, replica=True))
+            for uri in uris
+        ]
+        for engine in self.engines:
+            instrument_engine(engine)
+        self.session_factories = [
+            prepare_session_factory(engine, info={"replica": True})
+            for engine in self.engines
+        ]
+        self.unhealthy_until = [0.0] * len(uris)
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self.session_factories)
+
+    async def acquire(self) -> AsyncSession | None:
+        """
+        Returns a new session of the next healthy replica with a connection checked out.
+        Returns None if no replica can give a connection.
+        The caller closes the session.
+
+        :return: The replica session or None.
+        """
+        for _ in range(len(self.session_factories)):
+            index = self._next % len(self.session_factories)
+            self._next += 1
+            if self.unhealthy_until[index] > monotonic():
+                continue
+
+            session = self.session_factories[index]()
+            try:
+                await session.connection()
+            except (OSError, TimeoutError, SQLAlchemyError):
+                await session.close()
+                self.unhealthy_until[index] = (
+                    monotonic() + settings.DB_REPLICA_RETRY_SECONDS
+                )
+                continue
+            return session
+
+        return None
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+
+replicas = ReplicaSet(settings.DB_REPLICA_URIS)
+
+
+def recently_wrote(request: Request) -> bool:
+    """
+    Checks the cookie set by ReadYourWritesMiddleware.
+
+    :param request: The request.
+    :return: True if the client wrote within DB_READ_YOUR_WRITES_SECONDS.
+    """
+    try:
+        written_at = float(request.cookies[READ_YOUR_WRITES_COOKIE])
+    except (KeyError, ValueError):
+        return False
+
+    return time() - written_at < settings.DB_READ_YOUR_WRITES_SECONDS
+
+
+async def get_read_session(
+    request: Request, primary: AsyncSession = Depends(get_session)
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Get a database session for handlers without writes.
+    This can be used for dependency injection.
+    Returns a replica session if replicas are configured and healthy,
+    unless the client wrote recently, otherwise the primary session.
+
+    :return: The database session.
+    """
+    replica = None
+    if replicas and not recently_wrote(request):
+        replica = await replicas.acquire()
+    if replica is None:
+        yield primary
+        return
+
+    try:
+        yield replica
+    finally:
+        await replica.close()
+
+
+def read_only(endpoint: Callable) -> Callable:
+    """
+    Marks a handler of an unsafe method (like a POST that only reads)
+    that doesn't write, so its responses don't set the read-your-writes cookie.
+    Put it below the route decorator.
+
+    :param endpoint: The handler.
+    :return: The same handler.
+    """
+    endpoint.read_only = True
+    return endpoint
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware marking clients that wrote with a cookie,
+    so their reads go to the primary for DB_READ_YOUR_WRITES_SECONDS
+    instead of a replica that may not have the write yet.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] in SAFE_METHODS
+            or not replicas
+            or settings.DB_READ_YOUR_WRITES_SECONDS <= 0
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            # The router has put the matched handler into the scope by now
+            if (
+                message["type"] == "http.response.start"
+                and message["status"] < 400
+                and not getattr(scope.get("endpoint"), "read_only", False)
+            ):
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Set-Cookie",
+                    f"{READ_YOUR_WRITES_COOKIE}={time():.3f}; "
+                    f"Max-Age={ceil(settings.DB_READ_YOUR_WRITES_SECONDS)}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
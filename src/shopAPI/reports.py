@@ -0,0 +1,26 @@
+import asyncio
+import logging
+
+from shopAPI import database
+from shopAPI.config import settings
+from shopAPI.crud import SalesRollupCRUD
+
+logger = logging.getLogger(__name__)
+
+
+async def refresh_sales_rollup() -> None:
+    """
+    Rolls up the new orders every SALES_ROLLUP_REFRESH_INTERVAL seconds.
+    Orders of transactions still running are left for the next refresh.
+    Runs until cancelled.
+
+    :return: None
+    """
+    while True:
+        try:
+            async with database.session_factory() as session:
+                refreshed_xid = await SalesRollupCRUD(session).refresh()
+            logger.info("Sales rollup refreshed until transaction %s.", refreshed_xid)
+        except Exception:
+            logger.exception("Failed to refresh the sales rollup.")
+        await asyncio.sleep(settings.SALES_ROLLUP_REFRESH_INTERVAL)
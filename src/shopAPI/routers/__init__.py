@@ -1,4 +1,5 @@
 from .v1 import router as api_router
+from .metrics import metrics_router
 from .status import status_router
 
-__all__ = ["api_router", "status_router"]
+__all__ = ["api_router", "metrics_router", "status_router"]
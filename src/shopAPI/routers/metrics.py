@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Response, status
+
+from shopAPI.metrics import CONTENT_TYPE, REGISTRY
+
+metrics_router = APIRouter(
+    tags=["Status"],
+)
+
+
+@metrics_router.get(
+    "/metrics",
+    summary="Get the metrics in the Prometheus text format.",
+    status_code=status.HTTP_200_OK,
+    response_class=Response,
+)
+async def metrics() -> Response:
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
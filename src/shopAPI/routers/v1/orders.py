@@ -1,22 +1,70 @@
+from datetime import datetime
 from typing import List
-from fastapi import APIRouter, Depends, Query, status
+from uuid import UUID
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 
 from shopAPI.crud import OrderCRUD
-from shopAPI.dependencies import valid_order_contents, valid_order_id
+from shopAPI.dependencies import (
+    valid_cursor,
+    valid_order_contents,
+    valid_order_fields,
+    valid_order_id,
+    valid_order_id_read,
+    valid_order_items,
+)
+from shopAPI.export import EXPORT_WRITERS
 from shopAPI.models import (
+    CountMode,
+    ExportFormat,
     Order,
+    OrderBatchResult,
+    OrderCreate,
+    OrderItemsMode,
     OrderResponse,
     OrderResponseWithItems,
+    OrderResponseWithItemsShort,
     OrderStatus,
     OrderStatusUpdate,
     ResponseMessage,
+    SortOrder,
 )
+from shopAPI.pagination import set_next_cursor, set_total_count
+from shopAPI.serializers import SparseSerializer
 
 router = APIRouter(
     prefix="/orders",
     tags=["Orders"],
 )
 
+ORDER_RESPONSE_MODELS = {
+    OrderItemsMode.full: OrderResponseWithItems,
+    OrderItemsMode.short: OrderResponseWithItemsShort,
+    OrderItemsMode.none: OrderResponse,
+}
+order_serializers = {
+    items: SparseSerializer(model) for items, model in ORDER_RESPONSE_MODELS.items()
+}
+orders_serializers = {
+    items: SparseSerializer(model, many=True)
+    for items, model in ORDER_RESPONSE_MODELS.items()
+}
+
+
+def response_fields(
+    fields: frozenset[str] | None, items: OrderItemsMode
+) -> frozenset[str] | None:
+    """
+    Returns the fields of the order response model to serialize.
+
+    :param fields: The requested order fields, all fields if None.
+    :param items: The order items mode.
+    :return: The fields, with the order items unless the mode is none.
+    """
+    if fields is None or items == OrderItemsMode.none:
+        return fields
+    return fields | {"order_items"}
+
 
 @router.post(
     "/",
@@ -31,18 +79,110 @@ async def create_order(
     return order
 
 
+@router.post(
+    "/batch",
+    summary="Create a batch of orders.",
+    description="Creates every valid order and reports a result for each one.",
+    status_code=status.HTTP_200_OK,
+    response_model=List[OrderBatchResult],
+)
+async def create_orders_batch(
+    data: List[OrderCreate] = Body(min_length=1, max_length=1000),
+    crud: OrderCRUD = Depends(),
+) -> List[OrderBatchResult]:
+    return [
+        (
+            OrderBatchResult(status_code=result.status_code, detail=result.detail)
+            if isinstance(result, HTTPException)
+            else OrderBatchResult(
+                status_code=status.HTTP_201_CREATED,
+                order=OrderResponse.model_validate(result),
+            )
+        )
+        for result in await crud.create_batch(data)
+    ]
+
+
 @router.get(
     "/",
-    summary="Get all orders with pagination.",
+    summary="Get all orders with filters and pagination.",
     status_code=status.HTTP_200_OK,
     response_model=List[OrderResponseWithItems],
+    responses={400: {"model": ResponseMessage}},
 )
 async def get_orders_all(
+    response: Response,
     offset: int = Query(0, ge=0, description="Offset for pagination."),
     limit: int = Query(100, gt=0, le=100, description="Number of items to return."),
-    crud: OrderCRUD = Depends(),
-) -> List[OrderResponseWithItems]:
-    return await crud.get_all(offset=offset, limit=limit)
+    after: UUID | None = Depends(valid_cursor),
+    status: List[OrderStatus] | None = Query(
+        None, description="Only return orders with these statuses."
+    ),
+    created_from: datetime | None = Query(
+        None, description="Only return orders created at or after this date."
+    ),
+    created_to: datetime | None = Query(
+        None, description="Only return orders created before this date."
+    ),
+    sort: SortOrder = Query(SortOrder.asc, description="Sort order by creation."),
+    fields: frozenset[str] | None = Depends(valid_order_fields),
+    items: OrderItemsMode = Depends(valid_order_items),
+    count: CountMode | None = Query(
+        None,
+        description="Return the total in the X-Total-Count header: exact, estimated "
+        "(from the table statistics) or maintained (without filters only).",
+    ),
+    crud: OrderCRUD = Depends(OrderCRUD.read_only),
+) -> Response:
+    filters = {
+        "status": status,
+        "creation_date__gte": created_from,
+        "creation_date__lt": created_to,
+    }
+    orders = await crud.get_all(
+        offset=offset,
+        limit=limit,
+        after=after,
+        filters=filters,
+        sort=sort,
+        fields=fields,
+        items=items,
+    )
+    set_next_cursor(response, orders, limit)
+    if count is not None:
+        set_total_count(response, await crud.count(count, filters))
+    return orders_serializers[items](orders, response_fields(fields, items), response)
+
+
+@router.get(
+    "/export",
+    summary="Export all orders with their items.",
+    description="Streams every matching order as NDJSON (one order per line) "
+    "or CSV (one order item per row).",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}, "text/csv": {}}},
+    },
+)
+async def export_orders(
+    format: ExportFormat = Query(ExportFormat.ndjson, description="Export format."),
+    since: datetime | None = Query(
+        None, description="Only export orders created at or after this date."
+    ),
+    status: OrderStatus | None = Query(
+        None, description="Only export orders with this status."
+    ),
+    crud: OrderCRUD = Depends(OrderCRUD.read_only),
+) -> StreamingResponse:
+    writer, media_type = EXPORT_WRITERS[format]
+    return StreamingResponse(
+        writer(crud.export(since=since, status=status)),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="orders.{format.value}"'
+        },
+    )
 
 
 @router.get(
@@ -53,9 +193,11 @@ async def get_orders_all(
     responses={404: {"model": ResponseMessage}},
 )
 async def get_order(
-    order: Order = Depends(valid_order_id), crud: OrderCRUD = Depends()
-) -> OrderResponseWithItems:
-    return order
+    order: Order = Depends(valid_order_id_read),
+    fields: frozenset[str] | None = Depends(valid_order_fields),
+    items: OrderItemsMode = Depends(valid_order_items),
+) -> Response:
+    return order_serializers[items](order, response_fields(fields, items))
 
 
 @router.patch(
@@ -1,21 +1,38 @@
 from typing import List, Optional
-from fastapi import APIRouter, Query, status, Depends
+from uuid import UUID
+from fastapi import APIRouter, Body, Query, Response, status, Depends
 
 from shopAPI.crud import ProductCRUD
-from shopAPI.dependencies import valid_product_id
+from shopAPI.dependencies import (
+    valid_cursor,
+    valid_product_id,
+    valid_product_fields,
+    valid_product_id_read,
+    valid_search_cursor,
+)
 from shopAPI.models import (
+    CountMode,
     Product,
     ProductCreate,
+    ProductLookupResponse,
     ProductResponse,
     ProductUpdate,
     ResponseMessage,
 )
+from shopAPI.pagination import set_next_cursor, set_total_count
+from shopAPI.replicas import read_only
+from shopAPI.serializers import FastSerializer, SparseSerializer
 
 router = APIRouter(
     prefix="/products",
     tags=["Products"],
 )
 
+product_serializer = SparseSerializer(ProductResponse)
+products_serializer = SparseSerializer(ProductResponse, many=True)
+search_serializer = FastSerializer(List[ProductResponse])
+lookup_serializer = FastSerializer(ProductLookupResponse)
+
 
 @router.post(
     "/",
@@ -29,18 +46,88 @@ async def create_product(
     return await crud.create(data)
 
 
+@router.post(
+    "/bulk",
+    summary="Create new products in bulk.",
+    status_code=status.HTTP_201_CREATED,
+    response_model=List[ProductResponse],
+)
+async def create_products_bulk(
+    data: List[ProductCreate] = Body(min_length=1, max_length=10000),
+    crud: ProductCRUD = Depends(),
+) -> List[ProductResponse]:
+    return await crud.create_many(data)
+
+
 @router.get(
     "/",
     summary="Get all products with pagination.",
     status_code=status.HTTP_200_OK,
     response_model=List[ProductResponse],
+    responses={400: {"model": ResponseMessage}},
 )
 async def get_products_all(
+    response: Response,
     offset: int = Query(0, ge=0, description="Offset for pagination."),
     limit: int = Query(100, gt=0, le=100, description="Number of items to return."),
-    crud: ProductCRUD = Depends(),
-) -> List[ProductResponse]:
-    return await crud.get_all(offset=offset, limit=limit)
+    after: UUID | None = Depends(valid_cursor),
+    fields: frozenset[str] | None = Depends(valid_product_fields),
+    count: CountMode | None = Query(
+        None,
+        description="Return the total in the X-Total-Count header: exact, estimated "
+        "(from the table statistics) or maintained (without filters only).",
+    ),
+    crud: ProductCRUD = Depends(ProductCRUD.read_only),
+) -> Response:
+    products = await crud.get_all(
+        offset=offset, limit=limit, after=after, fields=fields
+    )
+    set_next_cursor(response, products, limit)
+    if count is not None:
+        set_total_count(response, await crud.count(count))
+    return products_serializer(products, fields, response)
+
+
+@router.get(
+    "/search",
+    summary="Search products by name and description, best matches first.",
+    status_code=status.HTTP_200_OK,
+    response_model=List[ProductResponse],
+    responses={400: {"model": ResponseMessage}},
+)
+async def search_products(
+    response: Response,
+    q: str = Query(
+        min_length=1,
+        max_length=256,
+        description='Words to search for, "quoted phrases", or and -excluded words.',
+    ),
+    limit: int = Query(20, gt=0, le=100, description="Number of items to return."),
+    after: tuple[float, UUID] | None = Depends(valid_search_cursor),
+    crud: ProductCRUD = Depends(ProductCRUD.read_only),
+) -> Response:
+    rows = await crud.search(q, limit=limit, after=after)
+    set_next_cursor(
+        response, rows, limit, key=lambda row: [row.rank, str(row.Product.id)]
+    )
+    return search_serializer([row.Product for row in rows], response)
+
+
+@router.post(
+    "/lookup",
+    summary="Get the products with the given ids.",
+    status_code=status.HTTP_200_OK,
+    response_model=ProductLookupResponse,
+)
+@read_only
+async def lookup_products(
+    ids: List[UUID] = Body(min_length=1, max_length=1000, embed=True),
+    crud: ProductCRUD = Depends(ProductCRUD.read_only),
+) -> Response:
+    products = await crud.get_all_by_ids(ids)
+    found = {product.id for product in products}
+    missing = [id for id in dict.fromkeys(ids) if id not in found]
+    return lookup_serializer({"products": products, "missing": missing})
 
 
 @router.get(
@@ -50,8 +137,11 @@ async def get_products_all(
     response_model=ProductResponse,
     responses={404: {"model": ResponseMessage}},
 )
-async def get_product(product: Product = Depends(valid_product_id)) -> ProductResponse:
-    return product
+async def get_product(
+    product: Product = Depends(valid_product_id_read),
+    fields: frozenset[str] | None = Depends(valid_product_fields),
+) -> Response:
+    return product_serializer(product, fields)
 
 
 @router.put(
@@ -0,0 +1,41 @@
+from datetime import date
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from shopAPI.crud import SalesRollupCRUD
+from shopAPI.models import ResponseMessage, SalesGroupBy, SalesReportRow
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["Reports"],
+)
+
+
+@router.get(
+    "/sales",
+    summary="Get the units sold and the revenue.",
+    description="Groups the order items by product, day of order creation "
+    "or order status. The revenue uses the current product prices.",
+    status_code=status.HTTP_200_OK,
+    response_model=List[SalesReportRow],
+    response_model_exclude_none=True,
+    responses={400: {"model": ResponseMessage}},
+)
+async def get_sales_report(
+    date_from: date | None = Query(
+        None,
+        alias="from",
+        description="Only count orders created on or after this day.",
+    ),
+    date_to: date | None = Query(
+        None, alias="to", description="Only count orders created before this day."
+    ),
+    group_by: SalesGroupBy = Query(SalesGroupBy.product, description="Grouping."),
+    crud: SalesRollupCRUD = Depends(SalesRollupCRUD.read_only),
+) -> List[SalesReportRow]:
+    if date_from is not None and date_to is not None and date_from >= date_to:
+        raise HTTPException(
+            status_code=400, detail="The from day must be before the to day."
+        )
+
+    return await crud.report(group_by, date_from=date_from, date_to=date_to)
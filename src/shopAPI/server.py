@@ -1,17 +1,44 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
 from fastapi import FastAPI
 
-from shopAPI.routers import api_router, status_router
+from shopAPI.idempotency import purge_idempotency_keys
+from shopAPI.partitions import maintain_order_partitions
+from shopAPI.reports import refresh_sales_rollup
+from shopAPI.instrumentation import QueryStatsMiddleware
+from shopAPI.metrics import MetricsMiddleware
+from shopAPI.replicas import ReadYourWritesMiddleware
+from shopAPI.routers import api_router, metrics_router, status_router
 from shopAPI.config import settings
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    tasks = [
+        asyncio.create_task(purge_idempotency_keys()),
+        asyncio.create_task(refresh_sales_rollup()),
+        asyncio.create_task(maintain_order_partitions()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+
+
 def get_application() -> FastAPI:
     app = FastAPI(
         title=settings.PROJECT_NAME,
         version=settings.VERSION,
         docs_url="/swagger",
+        lifespan=lifespan,
     )
     app.include_router(api_router, prefix="/api")
     app.include_router(status_router)
+    app.include_router(metrics_router)
+    app.add_middleware(ReadYourWritesMiddleware)
+    app.add_middleware(QueryStatsMiddleware)
+    app.add_middleware(MetricsMiddleware)
     return app
 
 
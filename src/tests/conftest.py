@@ -2,8 +2,10 @@ import random
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import AsyncGenerator, List
 import pytest
-from httpx import AsyncClient, ASGITransport
+from httpx import AsyncClient
 
+from shopAPI.client import api_client
+from shopAPI.crud import ProductCRUD
 from shopAPI.server import app
 import shopAPI.database as database
 import tests.utils as utils
@@ -14,11 +16,7 @@ async def client() -> AsyncGenerator[AsyncClient, None]:
     """
     Yields an async client for testing.
     """
-    async with AsyncClient(
-        base_url="http://testserver/api/v1/",
-        transport=ASGITransport(app),
-        follow_redirects=True,
-    ) as ac:
+    async with api_client() as ac:
         yield ac
 
 
@@ -27,12 +25,16 @@ async def db_session() -> AsyncGenerator[AsyncSession, None]:
     """
     Yields a database session for testing.
     Rolls back the session at the end of the test.
+    The session works inside a savepoint, so a rolled back request
+    doesn't discard the data created earlier in the test.
     """
     async with database.engine.connect() as connection:
         await connection.begin()
-        session = database.prepare_session(connection)
+        await connection.begin_nested()
+        session = database.prepare_session_factory(connection)()
         app.dependency_overrides[database.get_session] = lambda: session
-        database.session = session
+        if ProductCRUD.cache is not None:
+            ProductCRUD.cache.clear()
         yield session
         await session.close()
         await connection.rollback()
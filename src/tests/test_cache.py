@@ -0,0 +1,156 @@
+from typing import List
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete
+
+from shopAPI.cache import LRUCache
+from shopAPI.crud import ProductCRUD
+from shopAPI.models import Product, ProductUpdate
+import shopAPI.database as database
+import tests.utils as utils
+
+
+def test_cache_lru_eviction() -> None:
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+
+def test_cache_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 100.0
+    monkeypatch.setattr("shopAPI.cache.monotonic", lambda: now)
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    now = 109.0
+    assert cache.get("a") == 1
+    now = 110.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_cache_invalidate() -> None:
+    cache = LRUCache(maxsize=3, ttl=60)
+    for key in "abc":
+        cache.set(key, key)
+    cache.invalidate(["a", "c", "d"])
+    assert [cache.get(key) for key in "abc"] == [None, "b", None]
+
+
+def test_cache_generation() -> None:
+    cache = LRUCache(maxsize=2, ttl=60)
+    generation = cache.generation("a")
+    # Invalidated while the value was loaded
+    cache.invalidate(["a"])
+    cache.set("a", "old", generation)
+    assert cache.get("a") is None
+    cache.set("a", "new", cache.generation("a"))
+    assert cache.get("a") == "new"
+
+    # The dropped generations don't go back
+    generation = cache.generation("b")
+    cache.invalidate(["b", "c", "d"])
+    cache.set("b", "old", generation)
+    assert cache.get("b") is None
+    generation = cache.generation("e")
+    cache.clear()
+    cache.set("e", "old", generation)
+    assert cache.get("e") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+async def test_product_cache_update(
+    client: AsyncClient, product_payloads: List[dict]
+) -> None:
+    # Read the product twice (the second read is a hit), update it
+    # and check that the next read returns the updated product
+    updated_product = product_payloads.pop()
+    await utils.create_entities(client, "products", product_payloads)
+    product_id = product_payloads[0]["id"]
+    for _ in range(2):
+        response_get = await client.get(f"products/{product_id}")
+        assert response_get.json() == product_payloads[0]
+    assert ProductCRUD.cache.hits >= 1
+    response_put = await client.put(f"products/{product_id}", json=updated_product)
+    assert response_put.status_code == 200
+    updated_product["id"] = product_id
+    response_get = await client.get(f"products/{product_id}")
+    assert response_get.json() == updated_product
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+async def test_product_cache_order(
+    client: AsyncClient, product_payloads: List[dict]
+) -> None:
+    # Cache the product, order it and check that the stock change is visible
+    await utils.create_entities(client, "products", product_payloads)
+    product_payload = product_payloads[0]
+    await client.get(f"products/{product_payload['id']}")
+    await utils.create_orders(
+        client,
+        [{"order_items": [{"product_id": product_payload["id"], "amount": 1}]}],
+    )
+    response_get = await client.get(f"products/{product_payload['id']}")
+    assert response_get.json()["amount"] == product_payload["amount"] - 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+async def test_product_cache_delete(
+    client: AsyncClient, product_payloads: List[dict]
+) -> None:
+    await utils.create_entities(client, "products", product_payloads)
+    product_id = product_payloads[0]["id"]
+    await client.get(f"products/{product_id}")
+    response_delete = await client.delete(f"products/{product_id}")
+    assert response_delete.status_code == 200
+    response_get = await client.get(f"products/{product_id}")
+    assert response_get.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_product_cache_read_before_update(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # Runs on real connections, outside of the test transaction
+    product = Product(name="name", description="description", price=1.0, amount=10)
+    product_id = product.id
+    async with database.session_factory() as session:
+        session.add(product)
+        await session.commit()
+
+    try:
+        async with database.session_factory() as reader:
+            crud = ProductCRUD(reader)
+            one_or_none = crud._one_or_none
+
+            async def read_before_update(query):
+                model = await one_or_none(query)
+                # Another request updates the product before the read is cached
+                async with database.session_factory() as writer:
+                    writer_crud = ProductCRUD(writer)
+                    await writer_crud.update(
+                        await writer_crud.get_by_id(product_id),
+                        ProductUpdate(
+                            name="name", description="description", price=1.0, amount=5
+                        ),
+                    )
+                return model
+
+            monkeypatch.setattr(crud, "_one_or_none", read_before_update)
+            assert (await crud.get_by_id(product_id)).amount == 10
+
+        assert ProductCRUD.cache.get(product_id) is None
+        async with database.session_factory() as session:
+            assert (await ProductCRUD(session).get_by_id(product_id)).amount == 5
+    finally:
+        async with database.session_factory() as session:
+            await session.execute(delete(Product).where(Product.id == product_id))
+            await session.commit()
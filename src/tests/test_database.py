@@ -0,0 +1,217 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from shopAPI import metrics
+from shopAPI.config import settings
+from shopAPI.database import (
+    InstrumentedPool,
+    ReplicaPool,
+    RetryPolicy,
+    Transactional,
+    engine_options,
+    get_session,
+)
+from shopAPI.models import Product
+import shopAPI.database as database
+
+
+def test_engine_options() -> None:
+    options = engine_options(
+        settings.model_copy(
+            update={
+                "DB_POOL_SIZE": 3,
+                "DB_MAX_OVERFLOW": 0,
+                "DB_STATEMENT_TIMEOUT": 500,
+                "DB_JIT": False,
+            }
+        )
+    )
+    assert options["poolclass"] is InstrumentedPool
+    assert (options["pool_size"], options["max_overflow"]) == (3, 0)
+    assert engine_options(settings, replica=True)["poolclass"] is ReplicaPool
+    assert options["connect_args"]["server_settings"] == {
+        "statement_timeout": "500",
+        "jit": "off",
+    }
+
+
+def test_engine_options_pgbouncer() -> None:
+    options = engine_options(
+        settings.model_copy(update={"DB_PGBOUNCER": True, "DB_JIT": False})
+    )
+    connect_args = options["connect_args"]
+    assert options["poolclass"] is NullPool
+    assert "pool_size" not in options
+    assert "server_settings" not in connect_args
+    assert connect_args["prepared_statement_cache_size"] == 0
+    assert connect_args["statement_cache_size"] == 0
+    name_func = connect_args["prepared_statement_name_func"]
+    assert name_func() != name_func()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("pgbouncer", [False, True])
+async def test_engine_server_settings(pgbouncer: bool) -> None:
+    test_settings = settings.model_copy(
+        update={
+            "DB_STATEMENT_TIMEOUT": 1500,
+            "DB_JIT": False,
+            "DB_PGBOUNCER": pgbouncer,
+        }
+    )
+    test_engine = create_async_engine(
+        str(test_settings.DB_URI), **engine_options(test_settings)
+    )
+    try:
+        async with test_engine.connect() as connection:
+            for _ in range(2):
+                timeout = await connection.scalar(text("SHOW statement_timeout"))
+                jit = await connection.scalar(text("SHOW jit"))
+    finally:
+        await test_engine.dispose()
+    if pgbouncer:
+        assert timeout != "1500ms"
+    else:
+        assert (timeout, jit) == ("1500ms", "off")
+
+
+def test_retry_policy_delay() -> None:
+    policy = RetryPolicy(attempts=5, backoff=0.1, max_backoff=0.3)
+    for attempt, limit in ((1, 0.2), (2, 0.3), (10, 0.3)):
+        assert all(0 <= policy.delay(attempt) <= limit for _ in range(100))
+
+
+class FakeDBError(Exception):
+    def __init__(self, sqlstate: str):
+        self.sqlstate = sqlstate
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sqlstate", ["40001", "40P01"])
+async def test_transactional_retry(sqlstate: str, db_session: AsyncSession) -> None:
+    calls = 0
+
+    @Transactional(retry=RetryPolicy(attempts=3, backoff=0))
+    async def conflicting(crud: SimpleNamespace) -> int:
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise DBAPIError("UPDATE", {}, FakeDBError(sqlstate))
+        return calls
+
+    labels = (conflicting.__qualname__, sqlstate)
+    retries = metrics.DB_TRANSACTION_RETRIES._values.get(labels, 0)
+    assert await conflicting(SimpleNamespace(session=db_session)) == 3
+    assert metrics.DB_TRANSACTION_RETRIES._values[labels] - retries == 2
+
+
+@pytest.mark.asyncio
+async def test_transactional_retry_exhausted(db_session: AsyncSession) -> None:
+    calls = 0
+
+    @Transactional(retry=RetryPolicy(attempts=2, backoff=0))
+    async def conflicting(crud: SimpleNamespace) -> None:
+        nonlocal calls
+        calls += 1
+        raise DBAPIError("UPDATE", {}, FakeDBError("40P01"))
+
+    labels = (conflicting.__qualname__, "40P01")
+    aborts = metrics.DB_TRANSACTION_ABORTS._values.get(labels, 0)
+    with pytest.raises(HTTPException) as exception_info:
+        await conflicting(SimpleNamespace(session=db_session))
+    assert exception_info.value.status_code == 503
+    assert calls == 2
+    assert metrics.DB_TRANSACTION_ABORTS._values[labels] - aborts == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "exception",
+    [DBAPIError("INSERT", {}, FakeDBError("23505")), ValueError("Not a DB error.")],
+)
+async def test_transactional_no_retry(
+    exception: Exception, db_session: AsyncSession
+) -> None:
+    calls = 0
+
+    @Transactional(retry=RetryPolicy(attempts=3, backoff=0))
+    async def failing(crud: SimpleNamespace) -> None:
+        nonlocal calls
+        calls += 1
+        raise exception
+
+    with pytest.raises(type(exception)):
+        await failing(SimpleNamespace(session=db_session))
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_transactional_serialization_failure() -> None:
+    # Runs on real connections, outside of the test transaction
+    session = database.session_factory()
+    product = Product(name="name", description="description", price=1.0, amount=10)
+    product_id = product.id
+    async with AsyncSession(database.engine) as other:
+        other.add(product)
+        await other.commit()
+    calls = 0
+
+    @Transactional(
+        isolation_level="REPEATABLE READ", retry=RetryPolicy(attempts=3, backoff=0)
+    )
+    async def decrement(crud: SimpleNamespace) -> int:
+        nonlocal calls
+        calls += 1
+        amount = await session.scalar(
+            select(Product.amount).where(Product.id == product_id)
+        )
+        if calls == 1:
+            # A concurrent transaction changes the row after the snapshot was taken
+            async with AsyncSession(database.engine) as other:
+                await other.execute(
+                    update(Product)
+                    .where(Product.id == product_id)
+                    .values(amount=Product.amount - 1)
+                )
+                await other.commit()
+        await session.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(amount=amount - 1)
+            .execution_options(synchronize_session=False)
+        )
+        return amount
+
+    try:
+        assert await decrement(SimpleNamespace(session=session)) == 9
+        assert calls == 2
+        assert (
+            await session.scalar(select(Product.amount).where(Product.id == product_id))
+            == 8
+        )
+    finally:
+        await session.close()
+        async with AsyncSession(database.engine) as other:
+            await other.execute(delete(Product).where(Product.id == product_id))
+            await other.commit()
+
+
+@pytest.mark.asyncio
+async def test_get_session_per_request() -> None:
+    first_request, second_request = get_session(), get_session()
+    first = await anext(first_request)
+    second = await anext(second_request)
+    assert first is not second
+    await first.execute(text("SELECT 1"))
+    assert first.in_transaction()
+
+    # Closing the request session ends its transaction
+    await first_request.aclose()
+    await second_request.aclose()
+    assert not first.in_transaction()
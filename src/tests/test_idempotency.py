@@ -0,0 +1,165 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import List
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid_extensions import uuid7
+
+from shopAPI.config import settings
+from shopAPI.crud import IdempotencyKeyCRUD
+from shopAPI.idempotency import IDEMPOTENCY_KEY_HEADER, IDEMPOTENT_REPLAYED_HEADER
+from shopAPI.models import IdempotencyKey, Order
+import shopAPI.database as database
+import tests.utils as utils
+
+
+async def count_orders(db_session: AsyncSession) -> int:
+    return await db_session.scalar(select(func.count()).select_from(Order))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [3], indirect=True)
+@pytest.mark.parametrize("order_payloads", [1], indirect=True)
+async def test_post_order_idempotent(
+    client: AsyncClient,
+    product_payloads: List[dict],
+    order_payloads: List[dict],
+    db_session: AsyncSession,
+) -> None:
+    headers = {IDEMPOTENCY_KEY_HEADER: str(uuid7())}
+    orders_before = await count_orders(db_session)
+    response_create = await client.post(
+        "orders", json=order_payloads[0], headers=headers
+    )
+    assert response_create.status_code == 201
+    assert IDEMPOTENT_REPLAYED_HEADER not in response_create.headers
+    for _ in range(2):
+        response_replay = await client.post(
+            "orders", json=order_payloads[0], headers=headers
+        )
+        assert response_replay.status_code == 201
+        assert response_replay.headers[IDEMPOTENT_REPLAYED_HEADER] == "true"
+        assert response_replay.content == response_create.content
+    assert await count_orders(db_session) == orders_before + 1
+    # The stock is decremented once
+    products_amount = {product["id"]: product["amount"] for product in product_payloads}
+    for item in order_payloads[0]["order_items"]:
+        products_amount[item["product_id"]] -= item["amount"]
+    await utils.compare_db_products_amount(products_amount, db_session)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+@pytest.mark.parametrize("order_payloads", [2], indirect=True)
+async def test_post_order_idempotency_key_reused(
+    client: AsyncClient, order_payloads: List[dict]
+) -> None:
+    headers = {IDEMPOTENCY_KEY_HEADER: str(uuid7())}
+    response_create = await client.post(
+        "orders", json=order_payloads[0], headers=headers
+    )
+    assert response_create.status_code == 201
+    response_create = await client.post(
+        "orders", json=order_payloads[1], headers=headers
+    )
+    assert response_create.status_code == 422
+    assert response_create.json() == {
+        "detail": "Idempotency key was used for a different order."
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+@pytest.mark.parametrize("order_payloads", [1], indirect=True)
+async def test_post_order_idempotency_key_released_on_error(
+    client: AsyncClient,
+    product_payloads: List[dict],
+    order_payloads: List[dict],
+    db_session: AsyncSession,
+) -> None:
+    key = str(uuid7())
+    order_payload = order_payloads[0]
+    order_payload["order_items"][0]["amount"] = product_payloads[0]["amount"] + 1
+    response_create = await client.post(
+        "orders", json=order_payload, headers={IDEMPOTENCY_KEY_HEADER: key}
+    )
+    assert response_create.status_code == 400
+    assert await db_session.get(IdempotencyKey, key) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+@pytest.mark.parametrize("order_payloads", [1], indirect=True)
+async def test_post_order_idempotency_key_expired(
+    client: AsyncClient,
+    order_payloads: List[dict],
+    db_session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    headers = {IDEMPOTENCY_KEY_HEADER: str(uuid7())}
+    order_payloads[0]["order_items"][0]["amount"] = 1
+    orders_before = await count_orders(db_session)
+    monkeypatch.setattr(settings, "IDEMPOTENCY_KEY_TTL", 0)
+    for _ in range(2):
+        response_create = await client.post(
+            "orders", json=order_payloads[0], headers=headers
+        )
+        assert response_create.status_code == 201
+        assert IDEMPOTENT_REPLAYED_HEADER not in response_create.headers
+    assert await count_orders(db_session) == orders_before + 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("key", ["", "k" * 256])
+async def test_post_order_idempotency_key_invalid(
+    client: AsyncClient, key: str
+) -> None:
+    response_create = await client.post(
+        "orders",
+        json={"order_items": [{"product_id": str(uuid7()), "amount": 1}]},
+        headers={IDEMPOTENCY_KEY_HEADER: key},
+    )
+    await utils.check_422_error(response_create, IDEMPOTENCY_KEY_HEADER)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("commit", [True, False])
+async def test_idempotency_key_claim_waits(commit: bool) -> None:
+    # Two transactions outside of the test one claim the same key
+    key = str(uuid7())
+    async with AsyncSession(database.engine) as first, AsyncSession(
+        database.engine
+    ) as second:
+        assert await IdempotencyKeyCRUD(first).claim(key, "hash") is None
+        waiting = asyncio.create_task(IdempotencyKeyCRUD(second).claim(key, "hash"))
+        await asyncio.sleep(0.2)
+        assert not waiting.done()
+        await IdempotencyKeyCRUD(first).store(key, 201, "{}")
+        if commit:
+            await first.commit()
+            stored = await waiting
+            assert (stored.status_code, stored.response) == (201, "{}")
+        else:
+            await first.rollback()
+            assert await waiting is None
+        await second.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+        await second.commit()
+
+
+@pytest.mark.asyncio
+async def test_idempotency_key_purge(db_session: AsyncSession) -> None:
+    now = datetime.now()
+    db_session.add_all(
+        IdempotencyKey(key=key, request_hash="hash", created_at=created_at)
+        for key, created_at in (
+            ("old", now - timedelta(days=2)),
+            ("new", now - timedelta(minutes=1)),
+        )
+    )
+    await db_session.flush()
+    purged = await IdempotencyKeyCRUD(db_session).purge(now - timedelta(days=1))
+    assert purged >= 1
+    assert await db_session.get(IdempotencyKey, "old") is None
+    assert await db_session.get(IdempotencyKey, "new") is not None
@@ -0,0 +1,89 @@
+import asyncio
+from typing import List
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shopAPI.config import settings
+from shopAPI.instrumentation import QueryStats, collect_queries, parse_server_timing
+import tests.utils as utils
+
+
+def test_server_timing() -> None:
+    stats = QueryStats()
+    stats.record("SELECT 1", 0.0015)
+    stats.record("SELECT 1", 0.001)
+    stats.record("SELECT 2", 0.0005)
+    assert stats.server_timing() == 'db;dur=3.000;desc="3 queries"'
+    assert parse_server_timing("app;dur=1, " + stats.server_timing()) == {
+        "queries": 3,
+        "duration": 3.0,
+    }
+    assert stats.repeated(1) == [("SELECT 1", 2)]
+
+
+@pytest.mark.asyncio
+async def test_collect_queries_failed_statement(db_session: AsyncSession) -> None:
+    with collect_queries() as stats:
+        with pytest.raises(DBAPIError):
+            async with db_session.begin_nested():
+                await db_session.execute(text("SELECT 1 / 0"))
+        await asyncio.sleep(0.1)
+        await db_session.execute(text("SELECT 1"))
+    # The failed statement isn't recorded and leaves nothing on the connection,
+    # the next one is timed from its own start
+    assert stats.count == 1
+    assert stats.duration < 0.1
+    assert "query_start" not in (await db_session.connection()).info
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+async def test_query_budget_get_product(
+    client: AsyncClient, product_payloads: List[dict]
+) -> None:
+    await utils.create_entities(client, "products", product_payloads)
+    path = f"products/{product_payloads[0]['id']}"
+    # The created product is cached by the first read
+    assert utils.query_count(await client.get(path)) == 1
+    assert utils.query_count(await client.get(path)) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [5], indirect=True)
+@pytest.mark.parametrize("order_payloads", [1, 5], indirect=True)
+async def test_query_budget_orders(
+    client: AsyncClient, order_payloads: List[dict]
+) -> None:
+    # The number of queries doesn't depend on the number of orders and items
+    response_create = await client.post("orders/", json=order_payloads[0])
+    assert response_create.status_code == 201
+    # The stock update, the row counter update and the order and items inserts
+    assert utils.query_count(response_create) == 4
+    await utils.create_orders(client, order_payloads[1:])
+    response_get = await client.get("orders/")
+    assert response_get.status_code == 200
+    assert utils.query_count(response_get) == 3
+    response_get = await client.get(f"orders/{response_create.json()['id']}")
+    assert response_get.status_code == 200
+    assert utils.query_count(response_get) == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [3], indirect=True)
+async def test_n_plus_one_warning(
+    client: AsyncClient,
+    product_payloads: List[dict],
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setattr(settings, "DB_BULK_CHUNK_SIZE", 1)
+    monkeypatch.setattr(settings, "DB_N_PLUS_ONE_THRESHOLD", 2)
+    response = await client.post("products/bulk", json=product_payloads)
+    assert response.status_code == 201
+    # A chunk per product and the row counter update
+    assert utils.query_count(response) == 4
+    assert "Possible N+1 query in POST /api/v1/products/bulk" in caplog.text
+    assert "executed 3 times" in caplog.text
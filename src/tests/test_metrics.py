@@ -0,0 +1,78 @@
+from typing import List
+import pytest
+from httpx import AsyncClient
+
+from shopAPI.metrics import Counter, Histogram, Registry
+import tests.utils as utils
+
+
+def test_histogram_render() -> None:
+    registry = Registry()
+    histogram = Histogram(
+        "test_seconds", "Test.", ("route",), buckets=(0.1, 1.0), registry=registry
+    )
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, "/a")
+    assert registry.render().splitlines() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="/a",le="0.1"} 2',
+        'test_seconds_bucket{route="/a",le="1.0"} 3',
+        'test_seconds_bucket{route="/a",le="+Inf"} 4',
+        'test_seconds_sum{route="/a"} 2.65',
+        'test_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_metric_duplicate_name() -> None:
+    registry = Registry()
+    Counter("test_duplicate_total", "Test.", registry=registry)
+    with pytest.raises(ValueError):
+        Counter("test_duplicate_total", "Test.", registry=registry)
+
+
+def get_sample(metrics: str, sample: str) -> float:
+    for line in metrics.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+async def test_metrics_endpoint(
+    client: AsyncClient, product_payloads: List[dict]
+) -> None:
+    requests = 'route="/api/v1/products/{id}",status="200"'
+    before = (await client.get("http://testserver/metrics")).text
+    await utils.create_entities(client, "products", product_payloads)
+    for product_payload in product_payloads:
+        await client.get(f"products/{product_payload['id']}")
+    await client.get("products/not_a_uuid")
+    await client.get("http://testserver/no_such_route")
+    for method in ("FOO", "BAR"):
+        await client.request(method, "http://testserver/no_such_route")
+    response = await client.get("http://testserver/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    after = response.text
+    sample = f'shopapi_http_requests_total{{method="GET",{requests}}}'
+    assert get_sample(after, sample) - get_sample(before, sample) == 2
+    sample = 'shopapi_http_requests_total{method="GET",route="unmatched",status="404"}'
+    assert get_sample(after, sample) - get_sample(before, sample) == 1
+    # Unknown methods share one series
+    sample = (
+        'shopapi_http_requests_total{method="OTHER",route="unmatched",status="404"}'
+    )
+    assert get_sample(after, sample) - get_sample(before, sample) == 2
+    assert 'method="FOO"' not in after
+    sample = 'shopapi_http_request_duration_seconds_count{method="GET",route="/api/v1/products/{id}"}'
+    assert get_sample(after, sample) - get_sample(before, sample) == 3
+    # The scrape itself is in flight
+    assert get_sample(after, "shopapi_http_requests_in_flight") == 1
+    for name in (
+        "shopapi_db_pool_checked_out",
+        "shopapi_db_pool_overflow",
+        'shopapi_db_pool_checkout_seconds_count{pool="primary"}',
+    ):
+        assert f"\n{name} " in after
@@ -1,9 +1,33 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
 from typing import List
+from uuid import UUID
 import pytest
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
 from httpx import AsyncClient
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
+from uuid_extensions import uuid7
 
-from shopAPI.models import OrderStatus
+from shopAPI.crud import OrderCRUD, OrderPartitionCRUD, RowCountCRUD
+from shopAPI.models import (
+    MAX_PRICE,
+    Order,
+    OrderCreate,
+    OrderItem,
+    OrderItemsMode,
+    OrderStatus,
+    Product,
+)
+from shopAPI.partitions import add_months
+from shopAPI.routers.v1.orders import get_orders_all, orders_serializers
+from shopAPI.server import app
+import shopAPI.database as database
 import tests.utils as utils
 
 
@@ -104,3 +128,323 @@ async def test_post_order_products_amount(
     await utils.compare_db_products_amount(
         products_amount.fromkeys(products_amount, 0), db_session
     )
+
+
+@pytest.mark.asyncio
+async def test_post_orders_reversed_items_concurrently() -> None:
+    # Runs on real connections, outside of the test transaction
+    products = [
+        Product(name="name", description="description", price=1.0, amount=100)
+        for _ in range(2)
+    ]
+    product_ids = sorted(product.id for product in products)
+    async with database.session_factory() as session:
+        # Stored in the reverse id order, so a scan of the table doesn't lock them
+        # in the id order by chance
+        session.add_all(sorted(products, key=lambda product: product.id, reverse=True))
+        await session.commit()
+
+    async def create_order(product_ids: List[UUID]) -> Order:
+        async with database.session_factory() as session:
+            return await OrderCRUD(session).create(
+                OrderCreate(
+                    order_items=[
+                        {"product_id": product_id, "amount": 1}
+                        for product_id in product_ids
+                    ]
+                )
+            )
+
+    waiting = None
+    try:
+        # The order locks the products in the id order, whatever the order of its items
+        async with database.session_factory() as holder:
+            await holder.execute(
+                select(Product.id).where(Product.id == product_ids[1]).with_for_update()
+            )
+            waiting = asyncio.create_task(create_order(product_ids[::-1]))
+            await asyncio.sleep(0.2)
+            assert not waiting.done()
+            async with database.session_factory() as session:
+                with pytest.raises(DBAPIError):
+                    await session.execute(
+                        select(Product.id)
+                        .where(Product.id == product_ids[0])
+                        .with_for_update(nowait=True)
+                    )
+        assert isinstance(await waiting, Order)
+
+        orders = await asyncio.gather(
+            *(
+                create_order(product_ids if i % 2 else product_ids[::-1])
+                for i in range(20)
+            )
+        )
+        assert all(isinstance(order, Order) for order in orders)
+        async with database.session_factory() as session:
+            amounts = await session.scalars(
+                select(Product.amount).where(Product.id.in_(product_ids))
+            )
+            assert list(amounts) == [79, 79]
+    finally:
+        if waiting is not None:
+            await asyncio.gather(waiting, return_exceptions=True)
+        async with database.session_factory() as session:
+            order_ids = (
+                await session.scalars(
+                    delete(OrderItem)
+                    .where(OrderItem.product_id.in_(product_ids))
+                    .returning(OrderItem.order_id)
+                )
+            ).all()
+            await session.execute(delete(Order).where(Order.id.in_(set(order_ids))))
+            await session.execute(delete(Product).where(Product.id.in_(product_ids)))
+            # Commits the deletes with the counters
+            await RowCountCRUD(session).recount([Order, Product])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [5], indirect=True)
+@pytest.mark.parametrize("order_payloads", [7], indirect=True)
+@pytest.mark.parametrize("limit", [2, 7])
+async def test_get_all_orders_cursor(
+    client: AsyncClient, order_payloads: List[dict], limit: int
+) -> None:
+    # Walk through all pages following the X-Next-Cursor header
+    await utils.create_orders(client, order_payloads)
+    received = await utils.get_all_pages(client, "orders/", limit)
+    assert len(received) == len(order_payloads)
+    for order_payload, order in zip(order_payloads, received):
+        await utils.compare_orders(order_payload, order)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [5, 1], indirect=True)
+@pytest.mark.parametrize("order_payloads", [1, 10], indirect=True)
+async def test_post_orders_batch(
+    client: AsyncClient,
+    product_payloads: List[dict],
+    order_payloads: List[dict],
+    db_session: AsyncSession,
+) -> None:
+    response_create = await client.post("orders/batch", json=order_payloads)
+    assert response_create.status_code == 200
+    results = response_create.json()
+    assert len(results) == len(order_payloads)
+    products_amount = {product["id"]: product["amount"] for product in product_payloads}
+    for order_payload, result in zip(order_payloads, results):
+        assert result["status_code"] == 201
+        assert result["detail"] is None
+        order_payload["id"] = result["order"]["id"]
+        order_payload["status"] = result["order"]["status"]
+        order_payload["creation_date"] = result["order"]["creation_date"]
+        await utils.compare_db_order_to_payload(order_payload, db_session)
+        for item in order_payload["order_items"]:
+            products_amount[item["product_id"]] -= item["amount"]
+    await utils.compare_db_products_amount(products_amount, db_session)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+async def test_post_orders_batch_partial(
+    client: AsyncClient,
+    product_payloads: List[dict],
+    db_session: AsyncSession,
+) -> None:
+    # The first order takes most of the first product's stock, so the second
+    # order for the same product can't be fulfilled, the third order has
+    # duplicate products and the fourth one has a missing product.
+    # Only the first and the last valid orders must be created.
+    await utils.create_entities(client, "products", product_payloads)
+    first, second = product_payloads
+    missing_id = str(uuid7())
+    order_payloads = [
+        {"order_items": [{"product_id": first["id"], "amount": first["amount"] - 1}]},
+        {"order_items": [{"product_id": first["id"], "amount": 2}]},
+        {
+            "order_items": [
+                {"product_id": second["id"], "amount": 1},
+                {"product_id": second["id"], "amount": 1},
+            ]
+        },
+        {"order_items": [{"product_id": missing_id, "amount": 1}]},
+        {"order_items": [{"product_id": first["id"], "amount": 1}]},
+    ]
+    response_create = await client.post("orders/batch", json=order_payloads)
+    assert response_create.status_code == 200
+    results = response_create.json()
+    assert [result["status_code"] for result in results] == [201, 400, 400, 404, 201]
+    assert results[1]["detail"] == f"Product {first['id']} not enough in stock."
+    assert results[2]["detail"] == "Duplicate product IDs."
+    assert results[3]["detail"] == f"Product {missing_id} not found."
+    assert all(results[i]["order"] is None for i in (1, 2, 3))
+    for i in (0, 4):
+        assert await utils.get_order_from_db(results[i]["order"]["id"], db_session)
+    await utils.compare_db_products_amount(
+        {first["id"]: 0, second["id"]: second["amount"]}, db_session
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [5], indirect=True)
+@pytest.mark.parametrize("order_payloads", [1, 12], indirect=True)
+async def test_export_orders_ndjson(
+    client: AsyncClient, order_payloads: List[dict]
+) -> None:
+    await utils.create_orders(client, order_payloads)
+    response_export = await client.get("orders/export")
+    assert response_export.status_code == 200
+    assert response_export.headers["content-type"] == "application/x-ndjson"
+    lines = response_export.text.splitlines()
+    assert len(lines) == len(order_payloads)
+    response_get = await client.get("orders/")
+    assert [json.loads(line) for line in lines] == response_get.json()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [5], indirect=True)
+@pytest.mark.parametrize("order_payloads", [4], indirect=True)
+async def test_export_orders_csv(
+    client: AsyncClient, order_payloads: List[dict]
+) -> None:
+    await utils.create_orders(client, order_payloads)
+    response_export = await client.get("orders/export", params={"format": "csv"})
+    assert response_export.status_code == 200
+    assert response_export.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response_export.text)))
+    expected = [
+        (order["id"], order["status"], item["product_id"], str(item["amount"]))
+        for order in order_payloads
+        for item in order["order_items"]
+    ]
+    assert [
+        (row["order_id"], row["status"], row["product_id"], row["amount"])
+        for row in rows
+    ] == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [5], indirect=True)
+@pytest.mark.parametrize("order_payloads", [4], indirect=True)
+async def test_export_orders_filters(
+    client: AsyncClient, order_payloads: List[dict]
+) -> None:
+    await utils.create_orders(client, order_payloads)
+    shipped = order_payloads[1]
+    await client.patch(f"orders/{shipped['id']}/status", params={"status": "shipped"})
+    response_export = await client.get("orders/export", params={"status": "shipped"})
+    assert [json.loads(line)["id"] for line in response_export.text.splitlines()] == [
+        shipped["id"]
+    ]
+    response_export = await client.get(
+        "orders/export", params={"since": "2100-01-01T00:00:00"}
+    )
+    assert response_export.text == ""
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [5], indirect=True)
+@pytest.mark.parametrize("order_payloads", [6], indirect=True)
+async def test_get_all_orders_filters(
+    client: AsyncClient, order_payloads: List[dict], db_session: AsyncSession
+) -> None:
+    # Move each order a day back from the previous one, ship every other one,
+    # then filter by status and creation date range
+    await utils.create_orders(client, order_payloads)
+    now = datetime.now().replace(microsecond=0)
+    # The orders may move to the previous month, the items move with them
+    await OrderPartitionCRUD(db_session).create([add_months(now, -1)])
+    await db_session.execute(text("SET CONSTRAINTS ALL DEFERRED"))
+    for i, order_payload in enumerate(order_payloads):
+        if i % 2:
+            order_payload["status"] = OrderStatus.shipped.value
+            await client.patch(
+                f"orders/{order_payload['id']}/status",
+                params={"status": order_payload["status"]},
+            )
+        creation_date = now - timedelta(days=len(order_payloads) - i)
+        await db_session.execute(
+            update(OrderItem)
+            .where(OrderItem.order_id == order_payload["id"])
+            .values(order_creation_date=creation_date)
+            .execution_options(synchronize_session=False)
+        )
+        await db_session.execute(
+            update(Order)
+            .where(Order.id == order_payload["id"])
+            .values(creation_date=creation_date)
+            .execution_options(synchronize_session=False)
+        )
+        order_payload["creation_date"] = creation_date.strftime("%Y-%m-%d %H:%M:%S")
+    # The orders loaded by the requests above share the test session
+    db_session.expire_all()
+    cases = [
+        ({"status": "shipped"}, order_payloads[1::2]),
+        ({"status": ["created", "shipped"]}, order_payloads),
+        ({"status": "canceled"}, []),
+        ({"created_from": order_payloads[2]["creation_date"]}, order_payloads[2:]),
+        ({"created_to": order_payloads[2]["creation_date"]}, order_payloads[:2]),
+        (
+            {
+                "status": "created",
+                "created_from": order_payloads[1]["creation_date"],
+                "created_to": order_payloads[4]["creation_date"],
+            },
+            [order_payloads[2]],
+        ),
+        ({"sort": "desc"}, order_payloads[::-1]),
+    ]
+    for params, expected in cases:
+        response_get = await client.get("orders/", params=params)
+        assert response_get.status_code == 200
+        response_get_json = response_get.json()
+        assert [order["id"] for order in response_get_json] == [
+            order["id"] for order in expected
+        ]
+        for order_payload, order in zip(expected, response_get_json):
+            await utils.compare_orders(order_payload, order)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [5], indirect=True)
+@pytest.mark.parametrize("order_payloads", [7], indirect=True)
+async def test_get_all_orders_cursor_desc(
+    client: AsyncClient, order_payloads: List[dict]
+) -> None:
+    await utils.create_orders(client, order_payloads)
+    received = await utils.get_all_pages(client, "orders/", 3, {"sort": "desc"})
+    assert [order["id"] for order in received] == [
+        order["id"] for order in reversed(order_payloads)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [5], indirect=True)
+@pytest.mark.parametrize("order_payloads", [3], indirect=True)
+@pytest.mark.parametrize("price", [None, 0.0, 0.01, 0.1, 123456789.99, MAX_PRICE])
+async def test_orders_fast_serializer_matches_fastapi(
+    client: AsyncClient,
+    order_payloads: List[dict],
+    db_session: AsyncSession,
+    price: float | None,
+) -> None:
+    # The fast serializer must produce the same bytes as FastAPI's own pipeline,
+    # down to the notation of the floats
+    await utils.create_orders(client, order_payloads)
+    if price is not None:
+        await db_session.execute(update(Product).values(price=price))
+        db_session.expire_all()
+    orders = await OrderCRUD(db_session).get_all(offset=0, limit=100)
+    route = next(
+        route
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.endpoint is get_orders_all
+    )
+    expected = JSONResponse(
+        await serialize_response(field=route.response_field, response_content=orders)
+    ).body
+    response_get = await client.get("orders/")
+    assert response_get.status_code == 200
+    assert response_get.headers["content-type"] == "application/json"
+    assert response_get.content == expected
+    assert orders_serializers[OrderItemsMode.full](orders).body == expected
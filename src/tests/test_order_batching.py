@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid_extensions import uuid7
+
+from shopAPI import metrics
+from shopAPI.batching import OrderBatcher, order_batcher
+from shopAPI.config import settings
+from shopAPI.models import OrderCreate
+import tests.utils as utils
+
+
+def batches_count() -> int:
+    observations = metrics.ORDER_BATCH_SIZE._observations.get(())
+    return sum(observations[0]) if observations else 0
+
+
+@pytest.fixture
+def batching(monkeypatch: pytest.MonkeyPatch) -> OrderBatcher:
+    monkeypatch.setattr(settings, "ORDER_BATCHING", True)
+    monkeypatch.setattr(order_batcher, "window", 0.05)
+    return order_batcher
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [3], indirect=True)
+@pytest.mark.parametrize("order_payloads", [6], indirect=True)
+async def test_post_orders_batched(
+    client: AsyncClient,
+    product_payloads: List[dict],
+    order_payloads: List[dict],
+    db_session: AsyncSession,
+    batching: OrderBatcher,
+) -> None:
+    batches = batches_count()
+    responses = await asyncio.gather(
+        *(client.post("orders", json=payload) for payload in order_payloads)
+    )
+    assert [response.status_code for response in responses] == [201] * 6
+    assert batches_count() - batches == 1
+
+    products_amount = {product["id"]: product["amount"] for product in product_payloads}
+    for payload, response in zip(order_payloads, responses):
+        payload.update(response.json())
+        await utils.compare_db_order_to_payload(payload, db_session)
+        for item in payload["order_items"]:
+            products_amount[item["product_id"]] -= item["amount"]
+    await utils.compare_db_products_amount(products_amount, db_session)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+async def test_post_orders_batched_errors(
+    client: AsyncClient,
+    product_payloads: List[dict],
+    db_session: AsyncSession,
+    batching: OrderBatcher,
+) -> None:
+    await utils.create_entities(client, "products", product_payloads)
+    product = product_payloads[0]
+    order = {
+        "order_items": [{"product_id": product["id"], "amount": product["amount"]}]
+    }
+    missing = {"order_items": [{"product_id": str(uuid7()), "amount": 1}]}
+    # Only one of the orders of the whole stock fits
+    responses = await asyncio.gather(
+        *(client.post("orders", json=payload) for payload in (order, order, missing))
+    )
+    statuses = [response.status_code for response in responses]
+    assert sorted(statuses[:2]) == [201, 400]
+    assert statuses[2] == 404
+    await utils.compare_db_products_amount({product["id"]: 0}, db_session)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+@pytest.mark.parametrize("order_payloads", [5], indirect=True)
+async def test_post_orders_batch_max_size(
+    client: AsyncClient,
+    order_payloads: List[dict],
+    batching: OrderBatcher,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # Full batches don't wait for the window
+    monkeypatch.setattr(batching, "window", 2)
+    monkeypatch.setattr(batching, "max_size", 5)
+    batches = batches_count()
+    responses = await asyncio.gather(
+        *(client.post("orders", json=payload) for payload in order_payloads)
+    )
+    assert [response.status_code for response in responses] == [201] * 5
+    assert batches_count() - batches == 1
+
+
+@pytest.mark.asyncio
+async def test_order_batcher_failure() -> None:
+    async def create_batch(models_create: List[OrderCreate]) -> None:
+        raise HTTPException(status_code=503, detail="Conflict.")
+
+    batcher = OrderBatcher(window=0.01, max_size=10)
+    crud = SimpleNamespace(create_batch=create_batch)
+    model_create = OrderCreate(
+        order_items=[
+            {"product_id": "06ad42c4-e40d-72f5-8000-b683741b157c", "amount": 1}
+        ]
+    )
+    results = await asyncio.gather(
+        *(batcher.create(crud, model_create) for _ in range(3)),
+        return_exceptions=True,
+    )
+    assert [result.status_code for result in results] == [503] * 3
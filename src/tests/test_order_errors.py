@@ -1,6 +1,7 @@
 from typing import List
 import pytest
 from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid_extensions import uuid7
 
 from shopAPI.models import OrderStatus
@@ -147,3 +148,89 @@ async def test_patch_order_status_incorrect_status(
         params=params,
     )
     await utils.check_422_error(response_patch, "status")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [3], indirect=True)
+async def test_post_order_one_item_not_in_stock(
+    client: AsyncClient,
+    product_payloads: List[dict],
+    db_session: AsyncSession,
+) -> None:
+    # Order every product, one of them more than in stock, and check that
+    # the order is rejected and no product amount is changed
+    await utils.create_entities(client, "products", product_payloads)
+    order_payload = {
+        "order_items": [
+            {"product_id": product_payload["id"], "amount": 1}
+            for product_payload in product_payloads
+        ]
+    }
+    order_payload["order_items"][-1]["amount"] = product_payloads[-1]["amount"] + 1
+    response_create = await client.post("orders", json=order_payload)
+    assert response_create.status_code == 400
+    assert (
+        response_create.json()["detail"]
+        == f"Product {product_payloads[-1]['id']} not enough in stock."
+    )
+    await utils.compare_db_products_amount(
+        {product["id"]: product["amount"] for product in product_payloads},
+        db_session,
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cursor", ["cursor", "WyIxMjMiXQ==", "W10="])
+async def test_get_all_orders_invalid_cursor(client: AsyncClient, cursor: str) -> None:
+    response_get = await client.get("orders/", params={"cursor": cursor})
+    assert response_get.status_code == 400
+    assert response_get.json()["detail"] == "Invalid cursor."
+
+
+@pytest.mark.asyncio
+async def test_post_orders_batch_empty(client: AsyncClient) -> None:
+    response_create = await client.post("orders/batch", json=[])
+    await utils.check_422_error(response_create, "body")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+@pytest.mark.parametrize("order_payloads", [2], indirect=True)
+async def test_post_orders_batch_invalid_field(
+    client: AsyncClient, order_payloads: List[dict]
+) -> None:
+    order_payloads[1]["order_items"][0]["amount"] = 0
+    response_create = await client.post("orders/batch", json=order_payloads)
+    await utils.check_422_error(response_create, "amount")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "params", [{"format": "xml"}, {"status": "test_status"}, {"since": "yesterday"}]
+)
+async def test_export_orders_invalid_params(client: AsyncClient, params: dict) -> None:
+    response_export = await client.get("orders/export", params=params)
+    await utils.check_422_error(response_export, next(iter(params)))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"created_from": "yesterday"},
+        {"created_to": "tomorrow"},
+        {"sort": "random"},
+    ],
+)
+async def test_get_all_orders_invalid_filters(
+    client: AsyncClient, params: dict
+) -> None:
+    response_get = await client.get("orders/", params=params)
+    await utils.check_422_error(response_get, next(iter(params)))
+
+
+@pytest.mark.asyncio
+async def test_get_all_orders_invalid_status(client: AsyncClient) -> None:
+    response_get = await client.get("orders/", params={"status": "test_status"})
+    assert response_get.status_code == 422
+    assert response_get.json()["detail"][0]["loc"] == ["query", "status", 0]
@@ -0,0 +1,247 @@
+from datetime import date, datetime
+from typing import List
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, text, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shopAPI import database
+from shopAPI.crud import OrderPartitionCRUD, RowCountCRUD
+from shopAPI.models import Order, OrderItem
+from shopAPI.partitions import add_months
+import tests.utils as utils
+
+# Long before any real order
+JANUARY = date(2001, 1, 1)
+FEBRUARY = date(2001, 2, 1)
+
+
+async def move_orders(
+    db_session: AsyncSession, order_payloads: List[dict], creation_date: datetime
+) -> None:
+    # The items move first, the foreign keys are checked at the end
+    await db_session.execute(text("SET CONSTRAINTS ALL DEFERRED"))
+    for order_payload in order_payloads:
+        await db_session.execute(
+            update(OrderItem)
+            .where(OrderItem.order_id == order_payload["id"])
+            .values(order_creation_date=creation_date)
+            .execution_options(synchronize_session=False)
+        )
+        await db_session.execute(
+            update(Order)
+            .where(Order.id == order_payload["id"])
+            .values(creation_date=creation_date)
+            .execution_options(synchronize_session=False)
+        )
+        order_payload["creation_date"] = creation_date.strftime("%Y-%m-%d %H:%M:%S")
+    await db_session.execute(text("SET CONSTRAINTS ALL IMMEDIATE"))
+
+
+async def explain(db_session: AsyncSession, query: str) -> str:
+    plan = await db_session.scalars(text(f"EXPLAIN {query}"))
+    return "\n".join(plan)
+
+
+@pytest.mark.parametrize(
+    "month, months, expected",
+    [
+        (date(2026, 10, 18), 0, date(2026, 10, 1)),
+        (date(2026, 10, 1), 3, date(2027, 1, 1)),
+        (date(2026, 12, 31), 1, date(2027, 1, 1)),
+        (date(2026, 1, 15), -1, date(2025, 12, 1)),
+        (date(2026, 10, 1), -22, date(2024, 12, 1)),
+    ],
+)
+def test_add_months(month: date, months: int, expected: date) -> None:
+    assert add_months(month, months) == expected
+
+
+@pytest.mark.asyncio
+async def test_create_partitions(db_session: AsyncSession) -> None:
+    crud = OrderPartitionCRUD(db_session)
+    months = await crud.get_months()
+    current = datetime.now().date().replace(day=1)
+    assert current in months
+
+    assert await crud.create([FEBRUARY, JANUARY, current]) == [JANUARY, FEBRUARY]
+    assert await crud.create([JANUARY]) == []
+    assert await crud.get_months() == sorted(months + [JANUARY, FEBRUARY])
+
+    # The items of the month reference the orders of the month
+    constraints = await db_session.scalars(
+        text(
+            "SELECT conname FROM pg_constraint "
+            "WHERE conrelid = CAST('order_item_p2001_01' AS regclass) "
+            "AND contype = 'f' AND condeferrable"
+        )
+    )
+    assert list(constraints) == ["order_item_p2001_01_order_fkey"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_payloads", [3], indirect=True)
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+async def test_order_partition_pruning(
+    client: AsyncClient, db_session: AsyncSession, order_payloads: List[dict]
+) -> None:
+    await utils.create_orders(client, order_payloads)
+    await OrderPartitionCRUD(db_session).create([JANUARY, FEBRUARY])
+    await move_orders(db_session, order_payloads[:2], datetime(2001, 1, 10, 12))
+
+    # The orders and their items are read from their new month
+    response = await client.get(
+        "orders/",
+        params={
+            "created_from": "2001-01-01T00:00:00",
+            "created_to": "2001-02-01T00:00:00",
+        },
+    )
+    assert response.status_code == 200
+    response_json = response.json()
+    assert [order["id"] for order in response_json] == [
+        order_payload["id"] for order_payload in order_payloads[:2]
+    ]
+    for order, order_payload in zip(response_json, order_payloads):
+        await utils.compare_orders(order_payload, order)
+
+    # Only the partitions of the filtered month are scanned
+    plan = await explain(
+        db_session,
+        'SELECT "order".id FROM "order" JOIN order_item '
+        'ON order_item.order_id = "order".id '
+        'AND order_item.order_creation_date = "order".creation_date '
+        "WHERE \"order\".creation_date >= '2001-01-01' "
+        "AND \"order\".creation_date < '2001-02-01' "
+        "AND order_item.order_creation_date >= '2001-01-01' "
+        "AND order_item.order_creation_date < '2001-02-01'",
+    )
+    assert "order_p2001_01" in plan
+    assert "order_item_p2001_01" in plan
+    assert "order_p2001_02" not in plan
+    assert f"order_p{datetime.now():%Y_%m}" not in plan
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_payloads", [3], indirect=True)
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+async def test_detach_partitions(
+    client: AsyncClient, db_session: AsyncSession, order_payloads: List[dict]
+) -> None:
+    await utils.create_orders(client, order_payloads)
+    crud = OrderPartitionCRUD(db_session)
+    await crud.create([JANUARY, FEBRUARY])
+    await move_orders(db_session, order_payloads[:2], datetime(2001, 1, 10, 12))
+    maintained = await RowCountCRUD(db_session).get(Order)
+
+    # Concurrently can't run in the test transaction
+    assert await crud.detach(FEBRUARY, concurrently=False) == [JANUARY]
+    assert JANUARY not in await crud.get_months()
+    assert FEBRUARY in await crud.get_months()
+
+    response = await client.get("orders/", params={"created_to": "2001-03-01T00:00:00"})
+    assert response.status_code == 200
+    assert response.json() == []
+    response = await client.get(f"orders/{order_payloads[2]['id']}")
+    assert response.status_code == 200
+    assert await RowCountCRUD(db_session).get(Order) == maintained - 2
+
+    # The detached tables keep the rows, renamed once counted
+    assert (
+        await db_session.scalar(text("SELECT count(*) FROM order_p2001_01_detached"))
+        == 2
+    )
+    assert await db_session.scalar(
+        text("SELECT count(*) FROM order_item_p2001_01_detached")
+    )
+    assert await crud.detach(FEBRUARY, concurrently=False) == []
+    assert await RowCountCRUD(db_session).get(Order) == maintained - 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_payloads", [3], indirect=True)
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+async def test_detach_partitions_uncounted(
+    client: AsyncClient, db_session: AsyncSession, order_payloads: List[dict]
+) -> None:
+    await utils.create_orders(client, order_payloads)
+    crud = OrderPartitionCRUD(db_session)
+    await crud.create([JANUARY, FEBRUARY])
+    await move_orders(db_session, order_payloads[:2], datetime(2001, 1, 10, 12))
+    maintained = await RowCountCRUD(db_session).get(Order)
+
+    # Detached by a call interrupted before the count
+    for table_name in ("order_item", "order"):
+        await db_session.execute(
+            text(f'ALTER TABLE "{table_name}" DETACH PARTITION "{table_name}_p2001_01"')
+        )
+    assert await RowCountCRUD(db_session).get(Order) == maintained
+
+    assert await crud.detach(JANUARY, concurrently=False) == [JANUARY]
+    assert await RowCountCRUD(db_session).get(Order) == maintained - 2
+    assert await db_session.scalar(
+        text("SELECT to_regclass('order_p2001_01_detached') IS NOT NULL")
+    )
+
+
+@pytest.mark.asyncio
+async def test_detach_partitions_pending() -> None:
+    # Concurrent detaches commit, they run on real connections
+    async with database.session_factory() as session:
+        await OrderPartitionCRUD(session).create([JANUARY, FEBRUARY])
+    try:
+        async with database.session_factory() as reader:
+            # The running transaction of a reader makes the concurrent detach wait
+            await reader.execute(select(OrderItem.order_id).limit(1))
+            async with database.engine.connect() as connection:
+                connection = await connection.execution_options(
+                    isolation_level="AUTOCOMMIT"
+                )
+                await connection.execute(text("SET lock_timeout = '100ms'"))
+                try:
+                    with pytest.raises(DBAPIError):
+                        await connection.execute(
+                            text(
+                                "ALTER TABLE order_item DETACH PARTITION "
+                                "order_item_p2001_01 CONCURRENTLY"
+                            )
+                        )
+                finally:
+                    await connection.execute(text("RESET lock_timeout"))
+
+        async with database.session_factory() as session:
+            assert await session.scalar(
+                text(
+                    "SELECT inhdetachpending FROM pg_inherits "
+                    "WHERE inhrelid = CAST('order_item_p2001_01' AS regclass)"
+                )
+            )
+        async with database.session_factory() as session:
+            # Finalized, then counted
+            crud = OrderPartitionCRUD(session)
+            assert await crud.detach(FEBRUARY) == [JANUARY]
+            months = await crud.get_months()
+            assert JANUARY not in months
+            assert FEBRUARY in months
+            assert (
+                await session.scalar(
+                    text(
+                        "SELECT count(*) FROM pg_class WHERE relname IN "
+                        "('order_p2001_01_detached', 'order_item_p2001_01_detached')"
+                    )
+                )
+                == 2
+            )
+    finally:
+        async with database.session_factory() as session:
+            for table_name in (
+                "order_item_p2001_01_detached",
+                "order_p2001_01_detached",
+                "order_item_p2001_01",
+                "order_p2001_01",
+                "order_item_p2001_02",
+                "order_p2001_02",
+            ):
+                await session.execute(text(f'DROP TABLE IF EXISTS "{table_name}"'))
+            await session.commit()
@@ -18,6 +18,23 @@ async def test_post_product(
         await utils.compare_db_product_to_payload(product_payload, db_session)
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [1, 25], indirect=True)
+async def test_post_products_bulk(
+    client: AsyncClient,
+    product_payloads: List[dict],
+    db_session: AsyncSession,
+) -> None:
+    response_create = await client.post("products/bulk", json=product_payloads)
+    assert response_create.status_code == 201
+    response_create_json = response_create.json()
+    assert len(response_create_json) == len(product_payloads)
+    for product_payload, created_product in zip(product_payloads, response_create_json):
+        product_payload["id"] = created_product["id"]
+        assert product_payload == created_product
+        await utils.compare_db_product_to_payload(product_payload, db_session)
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize("product_payloads", [1, 2], indirect=True)
 async def test_get_product(client: AsyncClient, product_payloads: List[dict]) -> None:
@@ -86,3 +103,15 @@ async def test_delete_product(
         assert (
             await utils.get_product_from_db(product_payload["id"], db_session) is None
         )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [10], indirect=True)
+@pytest.mark.parametrize("limit", [3, 5, 10])
+async def test_get_all_products_cursor(
+    client: AsyncClient, product_payloads: List[dict], limit: int
+) -> None:
+    # Walk through all pages following the X-Next-Cursor header
+    await utils.create_entities(client, "products", product_payloads)
+    received = await utils.get_all_pages(client, "products/", limit)
+    assert received == product_payloads
@@ -10,7 +10,14 @@ import tests.utils as utils
 @pytest.mark.parametrize("product_payloads", [1], indirect=True)
 @pytest.mark.parametrize(
     "invalid_field",
-    [{"price": "text_price"}, {"amount": "text_amount"}],
+    [
+        {"price": "text_price"},
+        {"price": -1.0},
+        {"price": 1e16},
+        {"price": 1e-7},
+        {"price": 10.005},
+        {"amount": "text_amount"},
+    ],
 )
 async def test_post_product_invalid_field(
     client: AsyncClient,
@@ -43,6 +50,24 @@ async def test_post_product_fields_absence(
     await utils.check_422_error(response_create, field)
 
 
+@pytest.mark.asyncio
+async def test_post_products_bulk_empty(client: AsyncClient) -> None:
+    response_create = await client.post("products/bulk", json=[])
+    await utils.check_422_error(response_create, "body")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [3], indirect=True)
+async def test_post_products_bulk_invalid_field(
+    client: AsyncClient, product_payloads: List[dict]
+) -> None:
+    product_payloads[1]["price"] = "text_price"
+    response_create = await client.post("products/bulk", json=product_payloads)
+    await utils.check_422_error(response_create, "price")
+    response_get = await client.get("products/")
+    assert response_get.json() == []
+
+
 @pytest.mark.asyncio
 async def test_get_product_not_found(client: AsyncClient) -> None:
     response_get = await client.get(f"products/{uuid7()}")
@@ -84,7 +109,14 @@ async def test_put_product_incorrect_uuid(
 @pytest.mark.parametrize("product_payloads", [2], indirect=True)
 @pytest.mark.parametrize(
     "invalid_field",
-    [{"price": "text_price"}, {"amount": "text_amount"}],
+    [
+        {"price": "text_price"},
+        {"price": -1.0},
+        {"price": 1e16},
+        {"price": 1e-7},
+        {"price": 10.005},
+        {"amount": "text_amount"},
+    ],
 )
 async def test_put_product_invalid_field(
     client: AsyncClient, product_payloads: List[dict], invalid_field: dict
@@ -135,3 +167,13 @@ async def test_delete_product_not_found(client: AsyncClient) -> None:
 async def test_delete_product_incorrect_uuid(client: AsyncClient) -> None:
     response_delete = await client.delete("products/123")
     await utils.check_422_error(response_delete, "id")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cursor", ["cursor", "WyIxMjMiXQ==", "W10="])
+async def test_get_all_products_invalid_cursor(
+    client: AsyncClient, cursor: str
+) -> None:
+    response_get = await client.get("products/", params={"cursor": cursor})
+    assert response_get.status_code == 400
+    assert response_get.json()["detail"] == "Invalid cursor."
@@ -0,0 +1,60 @@
+from typing import List
+from uuid import uuid4
+import pytest
+from httpx import AsyncClient
+
+from shopAPI.crud import ProductCRUD
+import tests.utils as utils
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [4], indirect=True)
+async def test_lookup_products(
+    client: AsyncClient, product_payloads: List[dict]
+) -> None:
+    await utils.create_entities(client, "products", product_payloads)
+    unknown_id = str(uuid4())
+    ids = [payload["id"] for payload in product_payloads]
+
+    # Repeated ids are returned once, in the order they were first requested
+    response = await client.post(
+        "products/lookup", json={"ids": [ids[2], unknown_id, ids[0], ids[2], ids[1]]}
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "products": [product_payloads[2], product_payloads[0], product_payloads[1]],
+        "missing": [unknown_id],
+    }
+    assert utils.query_count(response) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [3], indirect=True)
+async def test_lookup_products_cache(
+    client: AsyncClient, product_payloads: List[dict]
+) -> None:
+    await utils.create_entities(client, "products", product_payloads)
+    ids = [payload["id"] for payload in product_payloads]
+    await client.get(f"products/{ids[0]}")
+    hits = ProductCRUD.cache.hits
+
+    # Only the products that aren't cached are loaded
+    response = await client.post("products/lookup", json={"ids": ids})
+    assert response.json()["products"] == product_payloads
+    assert ProductCRUD.cache.hits == hits + 1
+    assert utils.query_count(response) == 1
+
+    # All of them are cached now
+    response = await client.post("products/lookup", json={"ids": ids})
+    assert response.json()["products"] == product_payloads
+    assert utils.query_count(response) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "json",
+    [{}, {"ids": []}, {"ids": ["not an id"]}, {"ids": [str(uuid4())] * 1001}],
+)
+async def test_lookup_products_invalid(client: AsyncClient, json: dict) -> None:
+    response = await client.post("products/lookup", json=json)
+    assert response.status_code == 422
@@ -0,0 +1,98 @@
+from typing import List
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import tests.utils as utils
+
+PRODUCTS = [
+    ("Red running shoes", "Light shoes for road running"),
+    ("Trail sneakers", "Grippy running shoes for trails"),
+    ("Coffee mug", "Holds coffee and tea"),
+    ("Desk lamp", "A lamp with a warm light"),
+    ("Floor lamp", "Tall and bright"),
+]
+
+
+@pytest.fixture
+async def products(client: AsyncClient) -> List[dict]:
+    payloads = [
+        {"name": name, "description": description, "price": 10.0, "amount": 5}
+        for name, description in PRODUCTS
+    ]
+    await utils.create_entities(client, "products", payloads)
+    return payloads
+
+
+async def search(client: AsyncClient, q: str) -> List[str]:
+    response = await client.get("products/search", params={"q": q})
+    assert response.status_code == 200
+    return [product["name"] for product in response.json()]
+
+
+@pytest.mark.asyncio
+async def test_search_products(client: AsyncClient, products: List[dict]) -> None:
+    # Name matches (weight A) rank above description matches (weight B)
+    assert await search(client, "running shoes") == [
+        "Red running shoes",
+        "Trail sneakers",
+    ]
+    assert await search(client, "coffee") == ["Coffee mug"]
+    assert await search(client, "coffee -tea") == []
+    assert await search(client, '"warm light"') == ["Desk lamp"]
+    # Words are stemmed
+    assert await search(client, "shoe") == ["Red running shoes", "Trail sneakers"]
+
+    response = await client.get("products/search", params={"q": "lamp"})
+    assert response.json() == [products[3], products[4]] or response.json() == [
+        products[4],
+        products[3],
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limit", [1, 2, 3])
+async def test_search_products_pagination(
+    client: AsyncClient, products: List[dict], limit: int
+) -> None:
+    for q, expected in (("lamp", 2), ("running", 2), ("light", 2), ("shoes light", 1)):
+        items = await utils.get_all_pages(
+            client, "products/search", limit, params={"q": q}
+        )
+        assert len(items) == expected
+        assert len({item["id"] for item in items}) == expected
+
+
+@pytest.mark.asyncio
+async def test_search_products_typo(
+    client: AsyncClient, products: List[dict], db_session: AsyncSession
+) -> None:
+    if not await db_session.scalar(
+        text("SELECT EXISTS (SELECT FROM pg_extension WHERE extname = 'pg_trgm')")
+    ):
+        pytest.skip("The pg_trgm extension isn't installed.")
+
+    assert (await search(client, "runing"))[0] == "Red running shoes"
+    assert (await search(client, "cofee"))[0] == "Coffee mug"
+    assert (await search(client, "sneak"))[0] == "Trail sneakers"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "params, status_code",
+    [
+        ({}, 422),
+        ({"q": ""}, 422),
+        ({"q": "x" * 257}, 422),
+        ({"q": "lamp", "limit": 0}, 422),
+        ({"q": "lamp", "limit": 101}, 422),
+        ({"q": "lamp", "cursor": "not a cursor"}, 400),
+        ({"q": "lamp", "cursor": "WyJhIl0="}, 400),
+    ],
+)
+async def test_search_products_invalid(
+    client: AsyncClient, params: dict, status_code: int
+) -> None:
+    response = await client.get("products/search", params=params)
+    assert response.status_code == status_code
@@ -0,0 +1,128 @@
+from typing import AsyncGenerator, List
+import pytest
+from httpx import AsyncClient
+
+from shopAPI.config import settings
+from shopAPI.metrics import DB_POOL_CHECKOUT_DURATION
+from shopAPI.replicas import READ_YOUR_WRITES_COOKIE, ReplicaSet
+import shopAPI.replicas as replicas
+import tests.utils as utils
+
+# The replica engines connect outside of the test transaction,
+# so the rows created by a test are only visible when reading from the primary
+
+
+@pytest.fixture(scope="function")
+async def replica_set(
+    request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch
+) -> AsyncGenerator[ReplicaSet, None]:
+    """
+    Routes the reads to replicas at the requested URIs (the test database by default).
+    """
+    replica_set = ReplicaSet(getattr(request, "param", [str(settings.DB_URI)]))
+    monkeypatch.setattr(replicas, "replicas", replica_set)
+    yield replica_set
+    await replica_set.dispose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_payloads", [1], indirect=True)
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+async def test_reads_use_replica(
+    client: AsyncClient, order_payloads: List[dict], replica_set: ReplicaSet
+) -> None:
+    await utils.create_orders(client, order_payloads)
+    assert READ_YOUR_WRITES_COOKIE in client.cookies
+    client.cookies.clear()
+    product_id = order_payloads[0]["order_items"][0]["product_id"]
+    order_id = order_payloads[0]["id"]
+    assert (await client.get(f"products/{product_id}")).status_code == 404
+    assert (await client.get(f"orders/{order_id}")).status_code == 404
+    for path in ("products/", "orders/"):
+        response_get = await client.get(path, params={"limit": 100})
+        assert response_get.status_code == 200
+        assert product_id not in {item["id"] for item in response_get.json()}
+        assert order_id not in {item["id"] for item in response_get.json()}
+    # Writes always go to the primary
+    response_patch = await client.patch(
+        f"orders/{order_id}/status", params={"status": "shipped"}
+    )
+    assert response_patch.status_code == 200
+    client.cookies.clear()
+
+
+def pool_checkouts(pool: str) -> float:
+    sample = f'{DB_POOL_CHECKOUT_DURATION.name}_count{{pool="{pool}"}} '
+    for line in DB_POOL_CHECKOUT_DURATION.samples():
+        if line.startswith(sample):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+@pytest.mark.asyncio
+async def test_replica_pool_checkouts(replica_set: ReplicaSet) -> None:
+    # The waits of the replicas are kept apart from the primary's
+    primary, replica = pool_checkouts("primary"), pool_checkouts("replica")
+    session = await replica_set.acquire()
+    await session.close()
+    assert pool_checkouts("replica") == replica + 1
+    assert pool_checkouts("primary") == primary
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_payloads", [1], indirect=True)
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+async def test_reads_your_writes(
+    client: AsyncClient,
+    order_payloads: List[dict],
+    replica_set: ReplicaSet,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    client.cookies.clear()
+    await utils.create_orders(client, order_payloads)
+    product_id = order_payloads[0]["order_items"][0]["product_id"]
+    assert (await client.get(f"products/{product_id}")).status_code == 200
+    assert (await client.get(f"orders/{order_payloads[0]['id']}")).status_code == 200
+    # The window is over (the product stays cached, it was read from the primary)
+    monkeypatch.setattr(settings, "DB_READ_YOUR_WRITES_SECONDS", 0)
+    assert (await client.get(f"orders/{order_payloads[0]['id']}")).status_code == 404
+    assert (await client.get(f"products/{product_id}")).status_code == 200
+    client.cookies.clear()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "replica_set",
+    [["postgresql+asyncpg://postgres@localhost:1/postgres"]],
+    indirect=True,
+)
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+async def test_unhealthy_replica_fallback(
+    client: AsyncClient, product_payloads: List[dict], replica_set: ReplicaSet
+) -> None:
+    await utils.create_entities(client, "products", product_payloads)
+    client.cookies.clear()
+    response_get = await client.get(f"products/{product_payloads[0]['id']}")
+    assert response_get.status_code == 200
+    assert response_get.json() == product_payloads[0]
+    # The replica is skipped until the retry time
+    assert replica_set.unhealthy_until[0] > 0
+    unhealthy_until = replica_set.unhealthy_until[0]
+    assert (await client.get("products/")).status_code == 200
+    assert replica_set.unhealthy_until[0] == unhealthy_until
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+async def test_read_only_post_uses_replica(
+    client: AsyncClient, product_payloads: List[dict], replica_set: ReplicaSet
+) -> None:
+    await utils.create_entities(client, "products", product_payloads)
+    client.cookies.clear()
+    # The lookup is a POST that only reads, it doesn't set the cookie
+    for _ in range(2):
+        response = await client.post(
+            "products/lookup", json={"ids": [product_payloads[0]["id"]]}
+        )
+        assert response.json()["missing"] == [product_payloads[0]["id"]]
+        assert READ_YOUR_WRITES_COOKIE not in client.cookies
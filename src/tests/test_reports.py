@@ -0,0 +1,286 @@
+import asyncio
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import List
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shopAPI.crud import SalesRollupCRUD
+from shopAPI.models import (
+    CURRENT_XID,
+    Order,
+    OrderItem,
+    OrderStatus,
+    Product,
+    SalesGroupBy,
+    SalesRollup,
+)
+from shopAPI.server import app
+import shopAPI.database as database
+import tests.utils as utils
+
+
+async def rollup_until(db_session: AsyncSession) -> int:
+    # The orders of the test are in the test transaction, which is still running
+    return await db_session.scalar(text(f"SELECT {CURRENT_XID}")) + 1
+
+
+async def get_sales(client: AsyncClient, group_by: str, **params) -> List[dict]:
+    response = await client.get(
+        "reports/sales", params={"group_by": group_by, **params}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+async def status_units(client: AsyncClient) -> Counter:
+    return Counter(
+        {row["status"]: row["units"] for row in await get_sales(client, "status")}
+    )
+
+
+def expected_units(order_payloads: List[dict]) -> Counter:
+    units = Counter()
+    for order_payload in order_payloads:
+        for item in order_payload["order_items"]:
+            units[item["product_id"]] += item["amount"]
+    return units
+
+
+async def check_product_sales(
+    client: AsyncClient, product_payloads: List[dict], order_payloads: List[dict]
+) -> None:
+    units = expected_units(order_payloads)
+    rows = {row["product_id"]: row for row in await get_sales(client, "product")}
+    for product_payload in product_payloads:
+        product_id = product_payload["id"]
+        if not units[product_id]:
+            assert product_id not in rows
+            continue
+        row = rows[product_id]
+        assert row["product_name"] == product_payload["name"]
+        assert row["units"] == units[product_id]
+        assert row["revenue"] == pytest.approx(
+            units[product_id] * product_payload["price"]
+        )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [4], indirect=True)
+@pytest.mark.parametrize("order_payloads", [5], indirect=True)
+async def test_sales_report_by_product(
+    client: AsyncClient,
+    product_payloads: List[dict],
+    order_payloads: List[dict],
+    db_session: AsyncSession,
+) -> None:
+    crud = SalesRollupCRUD(db_session)
+    await utils.create_orders(client, order_payloads)
+    # Not rolled up yet, read from the orders
+    await check_product_sales(client, product_payloads, order_payloads)
+
+    until = await rollup_until(db_session)
+    assert await crud.refresh(until) == until
+    rolled_up = await db_session.scalar(
+        select(func.sum(SalesRollup.units)).where(
+            SalesRollup.product_id.in_([p["id"] for p in product_payloads])
+        )
+    )
+    assert rolled_up == sum(expected_units(order_payloads).values())
+    await check_product_sales(client, product_payloads, order_payloads)
+
+    # Refreshing again adds nothing, the test transaction is still running
+    assert await crud.refresh(until) == until
+    assert await crud.refresh() == until
+    await check_product_sales(client, product_payloads, order_payloads)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [3], indirect=True)
+@pytest.mark.parametrize("order_payloads", [2], indirect=True)
+async def test_sales_report_status_update(
+    client: AsyncClient, order_payloads: List[dict], db_session: AsyncSession
+) -> None:
+    before = await status_units(client)
+    await utils.create_orders(client, order_payloads)
+    await SalesRollupCRUD(db_session).refresh(await rollup_until(db_session))
+    first_units = sum(item["amount"] for item in order_payloads[0]["order_items"])
+    total_units = sum(expected_units(order_payloads).values())
+    assert await status_units(client) - before == Counter(
+        {OrderStatus.created: total_units}
+    )
+
+    # The rolled up order moves to the new status
+    response = await client.patch(
+        f"orders/{order_payloads[0]['id']}/status",
+        params={"status": OrderStatus.shipped.value},
+    )
+    assert response.status_code == 200
+    assert await status_units(client) - before == Counter(
+        {
+            OrderStatus.created: total_units - first_units,
+            OrderStatus.shipped: first_units,
+        }
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+@pytest.mark.parametrize("order_payloads", [4], indirect=True)
+async def test_sales_report_by_day(
+    client: AsyncClient, order_payloads: List[dict], db_session: AsyncSession
+) -> None:
+    today = date.today()
+    tomorrow = today + timedelta(days=1)
+    params = {"from": today.isoformat(), "to": tomorrow.isoformat()}
+    before = await get_sales(client, "day", **params)
+    units_before = before[0]["units"] if before else 0
+    await utils.create_orders(client, order_payloads)
+    # Read from the orders, then from the rollup
+    for _ in range(2):
+        rows = await get_sales(client, "day", **params)
+        assert [row["day"] for row in rows] == [today.isoformat()]
+        assert rows[0]["units"] - units_before == sum(
+            expected_units(order_payloads).values()
+        )
+        await SalesRollupCRUD(db_session).refresh(await rollup_until(db_session))
+    assert await get_sales(client, "day", to=today.isoformat()) == [
+        row for row in await get_sales(client, "day") if row["day"] < str(today)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"group_by": "customer"},
+        {"from": "yesterday"},
+        {"from": "2026-01-02", "to": "2026-01-01"},
+        {"from": "2026-01-01", "to": "2026-01-01"},
+    ],
+)
+async def test_sales_report_invalid_params(client: AsyncClient, params: dict) -> None:
+    response = await client.get("reports/sales", params=params)
+    assert response.status_code in (400, 422)
+
+
+@pytest.mark.asyncio
+async def test_sales_rollup_late_commit() -> None:
+    # Runs on real connections, outside of the test transaction
+    product = Product(name="name", description="description", price=2.0, amount=10)
+    product_id = product.id
+    async with database.session_factory() as session:
+        session.add(product)
+        await session.commit()
+
+    async def product_units(session: AsyncSession) -> int:
+        rows = await SalesRollupCRUD(session).report(SalesGroupBy.product)
+        return sum(row.units for row in rows if row.product_id == product_id)
+
+    async def rolled_up_units(session: AsyncSession) -> int:
+        return await session.scalar(
+            select(func.coalesce(func.sum(SalesRollup.units), 0)).where(
+                SalesRollup.product_id == product_id
+            )
+        )
+
+    try:
+        async with database.session_factory() as late:
+            # Created minutes before it commits, like an order waiting for a lock
+            late.add(
+                Order(
+                    creation_date=datetime.now() - timedelta(minutes=5),
+                    order_items=[{"product_id": product_id, "amount": 3}],
+                )
+            )
+            await late.flush()
+            async with database.session_factory() as session:
+                await SalesRollupCRUD(session).refresh()
+                assert await rolled_up_units(session) == 0
+            await late.commit()
+
+        async with database.session_factory() as session:
+            # Not rolled up yet, read from the orders
+            assert await product_units(session) == 3
+            await SalesRollupCRUD(session).refresh()
+            assert await rolled_up_units(session) == 3
+            assert await product_units(session) == 3
+    finally:
+        async with database.session_factory() as session:
+            await session.execute(
+                delete(SalesRollup).where(SalesRollup.product_id == product_id)
+            )
+            order_ids = (
+                await session.scalars(
+                    delete(OrderItem)
+                    .where(OrderItem.product_id == product_id)
+                    .returning(OrderItem.order_id)
+                )
+            ).all()
+            await session.execute(delete(Order).where(Order.id.in_(order_ids)))
+            await session.execute(delete(Product).where(Product.id == product_id))
+            await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_sales_rollup_concurrent_status_updates(client: AsyncClient) -> None:
+    # Runs on real connections, outside of the test transaction
+    product = Product(name="name", description="description", price=2.0, amount=10)
+    order = Order(order_items=[{"product_id": product.id, "amount": 3}])
+    product_id, order_id = product.id, order.id
+    async with database.session_factory() as session:
+        session.add(product)
+        await session.flush()
+        session.add(order)
+        await session.commit()
+
+    async def rolled_up_units(session: AsyncSession) -> Counter:
+        rows = await session.execute(
+            select(SalesRollup.status, SalesRollup.units).where(
+                SalesRollup.product_id == product_id
+            )
+        )
+        return Counter({status: units for status, units in rows if units})
+
+    async def update_status(status: OrderStatus) -> None:
+        response = await client.patch(
+            f"orders/{order_id}/status", params={"status": status.value}
+        )
+        assert response.status_code == 200
+
+    test_session = app.dependency_overrides.pop(database.get_session)
+    try:
+        async with database.session_factory() as session:
+            await SalesRollupCRUD(session).refresh()
+            assert await rolled_up_units(session) == {OrderStatus.created: 3}
+
+        # Both requests read the created order, then wait for the lock
+        async with database.session_factory() as holder:
+            await holder.execute(
+                select(Order.id).where(Order.id == order_id).with_for_update()
+            )
+            updates = asyncio.gather(
+                update_status(OrderStatus.shipped), update_status(OrderStatus.canceled)
+            )
+            await asyncio.sleep(0.2)
+        await updates
+
+        async with database.session_factory() as session:
+            status = await session.scalar(
+                select(Order.status).where(Order.id == order_id)
+            )
+            assert await rolled_up_units(session) == {status: 3}
+    finally:
+        app.dependency_overrides[database.get_session] = test_session
+        async with database.session_factory() as session:
+            await session.execute(
+                delete(SalesRollup).where(SalesRollup.product_id == product_id)
+            )
+            await session.execute(
+                delete(OrderItem).where(OrderItem.order_id == order_id)
+            )
+            await session.execute(delete(Order).where(Order.id == order_id))
+            await session.execute(delete(Product).where(Product.id == product_id))
+            await session.commit()
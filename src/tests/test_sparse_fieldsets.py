@@ -0,0 +1,119 @@
+from typing import List
+import pytest
+from httpx import AsyncClient
+
+import tests.utils as utils
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [3], indirect=True)
+@pytest.mark.parametrize(
+    "fields, expected",
+    [
+        ("name,price", {"id", "name", "price"}),
+        ("id", {"id"}),
+        (" amount , name ", {"id", "amount", "name"}),
+        (
+            "name,description,price,amount,id",
+            {"id", "name", "description", "price", "amount"},
+        ),
+    ],
+)
+async def test_get_products_fields(
+    client: AsyncClient, product_payloads: List[dict], fields: str, expected: set
+) -> None:
+    await utils.create_entities(client, "products", product_payloads)
+
+    response = await client.get("products/", params={"fields": fields})
+    assert response.status_code == 200
+    assert response.json() == [
+        {key: value for key, value in payload.items() if key in expected}
+        for payload in product_payloads
+    ]
+    assert utils.query_count(response) == 1
+
+    response = await client.get(
+        f"products/{product_payloads[0]['id']}", params={"fields": fields}
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        key: value for key, value in product_payloads[0].items() if key in expected
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_payloads", [3], indirect=True)
+@pytest.mark.parametrize("product_payloads", [4], indirect=True)
+@pytest.mark.parametrize(
+    "items, type, queries",
+    [("full", "items", 3), ("short", "items_short", 2), ("none", "base", 1)],
+)
+async def test_get_orders_items(
+    client: AsyncClient, order_payloads: List[dict], items: str, type: str, queries: int
+) -> None:
+    await utils.create_orders(client, order_payloads)
+
+    response = await client.get("orders/", params={"items": items})
+    assert response.status_code == 200
+    response_json = response.json()
+    assert len(response_json) == len(order_payloads)
+    for order in response_json:
+        await utils.compare_orders(order, order, type)
+        assert ("order_items" in order) == (items != "none")
+    assert utils.query_count(response) == queries
+
+    response = await client.get(
+        f"orders/{order_payloads[0]['id']}", params={"items": items}
+    )
+    assert response.status_code == 200
+    assert response.json() == response_json[0]
+    assert utils.query_count(response) == queries
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_payloads", [2], indirect=True)
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+async def test_get_orders_fields(
+    client: AsyncClient, order_payloads: List[dict]
+) -> None:
+    await utils.create_orders(client, order_payloads)
+
+    response = await client.get(
+        "orders/", params={"fields": "status", "items": "short"}
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "id": payload["id"],
+            "status": payload["status"],
+            "order_items": payload["order_items"],
+        }
+        for payload in order_payloads
+    ]
+
+    response = await client.get(
+        f"orders/{order_payloads[0]['id']}",
+        params={"fields": "creation_date", "items": "none"},
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "id": order_payloads[0]["id"],
+        "creation_date": order_payloads[0]["creation_date"],
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "path, params, status_code",
+    [
+        ("products/", {"fields": "name,unknown"}, 400),
+        ("products/", {"fields": "order_items"}, 400),
+        ("orders/", {"fields": "amount"}, 400),
+        ("orders/", {"items": "some"}, 422),
+    ],
+)
+async def test_get_fields_invalid(
+    client: AsyncClient, path: str, params: dict, status_code: int
+) -> None:
+    response = await client.get(path, params=params)
+    assert response.status_code == status_code
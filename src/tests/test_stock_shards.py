@@ -0,0 +1,250 @@
+import asyncio
+from typing import List
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shopAPI.crud import OrderCRUD, ProductCRUD, RowCountCRUD
+from shopAPI.models import (
+    Order,
+    OrderCreate,
+    OrderItem,
+    Product,
+    ProductStockShard,
+)
+import shopAPI.database as database
+import tests.utils as utils
+
+
+async def get_shards(product_id: str, db_session: AsyncSession) -> List[int]:
+    return list(
+        await db_session.scalars(
+            select(ProductStockShard.amount)
+            .where(ProductStockShard.product_id == product_id)
+            .order_by(ProductStockShard.shard)
+        )
+    )
+
+
+async def get_amount(client: AsyncClient, product_id: str) -> int:
+    response = await client.get(f"products/{product_id}")
+    assert response.status_code == 200
+    return response.json()["amount"]
+
+
+async def shard_product(
+    client: AsyncClient, product_payload: dict, amount: int, stock_shards: int
+) -> None:
+    product_payload["amount"] = amount
+    data = {key: value for key, value in product_payload.items() if key != "id"}
+    response = await client.put(
+        f"products/{product_payload['id']}", json={**data, "stock_shards": stock_shards}
+    )
+    assert response.status_code == 200
+    assert response.json() == product_payload
+
+
+def order_payload(product_id: str, amount: int) -> dict:
+    return {"order_items": [{"product_id": product_id, "amount": amount}]}
+
+
+@pytest.fixture
+async def product(client: AsyncClient, product_payloads: List[dict]) -> dict:
+    await utils.create_entities(client, "products", product_payloads)
+    return product_payloads[0]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+async def test_product_sharded_stock(
+    client: AsyncClient, product: dict, db_session: AsyncSession
+) -> None:
+    await shard_product(client, product, 10, 4)
+    assert await get_shards(product["id"], db_session) == [3, 3, 2, 2]
+    db_product = await utils.get_product_from_db(product["id"], db_session)
+    assert (db_product.amount, db_product.stock_shards) == (0, 4)
+    assert await get_amount(client, product["id"]) == 10
+
+    # Fits in one shard
+    response = await client.post("orders", json=order_payload(product["id"], 2))
+    assert response.status_code == 201
+    assert sum(await get_shards(product["id"], db_session)) == 8
+    assert await get_amount(client, product["id"]) == 8
+    # Taken from several shards
+    response = await client.post("orders", json=order_payload(product["id"], 7))
+    assert response.status_code == 201
+    assert await get_amount(client, product["id"]) == 1
+    # Never oversold
+    response = await client.post("orders", json=order_payload(product["id"], 2))
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Product {product['id']} not enough in stock."
+    assert await get_amount(client, product["id"]) == 1
+
+    response = await client.get("products", params={"limit": 100})
+    listed = {row["id"]: row["amount"] for row in response.json()}
+    assert listed[product["id"]] == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [1], indirect=True)
+async def test_product_unsharded_stock(
+    client: AsyncClient, product: dict, db_session: AsyncSession
+) -> None:
+    await shard_product(client, product, 10, 4)
+    # Keeps the shards when the number isn't set
+    product["amount"] = 6
+    data = {key: value for key, value in product.items() if key != "id"}
+    response = await client.put(f"products/{product['id']}", json=data)
+    assert response.status_code == 200
+    assert await get_shards(product["id"], db_session) == [2, 2, 1, 1]
+
+    await shard_product(client, product, 7, 0)
+    assert await get_shards(product["id"], db_session) == []
+    await utils.compare_db_product_to_payload(product, db_session)
+    assert await get_amount(client, product["id"]) == 7
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+async def test_post_orders_batch_sharded(
+    client: AsyncClient, product_payloads: List[dict], db_session: AsyncSession
+) -> None:
+    await utils.create_entities(client, "products", product_payloads)
+    sharded, plain = product_payloads
+    await shard_product(client, sharded, 10, 3)
+    response = await client.post(
+        "orders/batch",
+        json=[
+            order_payload(sharded["id"], 6),
+            order_payload(sharded["id"], 5),
+            {
+                "order_items": [
+                    {"product_id": sharded["id"], "amount": 4},
+                    {"product_id": plain["id"], "amount": 1},
+                ]
+            },
+        ],
+    )
+    assert response.status_code == 200
+    assert [result["status_code"] for result in response.json()] == [201, 400, 201]
+    assert await get_shards(sharded["id"], db_session) == [0, 0, 0]
+    await utils.compare_db_products_amount(
+        {plain["id"]: plain["amount"] - 1}, db_session
+    )
+
+
+@pytest.mark.asyncio
+async def test_sharded_stock_concurrent_orders() -> None:
+    # Runs on real connections, outside of the test transaction
+    product = Product(
+        name="name", description="description", price=1.0, amount=0, stock_shards=4
+    )
+    product_id = product.id
+    async with database.session_factory() as session:
+        session.add(product)
+        await session.flush()
+        session.add_all(
+            ProductStockShard(product_id=product_id, shard=shard, amount=5)
+            for shard in range(4)
+        )
+        await session.commit()
+
+    async def create_order() -> Order | HTTPException:
+        async with database.session_factory() as session:
+            try:
+                return await OrderCRUD(session).create(
+                    OrderCreate(order_items=[{"product_id": product_id, "amount": 1}])
+                )
+            except HTTPException as exception:
+                return exception
+
+    try:
+        results = await asyncio.gather(*(create_order() for _ in range(30)))
+        created = [result for result in results if isinstance(result, Order)]
+        assert len(created) == 20
+        assert {result.status_code for result in results if result not in created} == {
+            400
+        }
+        async with database.session_factory() as session:
+            assert await get_shards(product_id, session) == [0, 0, 0, 0]
+    finally:
+        async with database.session_factory() as session:
+            order_ids = (
+                await session.scalars(
+                    delete(OrderItem)
+                    .where(OrderItem.product_id == product_id)
+                    .returning(OrderItem.order_id)
+                )
+            ).all()
+            await session.execute(delete(Order).where(Order.id.in_(order_ids)))
+            await session.execute(delete(Product).where(Product.id == product_id))
+            # Commits the deletes with the counters
+            await RowCountCRUD(session).recount([Order, Product])
+
+
+@pytest.mark.asyncio
+async def test_sharded_stock_waiting_releases_locks() -> None:
+    # Runs on real connections, outside of the test transaction
+    product = Product(
+        name="name", description="description", price=1.0, amount=0, stock_shards=2
+    )
+    product_id = product.id
+    async with database.session_factory() as session:
+        session.add(product)
+        await session.flush()
+        session.add_all(
+            ProductStockShard(product_id=product_id, shard=shard, amount=amount)
+            for shard, amount in enumerate([2, 5])
+        )
+        await session.commit()
+
+    def lock_shard(shard: int, nowait: bool = False):
+        return (
+            select(ProductStockShard.shard)
+            .where(
+                ProductStockShard.product_id == product_id,
+                ProductStockShard.shard == shard,
+            )
+            .with_for_update(nowait=nowait)
+        )
+
+    async def decrement() -> None:
+        async with database.session_factory() as session:
+            await ProductCRUD(session).decrement_shards(product_id, 2, 4)
+            await session.commit()
+
+    waiting = None
+    try:
+        async with database.session_factory() as other, database.session_factory() as holder:
+            await other.execute(lock_shard(0))
+            await holder.execute(lock_shard(1))
+            # No shard is free, the waiting pass waits for the only one with enough
+            waiting = asyncio.create_task(decrement())
+            await asyncio.sleep(0.2)
+            await holder.execute(
+                update(ProductStockShard)
+                .where(
+                    ProductStockShard.product_id == product_id,
+                    ProductStockShard.shard == 1,
+                )
+                .values(amount=3)
+            )
+            await holder.commit()
+            await asyncio.sleep(0.2)
+            # Too little stock after the wait, the order waits for every shard
+            # in order without keeping the lock of shard 1
+            assert not waiting.done()
+            await other.execute(lock_shard(1, nowait=True))
+            await other.commit()
+        await waiting
+
+        async with database.session_factory() as session:
+            assert sum(await get_shards(product_id, session)) == 1
+    finally:
+        if waiting is not None:
+            await asyncio.gather(waiting, return_exceptions=True)
+        async with database.session_factory() as session:
+            await session.execute(delete(Product).where(Product.id == product_id))
+            await session.commit()
@@ -0,0 +1,121 @@
+from typing import List
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shopAPI.crud import RowCountCRUD
+from shopAPI.models import Product
+import tests.utils as utils
+
+
+async def total_count(client: AsyncClient, path: str, params: dict) -> int:
+    response = await client.get(path, params={"limit": 1, **params})
+    assert response.status_code == 200
+    return int(response.headers["X-Total-Count"])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [3], indirect=True)
+async def test_total_count_products(
+    client: AsyncClient, product_payloads: List[dict], db_session: AsyncSession
+) -> None:
+    # Other tests may have left rows, compare the counts before and after
+    exact = await total_count(client, "products/", {"count": "exact"})
+    maintained = await total_count(client, "products/", {"count": "maintained"})
+
+    await utils.create_entities(client, "products", product_payloads[:1])
+    response = await client.post("products/bulk", json=product_payloads[1:])
+    assert response.status_code == 201
+    response = await client.delete(f"products/{product_payloads[0]['id']}")
+    assert response.status_code == 200
+
+    assert await total_count(client, "products/", {"count": "exact"}) == exact + 2
+    assert (
+        await total_count(client, "products/", {"count": "maintained"})
+        == maintained + 2
+    )
+    response = await client.get("products/")
+    assert "X-Total-Count" not in response.headers
+
+    # ANALYZE counts the rows of the test transaction too
+    await db_session.execute(text("ANALYZE product"))
+    response = await client.get("products/", params={"count": "estimated"})
+    assert int(response.headers["X-Total-Count"]) == exact + 2
+    assert utils.query_count(response) == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_payloads", [4], indirect=True)
+@pytest.mark.parametrize("product_payloads", [2], indirect=True)
+async def test_total_count_orders(
+    client: AsyncClient, order_payloads: List[dict], db_session: AsyncSession
+) -> None:
+    exact = await total_count(client, "orders/", {"count": "exact"})
+    maintained = await total_count(client, "orders/", {"count": "maintained"})
+    shipped = await total_count(
+        client, "orders/", {"count": "exact", "status": "shipped"}
+    )
+
+    await utils.create_orders(client, order_payloads[:2])
+    response = await client.post("orders/batch", json=order_payloads[2:])
+    assert response.status_code == 200
+    response = await client.patch(
+        f"orders/{order_payloads[0]['id']}/status", params={"status": "shipped"}
+    )
+    assert response.status_code == 200
+
+    assert await total_count(client, "orders/", {"count": "exact"}) == exact + 4
+    assert (
+        await total_count(client, "orders/", {"count": "maintained"}) == maintained + 4
+    )
+    assert (
+        await total_count(client, "orders/", {"count": "exact", "status": "shipped"})
+        == shipped + 1
+    )
+    await db_session.execute(text('ANALYZE "order"'))
+    assert await total_count(client, "orders/", {"count": "estimated"}) == exact + 4
+    # The planner's estimate of the filtered query
+    assert (
+        await total_count(
+            client,
+            "orders/",
+            {
+                "count": "estimated",
+                "status": ["shipped", "delivered"],
+                "created_from": "2020-01-01T00:00:00",
+            },
+        )
+        >= 0
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("product_payloads", [3], indirect=True)
+async def test_total_count_recount(
+    client: AsyncClient, product_payloads: List[dict], db_session: AsyncSession
+) -> None:
+    # Rows inserted without the CRUD aren't counted until the recount
+    maintained = await total_count(client, "products/", {"count": "maintained"})
+    await db_session.execute(insert(Product), product_payloads)
+    assert await total_count(client, "products/", {"count": "maintained"}) == maintained
+
+    await RowCountCRUD(db_session).recount([Product])
+    assert await total_count(
+        client, "products/", {"count": "maintained"}
+    ) == await total_count(client, "products/", {"count": "exact"})
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "params, status_code",
+    [
+        ({"count": "all"}, 422),
+        ({"count": "maintained", "status": "shipped"}, 400),
+    ],
+)
+async def test_total_count_invalid(
+    client: AsyncClient, params: dict, status_code: int
+) -> None:
+    response = await client.get("orders/", params=params)
+    assert response.status_code == status_code
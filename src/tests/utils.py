@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from sqlmodel import select
 
+from shopAPI.instrumentation import SERVER_TIMING_HEADER, parse_server_timing
 from shopAPI.models import (
     Order,
     OrderResponse,
@@ -191,3 +192,43 @@ async def check_422_error(response: Response, field: str) -> None:
     loc = detail[0]["loc"]
     assert isinstance(loc, list)
     assert loc[-1] == field
+
+
+async def get_all_pages(
+    client: AsyncClient, path: str, limit: int, params: dict | None = None
+) -> List[dict]:
+    """
+    Sends GET requests to the path following the X-Next-Cursor header
+    until the last page and checks the size of each page.
+
+    :param client: The test client.
+    :param path: The path to send the requests to.
+    :param limit: The page size.
+    :param params: Additional query parameters.
+    :return: The items of all pages.
+    """
+    items = []
+    params = {**(params or {}), "limit": limit}
+    while True:
+        response_get = await client.get(path, params=params)
+        assert response_get.status_code == 200
+        page = response_get.json()
+        assert len(page) <= limit
+        items.extend(page)
+        cursor = response_get.headers.get("X-Next-Cursor")
+        if cursor is None:
+            assert len(page) < limit
+            return items
+        assert len(page) == limit
+        params["cursor"] = cursor
+
+
+def query_count(response: Response) -> int:
+    """
+    Returns the number of queries the request ran, taken from the Server-Timing header.
+    Use it to assert the query budget of an endpoint.
+
+    :param response: The response to check.
+    :return: The number of queries.
+    """
+    return parse_server_timing(response.headers[SERVER_TIMING_HEADER])["queries"]